@@ -2,8 +2,12 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.db.models import Count
+from django.db.models import Count, Q
 from .models import BlogPost, Tag
+from .conditional import invalidate_listing_version
+from .page_cache import purge_all
+from .search import search_posts
+from .sidebar import invalidate_sidebar
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -22,6 +26,8 @@ class BlogPostAdmin(admin.ModelAdmin):
                     'published_date', 'views_display', 'read_time_display', 
                     'seo_score')
     list_filter = ('status', 'category', 'published_date', 'is_featured', 'tags')
+    # Title, excerpt, content and tags are searched through the full-text
+    # index (see get_search_results); author is matched directly
     search_fields = ('title', 'excerpt', 'content', 'author', 'tags__name')
     
     # Auto-slug generation
@@ -49,6 +55,13 @@ class BlogPostAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """Search the full-text index instead of icontains scans over content"""
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        matches = search_posts(search_term, BlogPost.objects.all()).order_by().values('pk')
+        return queryset.filter(Q(pk__in=matches) | Q(author__icontains=search_term)), False
+    
     # Custom methods for display
     def get_author_initials(self, obj):
         """Return DHR for Dating Hub Research"""
@@ -103,12 +116,17 @@ class BlogPostAdmin(admin.ModelAdmin):
     def make_published(self, request, queryset):
         """Mark selected posts as published"""
         updated = queryset.update(status='published')
+        # update() skips save signals, so purge the caches here
+        invalidate_sidebar()
+        invalidate_listing_version()
+        purge_all()
         self.message_user(request, f"{updated} posts published successfully.")
     make_published.short_description = "Mark selected posts as published"
     
     def make_featured(self, request, queryset):
         """Mark selected posts as featured"""
         updated = queryset.update(is_featured=True)
+        purge_all()
         self.message_user(request, f"{updated} posts marked as featured.")
     make_featured.short_description = "Mark selected posts as featured"
     
@@ -0,0 +1,106 @@
+# blog/conditional.py - Conditional GET (ETag / Last-Modified / 304) for blog pages
+#
+# Validators are computed without rendering anything: detail pages need one
+# indexed lookup on slug, listings are served from a cached version stamp.
+# make_etag() and conditional_response() serve the feeds and sitemaps too
+# (blog/syndication.py).
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from .counters import record_view
+from .models import BlogPost
+from .page_cache import page_generations
+from .sidebar import seconds_until_next_publish
+
+LISTING_VERSION_KEY = 'blog:listing_version'
+LISTING_VERSION_TIMEOUT = getattr(settings, 'BLOG_LISTING_VERSION_TIMEOUT', 60 * 60)
+
+
+def listing_version():
+    """
+    (post count, last change) across published posts. Cached, and expires
+    when the next scheduled post goes live so its publication is noticed.
+    """
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        stats = BlogPost.objects.published().aggregate(
+            count=Count('id'),
+            last_modified=Max('last_modified'),
+            last_published=Max('published_date'),
+        )
+        changed = [d for d in (stats['last_modified'], stats['last_published']) if d]
+        version = (stats['count'], max(changed) if changed else None)
+        cache.set(LISTING_VERSION_KEY, version, seconds_until_next_publish(LISTING_VERSION_TIMEOUT))
+    return version
+
+
+def invalidate_listing_version():
+    cache.delete(LISTING_VERSION_KEY)
+
+
+def make_etag(*parts):
+    """A quoted ETag from the hash of `parts`"""
+    return quote_etag(hashlib.md5(':'.join(str(p) for p in parts).encode()).hexdigest())
+
+
+def conditional_response(request, etag, last_modified, render):
+    """Return a 304/412 if the client's copy is current, otherwise render"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    if request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def conditional_listing(view_func):
+    """ETag / Last-Modified for listing pages, from the cached listing version"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+        count, last_modified = listing_version()
+        etag = make_etag(
+            *page_generations(request.path), count, last_modified,
+            request.get_full_path(), request.user.is_authenticated,
+        )
+        return conditional_response(request, etag, last_modified, lambda: view_func(request, *args, **kwargs))
+    return wrapper
+
+
+def conditional_detail(view_func):
+    """
+    ETag / Last-Modified for a post's detail page. Revalidation runs one
+    indexed query on slug; a 304 still counts the view.
+    """
+    @wraps(view_func)
+    def wrapper(request, slug, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, slug, *args, **kwargs)
+        stamp = BlogPost.objects.published().filter(slug=slug).values_list('pk', 'last_modified').first()
+        if stamp is None:
+            return view_func(request, slug, *args, **kwargs)  # 404s
+
+        pk, post_modified = stamp
+        count, listing_modified = listing_version()
+        # Neighbour and related blocks depend on other posts too
+        last_modified = max(d for d in (post_modified, listing_modified) if d)
+        etag = make_etag(
+            pk, post_modified, *page_generations(request.path), count, listing_modified,
+            request.user.is_authenticated,
+        )
+        response = conditional_response(
+            request, etag, last_modified, lambda: view_func(request, slug, *args, **kwargs),
+        )
+        if response.status_code == 304:
+            record_view(pk)
+        return response
+    return wrapper
@@ -0,0 +1,11 @@
+# blog/context_processors.py
+from django.utils.functional import SimpleLazyObject
+from .sidebar import get_sidebar
+
+
+def blog_sidebar(request):
+    """
+    Expose the shared blog sidebar as {{ blog_sidebar }}.
+    Lazy, so pages that never render the sidebar never touch the cache.
+    """
+    return {'blog_sidebar': SimpleLazyObject(get_sidebar)}
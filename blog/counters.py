@@ -0,0 +1,175 @@
+# blog/counters.py - Write-behind view counter for BlogPost.views
+#
+# Hits are counted in the Django cache (atomic incr) and written to the
+# database in batches as `views = views + n`, so a popular post no longer
+# costs one row write (and row lock) per page view.
+#
+# The counts live in the shared cache (CACHES in settings.py), so any
+# worker - or `manage.py flush_view_counts` - can write them out. Flushes
+# take a cache lock: two flushers reading the same counts would both write
+# them and then take them out of the cache twice.
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+VIEW_KEY = 'blog:views:{}'
+FLUSH_THRESHOLD = getattr(settings, 'BLOG_VIEW_FLUSH_THRESHOLD', 100)  # hits
+FLUSH_INTERVAL = getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 30)  # seconds
+FLUSH_BATCH_SIZE = 500
+FLUSH_LOCK_KEY = 'blog:views:flush-lock'
+# Frees the lock if its holder dies mid-flush
+FLUSH_LOCK_TIMEOUT = 60
+
+# Per-process bookkeeping: which posts this worker has counted since its
+# last flush, and when that flush happened
+_lock = threading.Lock()
+_touched = set()
+_hits_since_flush = 0
+_last_flush = time.monotonic()
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def record_view(post_id):
+    """
+    Count one view of a post. Returns the number of views buffered for
+    the post that have not reached the database yet.
+    """
+    global _hits_since_flush
+    # Never negative, even if a flush took out more than it should have
+    buffered = max(_incr(VIEW_KEY.format(post_id)), 0)
+
+    with _lock:
+        _touched.add(post_id)
+        _hits_since_flush += 1
+        due = (_hits_since_flush >= FLUSH_THRESHOLD
+               or time.monotonic() - _last_flush >= FLUSH_INTERVAL)
+
+    if due:
+        try:
+            flush_views()
+        except DatabaseError:
+            # Counts stay buffered and go out with the next flush
+            logger.exception('Could not flush buffered blog views')
+    return buffered
+
+
+def flush_views(post_ids=None, wait=False):
+    """
+    Write buffered views to the database.
+    Flushes the posts this process has counted, or `post_ids` if given.
+    If another process is flushing, waits for it when `wait` is set and
+    otherwise leaves the counts buffered for a later flush.
+    Returns the number of views written.
+    """
+    global _hits_since_flush, _last_flush
+    if post_ids is None:
+        with _lock:
+            post_ids = list(_touched)
+            _touched.clear()
+            _hits_since_flush = 0
+            _last_flush = time.monotonic()
+
+    post_ids = list(post_ids)
+    if not post_ids:
+        return 0
+    with _flush_lock(wait) as locked:
+        if not locked:
+            with _lock:
+                _touched.update(post_ids)
+            return 0
+        flushed = 0
+        for start in range(0, len(post_ids), FLUSH_BATCH_SIZE):
+            flushed += _flush_batch(post_ids[start:start + FLUSH_BATCH_SIZE])
+    return flushed
+
+
+@contextmanager
+def _flush_lock(wait):
+    """Hold the cache lock that serialises flushes; yields whether it was taken"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + FLUSH_LOCK_TIMEOUT
+    while not cache.add(FLUSH_LOCK_KEY, token, timeout=FLUSH_LOCK_TIMEOUT):
+        if not wait or time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.05)
+    try:
+        yield True
+    finally:
+        # Not if it timed out and another flusher holds it now
+        if cache.get(FLUSH_LOCK_KEY) == token:
+            cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush_batch(post_ids):
+    keys = {VIEW_KEY.format(pk): pk for pk in post_ids}
+    buffered = cache.get_many(keys)
+
+    # Take the counts out of the cache first; decr is atomic, so hits that
+    # land while we write stay buffered for the next flush
+    by_increment = defaultdict(list)
+    for key, count in buffered.items():
+        if count:
+            cache.decr(key, count)
+            by_increment[count].append(keys[key])
+    if not by_increment:
+        return 0
+
+    try:
+        with transaction.atomic():
+            for count, pks in by_increment.items():
+                BlogPost.objects.filter(pk__in=pks).update(views=F('views') + count)
+    except DatabaseError:
+        # Put the counts back so nothing is lost
+        for count, pks in by_increment.items():
+            for pk in pks:
+                cache.incr(VIEW_KEY.format(pk), count)
+        with _lock:
+            _touched.update(pk for pks in by_increment.values() for pk in pks)
+        raise
+
+    return sum(count * len(pks) for count, pks in by_increment.items())
+
+
+def drain_all_views():
+    """Flush buffered views for every post - used by flush_view_counts"""
+    post_ids = BlogPost.objects.values_list('pk', flat=True).order_by('pk')
+    flushed = 0
+    batch = []
+    for pk in post_ids.iterator(chunk_size=FLUSH_BATCH_SIZE):
+        batch.append(pk)
+        if len(batch) >= FLUSH_BATCH_SIZE:
+            flushed += flush_views(batch, wait=True)
+            batch = []
+    if batch:
+        flushed += flush_views(batch, wait=True)
+    return flushed
+
+
+@atexit.register
+def _flush_on_shutdown():
+    """Drain this worker's buffer when the process exits"""
+    try:
+        flush_views()
+    except Exception:
+        logger.exception('Could not flush buffered blog views on shutdown')
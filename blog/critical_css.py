@@ -0,0 +1,277 @@
+# blog/critical_css.py - Critical CSS for each family of page templates
+#
+# The site's stylesheets are static/css/base.css (every page extending
+# base.html) and static/css/home.css (the home page). `manage.py
+# build_critical_css` renders sample pages of each template family and
+# keeps the rules that style the top of their <body>: the markup that fills
+# a phone screen before any scrolling. The {% critical_css %} tag inlines
+# those rules in the <head>. It preloads the full stylesheet and switches it
+# on once it arrives, so the page can paint without waiting for it.
+#
+# The extraction is static: a rule is kept if every tag, class and id in
+# its selector appears in the sampled markup, ignoring pseudo-classes and
+# combinators. That keeps a few rules too many but never drops one that
+# applies. critical_css.json stores each family's rules, keyed on the
+# stylesheet and the template files the samples rendered. A rebuild only
+# extracts again for families whose files changed.
+#
+# With CRITICAL_CSS off (the default with DEBUG on) the tag links the full
+# stylesheet, so edits to it show up without a rebuild.
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from datinghub_project.storage import minify_css
+from .models import BlogPost
+
+DEFAULT_STYLESHEET = 'css/base.css'
+# family -> its stylesheet, the template names it covers (prefixes) and
+# the pages sampled for it (URL names)
+FAMILIES = {
+    'home': {
+        'stylesheet': 'css/home.css',
+        'templates': ('home/',),
+        'pages': ('research:home',),
+    },
+    'research': {
+        'stylesheet': DEFAULT_STYLESHEET,
+        'templates': ('research/',),
+        'pages': (
+            'research:research_index', 'research:micromance', 'research:ai_matchmaking',
+            'research:methodology', 'research:research_ethics', 'research:digital_boundaries',
+        ),
+    },
+    'blog_index': {
+        'stylesheet': DEFAULT_STYLESHEET,
+        'templates': ('blog/index.html', 'blog/category.html', 'blog/tag.html', 'blog/search.html'),
+        'pages': ('blog:blog_index',),
+    },
+    'blog_detail': {
+        'stylesheet': DEFAULT_STYLESHEET,
+        'templates': ('blog/detail.html',),
+        'pages': ('blog:blog_detail',),  # the latest post
+    },
+    'tools': {
+        'stylesheet': DEFAULT_STYLESHEET,
+        'templates': ('tools/', 'pages/'),
+        'pages': (
+            'research:dating_recommendations', 'research:data_library', 'research:privacy',
+            'research:terms', 'research:about', 'research:contact',
+        ),
+    },
+}
+# Characters of <body> markup, scripts and styles left out, taken to be
+# what a phone shows before scrolling: the header and the first block of
+# the page's content
+FOLD_CHARS = 6000
+
+# The manifest as last read, and the mtime it was read at
+_loaded = {'mtime': None, 'entries': {}}
+
+
+def enabled():
+    return getattr(settings, 'CRITICAL_CSS', not settings.DEBUG)
+
+
+def manifest_file():
+    return Path(getattr(settings, 'CRITICAL_CSS_FILE', settings.BASE_DIR / 'var' / 'critical_css.json'))
+
+
+def family_for(template_name):
+    for family, spec in FAMILIES.items():
+        if template_name.startswith(spec['templates']):
+            return family
+    return None
+
+
+def _sample_paths(family):
+    paths = []
+    for name in FAMILIES[family]['pages']:
+        if name == 'blog:blog_detail':
+            post = BlogPost.objects.published().first()
+            if post is not None:
+                paths.append(post.get_absolute_url())
+        else:
+            paths.append(reverse(name))
+    return paths
+
+
+# ===== EXTRACTION =====
+def _blocks(css):
+    """The top-level (prelude, body) pairs of a stylesheet without comments"""
+    blocks, depth, start = [], 0, 0
+    for i, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude, body_start = css[start:i].rsplit(';', 1)[-1], i + 1
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude.strip(), css[body_start:i]))
+                start = i + 1
+    return blocks
+
+
+def _fold(html):
+    """Tags, classes and ids at the top of the page's <body>"""
+    body = html[html.find('<body'):]
+    body = re.sub(r'<(script|style)\b.*?</\1>', '', body, flags=re.S | re.I)[:FOLD_CHARS]
+    tags = {tag.lower() for tag in re.findall(r'<([a-zA-Z][\w-]*)', body)} | {'html'}
+    classes = {name for value in re.findall(r'\sclass="([^"]*)"', body) for name in value.split()}
+    ids = set(re.findall(r'\sid="([^"]*)"', body))
+    return tags, classes, ids
+
+
+def _selector_used(selector, used):
+    tags, classes, ids = used
+    # Pseudo-classes (:hover, :not(...)), pseudo-elements and attribute
+    # selectors depend on state - only the names must be on the page
+    selector = re.sub(r'::?[\w-]+(\([^)]*\))?|\[[^\]]*\]', '', selector)
+    for token in re.findall(r'[.#]?[\w-]+', selector):
+        if token[0] == '.':
+            found = token[1:] in classes
+        elif token[0] == '#':
+            found = token[1:] in ids
+        else:
+            found = token.lower() in tags
+        if not found:
+            return False
+    return True
+
+
+def _used_rules(blocks, used):
+    rules = []
+    for prelude, body in blocks:
+        if prelude.startswith(('@media', '@supports')):
+            inner = _used_rules(_blocks(body), used)
+            if inner:
+                rules.append(f'{prelude}{{{inner}}}')
+        elif not prelude.startswith('@'):
+            selectors = [s.strip() for s in prelude.split(',') if _selector_used(s, used)]
+            if selectors:
+                rules.append(f'{",".join(selectors)}{{{body}}}')
+    return ''.join(rules)
+
+
+def extract(css, pages):
+    """The rules of the stylesheet `css` used at the top of any of the HTML `pages`"""
+    used = (set(), set(), set())
+    for html in pages:
+        for names, found in zip(used, _fold(html)):
+            names |= found
+    blocks = _blocks(re.sub(r'/\*.*?\*/', '', css, flags=re.S))
+    rules = _used_rules(blocks, used)
+    # Fonts always, animations if a kept rule runs them
+    at_rules = [
+        f'{prelude}{{{body}}}' for prelude, body in blocks
+        if prelude.startswith('@font-face')
+        or (prelude.startswith('@keyframes') and re.search(rf'\b{re.escape(prelude.split()[-1])}\b', rules))
+    ]
+    return minify_css(''.join(at_rules) + rules)
+
+
+# ===== BUILD =====
+def _files_digest(names):
+    digest = hashlib.sha256()
+    for name in names:
+        try:
+            digest.update(hashlib.sha256(Path(name).read_bytes()).digest())
+        except OSError:
+            digest.update(b'gone')
+    return digest.hexdigest()
+
+
+def build(host=None, force=False):
+    """
+    Extract the critical CSS of every family whose stylesheet, templates or
+    sample pages changed. Returns (families extracted, families in total).
+    """
+    from . import static_site  # imports this module
+
+    previous = read_manifest()
+    manifest, extracted = {}, 0
+    for family, spec in FAMILIES.items():
+        stylesheet = finders.find(spec['stylesheet'])
+        paths = _sample_paths(family)
+        if not stylesheet or not paths:
+            continue
+        old = previous.get(family)
+        if (
+            not force and old and old['paths'] == paths and old['stylesheet'] == spec['stylesheet']
+            and old['key'] == _files_digest([stylesheet, *old['templates']])
+        ):
+            manifest[family] = old
+            continue
+
+        pages, templates = [], set()
+        for path in paths:
+            response, rendered = static_site.render_page(path, host or static_site.site_host())
+            if response.status_code == 200:
+                pages.append(response.content.decode())
+                templates |= rendered
+        templates = sorted(templates)
+        manifest[family] = {
+            'stylesheet': spec['stylesheet'],
+            'paths': paths,
+            'templates': templates,
+            'key': _files_digest([stylesheet, *templates]),
+            'css': extract(Path(stylesheet).read_text(), pages),
+        }
+        extracted += 1
+
+    static_site._write(manifest_file(), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return extracted, len(manifest)
+
+
+def read_manifest():
+    try:
+        return json.loads(manifest_file().read_bytes())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def digest():
+    """Changes whenever a build changes any family's critical CSS"""
+    return hashlib.sha256(json.dumps(
+        {family: entry['css'] for family, entry in read_manifest().items()}, sort_keys=True,
+    ).encode()).hexdigest()
+
+
+# ===== SERVING =====
+def _entries():
+    """The manifest, re-read whenever a build replaces it"""
+    try:
+        mtime = manifest_file().stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if mtime != _loaded['mtime']:
+        _loaded.update(mtime=mtime, entries=read_manifest())
+    return _loaded['entries']
+
+
+def stylesheet_tags(template_name):
+    """
+    The <head> markup for a page rendered from `template_name`: its
+    family's critical CSS and a non-blocking load of the full stylesheet,
+    or a plain <link> if there is no critical CSS for it.
+    """
+    family = family_for(template_name or '')
+    stylesheet = FAMILIES[family]['stylesheet'] if family else DEFAULT_STYLESHEET
+    url = escape(static(stylesheet))
+    entry = _entries().get(family) if family and enabled() else None
+    if entry is None or entry['stylesheet'] != stylesheet:
+        return mark_safe(f'<link rel="stylesheet" href="{url}">')
+    css = entry['css'].replace('</', '<\\/')
+    return mark_safe(
+        f'<style>{css}</style>\n'
+        f'    <link rel="preload" href="{url}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        f'    <noscript><link rel="stylesheet" href="{url}"></noscript>'
+    )
@@ -0,0 +1,85 @@
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from blog.models import BlogPost
+from blog.pagination import KeysetPaginator
+
+PARAGRAPH = (
+    'Researchers asked {n} participants how dating apps changed the way they meet partners, '
+    'and most described a tension between convenience and fatigue after months of swiping. '
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare memory and time per listing page for full rows vs the card projection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500, help='Synthetic posts to create')
+        parser.add_argument('--words', type=int, default=2500, help='Words per article body')
+        parser.add_argument('--page-size', type=int, default=9)
+        parser.add_argument('--repeat', type=int, default=50, help='Pages loaded per measurement')
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            self.create_posts(options['posts'], options['words'])
+            results = {
+                'full rows': BlogPost.objects.published(),
+                'cards()': BlogPost.objects.published().cards(),
+            }
+            for label, queryset in results.items():
+                results[label] = self.measure(queryset, options['page_size'], options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{options['posts']} posts of ~{options['words']} words, "
+                          f"{options['page_size']} per page, {options['repeat']} pages each")
+        self.stdout.write(f"{'':<10} {'ms/page':>10} {'peak KiB/page':>14}")
+        for label, (ms, kib) in results.items():
+            self.stdout.write(f'{label:<10} {ms:>10.2f} {kib:>14.1f}')
+        (full_ms, full_kib), (card_ms, card_kib) = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f'cards() uses {full_kib / max(card_kib, 0.1):.1f}x less memory '
+            f'and is {full_ms / max(card_ms, 0.001):.1f}x faster per page.'
+        ))
+
+    def create_posts(self, total, words):
+        sentence_words = len(PARAGRAPH.split())
+        body = ''.join(
+            f'<p>{PARAGRAPH.format(n=n)}</p>\n' for n in range(max(1, words // sentence_words))
+        )
+        now = timezone.now()
+        BlogPost.objects.bulk_create([
+            BlogPost(
+                title=f'Benchmark post {i}', slug=f'benchmark-post-{i}', status='published',
+                content=body, excerpt=body[3:160], meta_description=body[3:300],
+                published_date=now - timedelta(minutes=i),
+            ) for i in range(total)
+        ], batch_size=500)
+
+    def measure(self, queryset, page_size, repeat):
+        """(ms, peak KiB) to load one page of model instances, averaged"""
+        # A cache_key, as the views pass, so the page boundaries are cached
+        paginator = KeysetPaginator(queryset, page_size, cache_key=('benchmark', uuid.uuid4().hex))
+        page_numbers = [1 + n % 5 for n in range(repeat)]
+        paginator.get_page(2)  # build the page boundaries outside the measurement
+        try:
+            started = time.perf_counter()
+            for number in page_numbers:
+                list(paginator.get_page(number))
+            elapsed = (time.perf_counter() - started) * 1000 / repeat
+
+            peaks = []
+            for number in page_numbers[:10]:
+                tracemalloc.start()
+                list(paginator.get_page(number))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        finally:
+            cache.delete(paginator.boundaries_cache_key())
+        return elapsed, sum(peaks) / len(peaks) / 1024
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from blog.critical_css import build, manifest_file
+
+
+class Command(BaseCommand):
+    help = 'Extract the critical CSS of each page template family, for inlining in the <head>'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', help='Host to render the sample pages for (default: STATIC_SITE_HOST)')
+        parser.add_argument('--force', action='store_true', help='Extract every family, changed or not')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        extracted, total = build(options['host'], options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Extracted critical CSS for {extracted} of {total} families into {manifest_file()} '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,25 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from blog.static_site import brotli, build, site_host, site_root
+
+
+class Command(BaseCommand):
+    help = 'Prebuild the research and blog pages as HTML, gzip and brotli files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to build into (default: STATIC_SITE_ROOT)')
+        parser.add_argument('--host', help='Host for absolute URLs in the pages (default: STATIC_SITE_HOST)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Rebuild every page, changed or not')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rendered, total = build(options['output'], options['host'], options['processes'], options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} of {total} pages into {options["output"] or site_root()} '
+            f'for {options["host"] or site_host()} in {time.monotonic() - started:.1f}s.'
+        ))
+        if brotli is None:
+            self.stdout.write('brotli is not installed - built HTML and gzip only.')
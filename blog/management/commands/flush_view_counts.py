@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog.counters import drain_all_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered blog post views from the cache to the database'
+
+    def handle(self, *args, **options):
+        flushed = drain_all_views()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered views.'))
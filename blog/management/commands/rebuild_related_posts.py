@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from blog.related import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute content-similarity vectors and related posts for every published post'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} posts in {time.monotonic() - started:.1f}s.'
+        ))
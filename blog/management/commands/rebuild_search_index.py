@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from blog.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from every blog post'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} posts with {type(get_backend()).__name__} in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:38
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The search index is backend-specific, so its tables are created here
+# rather than from a model. Run `manage.py rebuild_search_index` to fill it.
+POSTGRES_FORWARD = [
+    """CREATE TABLE blog_searchdocument (
+        post_id bigint PRIMARY KEY REFERENCES blog_blogpost (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )""",
+    "CREATE INDEX blog_searchdocument_gin ON blog_searchdocument USING GIN (document)",
+]
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE blog_search_fts USING fts5(
+        title, excerpt, content, tags, tokenize = 'porter unicode61'
+    )""",
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {
+        'postgresql': POSTGRES_FORWARD,
+        'sqlite': SQLITE_FORWARD,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    table = {
+        'postgresql': 'blog_searchdocument',
+        'sqlite': 'blog_search_fts',
+    }.get(schema_editor.connection.vendor)
+    if table:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_related_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('post', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='blog.blogpost')),
+                ('document', django.contrib.postgres.search.SearchVectorField()),
+            ],
+            options={
+                'db_table': 'blog_searchdocument',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
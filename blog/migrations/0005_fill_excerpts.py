@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+def make_excerpt(content, length=160):
+    """blog.models.make_excerpt as of this migration - frozen so later changes don't alter it"""
+    return Truncator(' '.join(strip_tags(content).split())).chars(length)
+
+
+def fill_excerpts(apps, schema_editor):
+    """Posts saved before excerpts were generated on save"""
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    posts = BlogPost.objects.filter(excerpt='').only('id', 'content')
+    for post in posts.iterator(chunk_size=500):
+        BlogPost.objects.filter(pk=post.pk).update(excerpt=make_excerpt(post.content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
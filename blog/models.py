@@ -2,7 +2,13 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from django.utils.html import strip_tags
+from django.utils.text import Truncator, slugify
+from django.contrib.postgres.search import SearchVectorField
+
+def make_excerpt(content, length=160):
+    """Plain-text excerpt of an HTML body for listing cards"""
+    return Truncator(' '.join(strip_tags(content).split())).chars(length)
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -19,6 +25,26 @@ class Tag(models.Model):
     class Meta:
         ordering = ['name']
 
+# Columns the post cards on listing pages render - never the article body
+CARD_FIELDS = ('id', 'title', 'slug', 'excerpt', 'category', 'featured_image',
+               'author', 'read_time', 'views', 'published_date')
+
+class BlogPostQuerySet(models.QuerySet):
+    def published(self):
+        """Posts that are live right now (published and not scheduled)"""
+        return self.filter(status='published', published_date__lte=timezone.now())
+    
+    def next_scheduled_date(self):
+        """published_date of the next scheduled post, or None"""
+        return self.filter(
+            status='published',
+            published_date__gt=timezone.now()
+        ).order_by('published_date').values_list('published_date', flat=True).first()
+    
+    def cards(self):
+        """Only the CARD_FIELDS listing pages need"""
+        return self.only(*CARD_FIELDS)
+
 class BlogPost(models.Model):
     CATEGORY_CHOICES = [
         ('research', 'Research Insights'),
@@ -77,6 +103,8 @@ class BlogPost(models.Model):
     is_featured = models.BooleanField(default=False)
     canonical_url = models.URLField(blank=True, help_text="Canonical URL for SEO (if republished)")
     
+    objects = BlogPostQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-published_date']
         indexes = [
@@ -114,6 +142,10 @@ class BlogPost(models.Model):
         word_count = len(self.content.split())
         self.read_time = max(1, word_count // 200)
         
+        # Listing cards show the excerpt, so they never need to load content
+        if not self.excerpt:
+            self.excerpt = make_excerpt(self.content)
+        
         super().save(*args, **kwargs)
     
     def get_author_initials(self):
@@ -134,3 +166,64 @@ class BlogPost(models.Model):
     def word_count(self):
         """Calculate word count for SEO"""
         return len(self.content.split())
+
+
+class PostTerm(models.Model):
+    """
+    One weighted term of a post's TF-IDF vector - the inverted index the
+    related-posts engine (blog/related.py) looks candidates up in
+    """
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=40)
+    weight = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.term} ({self.weight:.3f})"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', '-weight']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'term'], name='unique_post_term'),
+        ]
+
+class TermStat(models.Model):
+    """Document frequency of a term, snapshotted by rebuild_related_posts"""
+    term = models.CharField(max_length=40, unique=True)
+    doc_count = models.PositiveIntegerField()
+    
+    def __str__(self):
+        return f"{self.term} ({self.doc_count} posts)"
+
+class RelatedPost(models.Model):
+    """Precomputed nearest neighbours of a post, by content similarity"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_to')
+    score = models.FloatField()
+    
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} ({self.score:.3f})"
+    
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['post', '-score']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='unique_related_post'),
+        ]
+
+class SearchDocument(models.Model):
+    """
+    Full-text document of a post for the Postgres search backend.
+    The table (with its GIN index) only exists on Postgres - see
+    migration 0004 and blog/search.py.
+    """
+    post = models.OneToOneField(BlogPost, on_delete=models.DO_NOTHING, primary_key=True,
+                                related_name='search_document', db_constraint=False)
+    document = SearchVectorField()
+    
+    class Meta:
+        managed = False
+        db_table = 'blog_searchdocument'
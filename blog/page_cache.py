@@ -0,0 +1,148 @@
+# blog/page_cache.py - Full-page cache for published blog pages
+#
+# Pages are keyed on path, page number and anonymous/authenticated state.
+# Every key also carries two generation tokens - one for the whole blog and
+# one for the path - so a purge is a single cache.set(), without key
+# scanning. Every worker must read the same generations, so production uses
+# the shared Redis cache (CACHES in settings.py); with the per-process locmem
+# default a purge only reaches the process that made it.
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse
+from . import static_site
+from .counters import record_view
+from .sidebar import seconds_until_next_publish
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 60 * 10)
+GLOBAL_GENERATION_KEY = 'blog:page:gen'
+PATH_GENERATION_KEY = 'blog:page:gen:{}'
+
+# Changing any of these on a post changes listings, sidebars and the
+# prev/next/related blocks of other posts - not just the post's own pages
+SITEWIDE_FIELDS = ('status', 'published_date', 'category', 'slug', 'title', 'featured_image')
+
+
+def _path_hash(path):
+    return hashlib.md5(path.encode()).hexdigest()
+
+
+def page_generations(path):
+    """Current (global, path) generation tokens, creating them if missing"""
+    keys = [GLOBAL_GENERATION_KEY, PATH_GENERATION_KEY.format(_path_hash(path))]
+    found = cache.get_many(keys)
+    tokens = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            cache.add(key, uuid.uuid4().hex[:12], timeout=None)
+            token = cache.get(key)
+        tokens.append(token)
+    return tokens
+
+
+def page_cache_key(request):
+    path = request.path
+    global_gen, path_gen = page_generations(path)
+    page = request.GET.get('page', '1')
+    state = 'auth' if request.user.is_authenticated else 'anon'
+    return f'blog:page:{global_gen}:{path_gen}:{_path_hash(path)}:{page}:{state}'
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Only ?page= is part of the key; anything else renders uncached
+    return set(request.GET) <= {'page'}
+
+
+def cache_blog_page(view_func):
+    """
+    Serve a blog view from the page cache. Entries expire after
+    BLOG_PAGE_CACHE_TIMEOUT, or the moment the next scheduled post goes
+    live, whichever comes first.
+
+    A view can set `response.blog_post_pk` so cache hits still count a view.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            if cached['post_pk']:
+                record_view(cached['post_pk'])
+            return HttpResponse(cached['content'], status=cached['status'], headers=cached['headers'])
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            cache.set(key, {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': dict(response.items()),
+                'post_pk': getattr(response, 'blog_post_pk', None),
+            }, seconds_until_next_publish(PAGE_CACHE_TIMEOUT))
+        return response
+    return wrapper
+
+
+# ===== PURGING =====
+def purge_paths(paths):
+    cache.set_many(
+        {PATH_GENERATION_KEY.format(_path_hash(path)): uuid.uuid4().hex[:12] for path in paths},
+        timeout=None,
+    )
+    static_site.discard(paths)
+
+
+def purge_all():
+    cache.set(GLOBAL_GENERATION_KEY, uuid.uuid4().hex[:12], timeout=None)
+    static_site.discard_blog()
+
+
+def post_paths(post, tag_slugs=()):
+    """
+    Pages a post appears on: its detail page, category, tags and the index.
+    The sitemap path stands for all sitemaps and feeds (blog/syndication.py).
+    """
+    paths = {
+        reverse('blog:blog_index'),
+        reverse('blog:blog_sitemap'),
+        reverse('blog:blog_detail', kwargs={'slug': post.slug}),
+        reverse('blog:blog_category', kwargs={'category_slug': post.category}),
+    }
+    paths.update(reverse('blog:blog_tag', kwargs={'tag_slug': slug}) for slug in tag_slugs)
+    return paths
+
+
+def _sitewide_change(previous, post):
+    for field in SITEWIDE_FIELDS:
+        old, new = previous[field], getattr(post, field)
+        if field == 'featured_image':
+            # FieldFile vs the stored name ('' or None when empty)
+            old, new = old or '', new.name or ''
+        if old != new:
+            return True
+    return False
+
+
+def purge_post(post, previous=None):
+    """
+    Purge the pages affected by a saved or deleted post. `previous` holds
+    the SITEWIDE_FIELDS values from before the save (None for new posts).
+    """
+    was_published = previous is not None and previous['status'] == 'published'
+    if not was_published and post.status != 'published':
+        return  # drafts never reach the cache
+    if previous is None or _sitewide_change(previous, post):
+        # Publishing, scheduling, renaming or moving a post changes listings
+        # and the neighbour/related blocks of other posts
+        purge_all()
+        return
+    purge_paths(post_paths(post, post.tags.values_list('slug', flat=True)))
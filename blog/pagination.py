@@ -0,0 +1,174 @@
+# blog/pagination.py - Keyset (cursor) pagination for blog listings
+#
+# A page is read with WHERE (published_date, id) < (last row of the previous
+# page) ORDER BY published_date DESC, id DESC LIMIT n, which walks the
+# published_date index instead of counting and skipping rows. ?page=N URLs
+# keep working: page numbers map to cursors through a cached table of page
+# boundaries, built with a single index scan per content version.
+import base64
+import hashlib
+import math
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.functional import cached_property
+from datinghub_project.db import approximate_count
+
+BOUNDARIES_CACHE_KEY = 'blog:page_keys:{}'
+BOUNDARIES_CACHE_TIMEOUT = getattr(settings, 'BLOG_PAGE_KEYS_CACHE_TIMEOUT', 60 * 60)
+ORDERING = ('-published_date', '-id')
+
+
+def encode_cursor(published_date, pk, number):
+    """Opaque cursor pointing just past (published_date, pk) on page `number`"""
+    raw = f'{published_date.isoformat()}|{pk}|{number}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """((published_date, pk), number) from a cursor; InvalidPage if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        published_date, pk, number = raw.split('|')
+        return (datetime.fromisoformat(published_date), int(pk)), int(number)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidPage('Invalid cursor')
+
+
+class KeysetPage(Sequence):
+    """One page of a KeysetPaginator - mirrors django.core.paginator.Page"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def nearby_page_range(self):
+        """Page numbers within two of this one, for numbered page links"""
+        return range(max(1, self.number - 2), min(self.paginator.num_pages, self.number + 2) + 1)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.published_date, last.pk, self.number)
+
+
+class KeysetPaginator:
+    """
+    Paginate posts newest first on (published_date, id).
+
+    `cache_key` identifies the listing and its content version; it keys the
+    page boundary table behind get_page(). `count` is optional - without it
+    the total comes from approximate_count(), and only if something asks.
+    """
+
+    def __init__(self, queryset, per_page, cache_key=None, count=None):
+        self.queryset = queryset.order_by(*ORDERING)
+        self.per_page = per_page
+        self.cache_key = cache_key
+        if count is not None:
+            self.count = count
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.queryset)
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    def _page(self, after, number):
+        queryset = self.queryset
+        if after is not None:
+            published_date, pk = after
+            queryset = queryset.filter(
+                Q(published_date__lt=published_date) | Q(published_date=published_date, pk__lt=pk)
+            )
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    def page_after(self, cursor):
+        """The page following the one `cursor` came from"""
+        after, number = decode_cursor(cursor)
+        return self._page(after, number + 1)
+
+    def boundaries_cache_key(self):
+        """The cache key of page_boundaries(), None without a cache_key"""
+        if self.cache_key is None:
+            return None
+        return BOUNDARIES_CACHE_KEY.format(hashlib.md5(f'{self.cache_key}:{self.per_page}'.encode()).hexdigest())
+
+    def page_boundaries(self):
+        """
+        (key of the last row of every full page, total rows). One scan over
+        (published_date, id), cached under cache_key.
+        """
+        key = self.boundaries_cache_key()
+        if key is not None:
+            found = cache.get(key)
+            if found is not None:
+                return found
+
+        boundaries, total = [], 0
+        keys = self.queryset.prefetch_related(None).values_list('published_date', 'pk')
+        for total, row in enumerate(keys.iterator(chunk_size=2000), start=1):
+            if total % self.per_page == 0:
+                boundaries.append(row)
+        if key is not None:
+            cache.set(key, (boundaries, total), BOUNDARIES_CACHE_TIMEOUT)
+        return boundaries, total
+
+    def get_page(self, number):
+        """
+        Page `number`, forgiving like Paginator.get_page(): anything that
+        isn't a page number gives page 1, past the end gives the last page.
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if number <= 1:
+            return self._page(None, 1)
+
+        boundaries, total = self.page_boundaries()
+        self.count = total
+        number = min(number, self.num_pages)
+        if number == 1:
+            return self._page(None, 1)
+        return self._page(boundaries[number - 2], number)
@@ -0,0 +1,261 @@
+# blog/related.py - Content-similarity engine for "Related Articles"
+#
+# Each published post is turned into a TF-IDF vector over its title, tags
+# and content, keeping only its strongest terms. Those terms form an
+# inverted index (PostTerm), and a post's neighbours are scored from the
+# postings of its own terms only. Each term contributes at most its
+# MAX_POSTINGS strongest postings, so the work per post is bounded and a
+# full rebuild grows linearly with the number of posts instead of with
+# every pair of posts.
+import math
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.html import strip_tags
+from .models import BlogPost, PostTerm, RelatedPost, TermStat
+
+# Neighbours stored per post - more than the detail page shows, so posts
+# that get unpublished or deleted leave spares behind
+RELATED_PER_POST = getattr(settings, 'BLOG_RELATED_PER_POST', 8)
+TERMS_PER_POST = getattr(settings, 'BLOG_RELATED_TERMS_PER_POST', 32)
+# Postings scanned per term, strongest first - caps the candidates per post
+MAX_POSTINGS = getattr(settings, 'BLOG_RELATED_MAX_POSTINGS', 100)
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 3
+BLOCK_SIZE = 256
+WRITE_BATCH_SIZE = 5000
+LOOKUP_BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+STOP_WORDS = frozenset("""
+    about above after again against all also and any are because been before
+    being below between both but can could did does doing down during each
+    few for from further had has have having her here hers herself him himself
+    his how into its itself just more most not now off once only other our ours
+    ourselves out over own same she should some such than that the their theirs
+    them themselves then there these they this those through too under until
+    very was were what when where which while who whom why will with would you
+    your yours yourself yourselves one two may many much well even get like
+""".split())
+
+
+# ===== VECTORIZING =====
+def term_counts(title, content, tag_names):
+    """Weighted term counts for a post - title and tag words count extra"""
+    counts = Counter()
+    sources = ((title, TITLE_WEIGHT), (strip_tags(content), 1), (' '.join(tag_names), TAG_WEIGHT))
+    for text, weight in sources:
+        for token in TOKEN_RE.findall(text.lower()):
+            if 2 < len(token) <= 40 and token not in STOP_WORDS:
+                counts[token] += weight
+    return counts
+
+
+def weigh(counts, doc_counts, total_docs):
+    """The post's TERMS_PER_POST strongest TF-IDF terms, L2-normalised"""
+    weights = {
+        term: (1 + math.log(count)) * (math.log((1 + total_docs) / (1 + doc_counts.get(term, 0))) + 1)
+        for term, count in counts.items()
+    }
+    top = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:TERMS_PER_POST]
+    norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+    return {term: weight / norm for term, weight in top}
+
+
+def _published_documents():
+    """(pk, term counts) for every published post, streamed"""
+    tag_names = defaultdict(list)
+    tagged = BlogPost.tags.through.objects.filter(blogpost__status='published')
+    for post_id, name in tagged.values_list('blogpost_id', 'tag__name').iterator():
+        tag_names[post_id].append(name)
+
+    posts = BlogPost.objects.filter(status='published').values_list('pk', 'title', 'content').order_by('pk')
+    for pk, title, content in posts.iterator(chunk_size=500):
+        yield pk, term_counts(title, content, tag_names.get(pk, ()))
+
+
+# ===== FULL REBUILD =====
+def _bulk_insert(model, columns, rows):
+    """
+    INSERT plain tuples with executemany - bulk_create spends most of a
+    full rebuild building and preparing model instances
+    """
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(model._meta.get_field(c).column) for c in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, WRITE_BATCH_SIZE)):
+            cursor.executemany(sql, batch)
+
+
+def _score_blocks(doc_ptr, doc_terms, doc_weights, entry_doc, term_ptr, post_docs, post_weights):
+    """
+    Yield (source, candidate, score) index arrays of each document's top
+    RELATED_PER_POST neighbours, BLOCK_SIZE documents at a time.
+    """
+    total_docs = len(doc_ptr) - 1
+    term_len = np.diff(term_ptr)
+
+    for start in range(0, total_docs, BLOCK_SIZE):
+        lo, hi = doc_ptr[start], doc_ptr[min(start + BLOCK_SIZE, total_docs)]
+        terms, query_weights, sources = doc_terms[lo:hi], doc_weights[lo:hi], entry_doc[lo:hi]
+
+        # Expand every query term into its postings list (a ragged arange)
+        lengths = term_len[terms]
+        total = int(lengths.sum())
+        if not total:
+            continue
+        first = np.cumsum(lengths) - lengths
+        positions = np.repeat(term_ptr[terms] - first, lengths) + np.arange(total)
+
+        candidates = post_docs[positions]
+        sources = np.repeat(sources, lengths)
+        products = np.repeat(query_weights, lengths) * post_weights[positions]
+        not_self = candidates != sources
+
+        # Sum the products per (source, candidate) pair - the cosine similarity
+        pairs, inverse = np.unique(
+            sources[not_self].astype(np.int64) * total_docs + candidates[not_self],
+            return_inverse=True,
+        )
+        scores = np.bincount(inverse, weights=products[not_self])
+        sources, candidates = pairs // total_docs, pairs % total_docs
+
+        # Best RELATED_PER_POST per source
+        order = np.lexsort((-scores, sources))
+        sources, candidates, scores = sources[order], candidates[order], scores[order]
+        index = np.arange(len(sources))
+        group_start = np.maximum.accumulate(np.where(np.r_[True, sources[1:] != sources[:-1]], index, 0))
+        best = index - group_start < RELATED_PER_POST
+        yield sources[best], candidates[best], scores[best]
+
+
+def rebuild_all():
+    """
+    Recompute term statistics, vectors and neighbours for every published
+    post. Returns the number of posts indexed.
+    """
+    # Pass 1: document frequencies
+    doc_counts = Counter()
+    total_docs = 0
+    for _, counts in _published_documents():
+        doc_counts.update(counts.keys())
+        total_docs += 1
+    vocabulary = {term: index for index, term in enumerate(doc_counts)}
+    terms_by_index = list(doc_counts)
+
+    # Pass 2: vectors, as CSR arrays (one row per post)
+    post_ids, doc_ptr, doc_terms, doc_weights = [], [0], [], []
+    for pk, counts in _published_documents():
+        vector = weigh(counts, doc_counts, total_docs)
+        post_ids.append(pk)
+        doc_terms.extend(vocabulary[term] for term in vector)
+        doc_weights.extend(vector.values())
+        doc_ptr.append(len(doc_terms))
+    post_ids = np.array(post_ids, dtype=np.int64)
+    doc_ptr = np.array(doc_ptr, dtype=np.int64)
+    doc_terms = np.array(doc_terms, dtype=np.int64)
+    doc_weights = np.array(doc_weights, dtype=np.float64)
+
+    # Inverted index: postings grouped by term, strongest first, each list
+    # cut to MAX_POSTINGS
+    entry_doc = np.repeat(np.arange(len(post_ids)), np.diff(doc_ptr))
+    order = np.lexsort((-doc_weights, doc_terms))
+    sorted_terms = doc_terms[order]
+    index = np.arange(len(order))
+    group_start = np.maximum.accumulate(np.where(np.r_[True, sorted_terms[1:] != sorted_terms[:-1]], index, 0))
+    order = order[index - group_start < MAX_POSTINGS]
+    term_ptr = np.concatenate(([0], np.cumsum(np.bincount(doc_terms[order], minlength=len(vocabulary)))))
+
+    with transaction.atomic():
+        TermStat.objects.all().delete()
+        PostTerm.objects.all().delete()
+        RelatedPost.objects.all().delete()
+
+        _bulk_insert(TermStat, ('term', 'doc_count'), doc_counts.items())
+        _bulk_insert(PostTerm, ('post', 'term', 'weight'), zip(
+            post_ids[entry_doc].tolist(),
+            (terms_by_index[term] for term in doc_terms.tolist()),
+            doc_weights.tolist(),
+        ))
+        for sources, candidates, scores in _score_blocks(
+            doc_ptr, doc_terms, doc_weights, entry_doc, term_ptr, entry_doc[order], doc_weights[order],
+        ):
+            _bulk_insert(RelatedPost, ('post', 'related', 'score'), zip(
+                post_ids[sources].tolist(), post_ids[candidates].tolist(), scores.tolist(),
+            ))
+    return len(post_ids)
+
+
+# ===== INCREMENTAL UPDATE =====
+def _doc_counts(terms):
+    doc_counts = {}
+    terms = list(terms)
+    for start in range(0, len(terms), LOOKUP_BATCH_SIZE):
+        doc_counts.update(
+            TermStat.objects.filter(term__in=terms[start:start + LOOKUP_BATCH_SIZE])
+            .values_list('term', 'doc_count')
+        )
+    return doc_counts
+
+
+def update_post(post):
+    """
+    Re-index one post after it was saved or retagged: replace its vector and
+    neighbours, and add it to the neighbour lists of posts it now beats.
+    Uses the term statistics of the last full rebuild.
+    """
+    with transaction.atomic():
+        PostTerm.objects.filter(post=post).delete()
+        RelatedPost.objects.filter(related=post).delete()
+        if post.status != 'published':
+            RelatedPost.objects.filter(post=post).delete()
+            return
+
+        counts = term_counts(post.title, post.content, post.tags.values_list('name', flat=True))
+        doc_counts = _doc_counts(counts)
+        total_docs = BlogPost.objects.filter(status='published').count()
+        vector = weigh(counts, doc_counts, total_docs)
+        PostTerm.objects.bulk_create([PostTerm(post=post, term=t, weight=w) for t, w in vector.items()])
+
+        # Score candidates from the strongest postings of this post's terms
+        postings = PostTerm.objects.exclude(post=post)
+        rare = [t for t in vector if doc_counts.get(t, 0) <= MAX_POSTINGS]
+        rows = list(postings.filter(term__in=rare).values_list('post_id', 'weight', 'term'))
+        for term in vector.keys() - set(rare):
+            strongest = postings.filter(term=term).order_by('-weight')[:MAX_POSTINGS]
+            rows.extend(strongest.values_list('post_id', 'weight', 'term'))
+        postings = np.array(rows, dtype=object).reshape(-1, 3)
+        RelatedPost.objects.filter(post=post).delete()
+        if not len(postings):
+            return
+
+        products = postings[:, 1].astype(np.float64) * np.array([vector[t] for t in postings[:, 2]])
+        candidate_ids, inverse = np.unique(postings[:, 0].astype(np.int64), return_inverse=True)
+        scores = np.bincount(inverse, weights=products)
+        best = np.argsort(-scores, kind='stable')[:RELATED_PER_POST]
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post=post, related_id=int(candidate_ids[i]), score=float(scores[i])) for i in best
+        ])
+
+        # Similarity is symmetric: offer this post to its best candidates
+        for i in np.argsort(-scores, kind='stable')[:RELATED_PER_POST * 4]:
+            neighbour_id, score = int(candidate_ids[i]), float(scores[i])
+            current = list(
+                RelatedPost.objects.filter(post_id=neighbour_id).values_list('pk', 'score')
+            )
+            if len(current) < RELATED_PER_POST:
+                RelatedPost.objects.create(post_id=neighbour_id, related=post, score=score)
+            else:
+                weakest_pk, weakest_score = min(current, key=lambda row: row[1])
+                if score > weakest_score:
+                    RelatedPost.objects.filter(pk=weakest_pk).update(related=post, score=score)
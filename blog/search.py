@@ -0,0 +1,150 @@
+# blog/search.py - Full-text search over blog posts
+#
+# The backend follows the database: Postgres uses a tsvector column with a
+# GIN index (SearchDocument), SQLite an FTS5 virtual table. Other databases
+# fall back to icontains. Every backend offers the same three operations:
+# filter(queryset, query), index(post) and remove(post_id).
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+from .models import BlogPost, SearchDocument
+
+
+def _document(post):
+    """(title, excerpt, content, tags) text of a post as it gets indexed"""
+    tags = ' '.join(tag.name for tag in post.tags.all())  # uses prefetch_related('tags')
+    return post.title, post.excerpt, strip_tags(post.content), tags
+
+
+class PostgresSearchBackend:
+    CONFIG = 'english'
+
+    def filter(self, queryset, query):
+        search_query = SearchQuery(query, search_type='websearch', config=self.CONFIG)
+        return queryset.filter(search_document__document=search_query).annotate(
+            search_rank=SearchRank(F('search_document__document'), search_query),
+        ).order_by('-search_rank', '-published_date')
+
+    def index(self, post):
+        title, excerpt, content, tags = _document(post)
+        vector = (
+            SearchVector(Value(title), weight='A', config=self.CONFIG)
+            + SearchVector(Value(tags), weight='A', config=self.CONFIG)
+            + SearchVector(Value(excerpt), weight='B', config=self.CONFIG)
+            + SearchVector(Value(content), weight='C', config=self.CONFIG)
+        )
+        SearchDocument.objects.update_or_create(post_id=post.pk, defaults={'document': vector})
+
+    def remove(self, post_id):
+        SearchDocument.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchDocument.objects.all().delete()
+
+
+class SQLiteSearchBackend:
+    TABLE = 'blog_search_fts'
+    # bm25 column weights: title, excerpt, content, tags
+    WEIGHTS = '10.0, 5.0, 1.0, 10.0'
+    TOKEN_RE = re.compile(r'\w+')
+
+    def match_expression(self, query):
+        """User input as an FTS5 query: every word must match, quoted so
+        operators and punctuation in the input can't break the syntax"""
+        return ' '.join(f'"{token}"' for token in self.TOKEN_RE.findall(query))
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        table = self.TABLE
+        matches = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        # bm25() is lower-is-better, so negate it to match the Postgres rank
+        rank = RawSQL(
+            f'SELECT -bm25({table}, {self.WEIGHTS}) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = {BlogPost._meta.db_table}.id',
+            [match], output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank', '-published_date')
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.TABLE} (rowid, title, excerpt, content, tags) VALUES (%s, %s, %s, %s, %s)',
+                [post.pk, *_document(post)],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE} WHERE rowid = %s', [post_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE}')
+
+
+class BasicSearchBackend:
+    """Unranked icontains search for databases without a full-text backend"""
+
+    def filter(self, queryset, query):
+        matches = Q()
+        for word in query.split():
+            matches &= (Q(title__icontains=word) | Q(excerpt__icontains=word)
+                        | Q(content__icontains=word) | Q(tags__name__icontains=word))
+        return queryset.filter(matches).distinct().annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+        ).order_by('-published_date')
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def clear(self):
+        pass
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, BasicSearchBackend)()
+
+
+# ===== PUBLIC API =====
+def search_posts(query, queryset=None):
+    """Posts matching `query`, best match first (published posts by default)"""
+    if queryset is None:
+        queryset = BlogPost.objects.published()
+    query = query.strip()
+    if not query:
+        return queryset.none()
+    return get_backend().filter(queryset, query)
+
+
+def index_post(post):
+    get_backend().index(post)
+
+
+def remove_post(post_id):
+    get_backend().remove(post_id)
+
+
+def rebuild_index():
+    """Re-index every post. Returns the number of posts indexed."""
+    backend = get_backend()
+    backend.clear()
+    indexed = 0
+    for post in BlogPost.objects.prefetch_related('tags').iterator(chunk_size=500):
+        backend.index(post)
+        indexed += 1
+    return indexed
@@ -0,0 +1,78 @@
+# blog/sidebar.py - Shared, cached sidebar data for all blog pages
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import BlogPost, Tag
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+SIDEBAR_CACHE_TIMEOUT = getattr(settings, 'BLOG_SIDEBAR_CACHE_TIMEOUT', 60 * 60)
+
+RECENT_POSTS_LIMIT = 5
+POPULAR_TAGS_LIMIT = 10
+
+
+def seconds_until_next_publish(default):
+    """
+    Cap a cache timeout so cached data expires the moment the next
+    scheduled post goes live.
+    """
+    next_date = BlogPost.objects.next_scheduled_date()
+    if next_date is None:
+        return default
+    remaining = int((next_date - timezone.now()).total_seconds()) + 1
+    return max(1, min(default, remaining))
+
+
+def build_sidebar():
+    """Build sidebar data from the database (3 queries)"""
+    now = timezone.now()
+
+    # Category counts - one grouped aggregate instead of a query per category
+    counts = dict(
+        BlogPost.objects.published()
+        .values_list('category')
+        .annotate(post_count=Count('id'))
+        .order_by()
+    )
+    categories = [
+        {'name': label, 'slug': value, 'post_count': counts[value]}
+        for value, label in BlogPost.CATEGORY_CHOICES
+        if counts.get(value)
+    ]
+
+    # Popular tags (with at least 2 published posts)
+    popular_tags = list(
+        Tag.objects.annotate(
+            post_count=Count('blogpost', filter=Q(
+                blogpost__status='published',
+                blogpost__published_date__lte=now,
+            ))
+        ).filter(post_count__gte=2).order_by('-post_count', 'name')[:POPULAR_TAGS_LIMIT]
+    )
+
+    # Recent posts - only the columns the sidebar renders
+    recent_posts = list(
+        BlogPost.objects.published()
+        .only('id', 'title', 'slug', 'published_date', 'featured_image')
+        .order_by('-published_date')[:RECENT_POSTS_LIMIT]
+    )
+
+    return {
+        'categories': categories,
+        'popular_tags': popular_tags,
+        'recent_posts': recent_posts,
+    }
+
+
+def get_sidebar():
+    """Return sidebar data, served from the cache when possible"""
+    sidebar = cache.get(SIDEBAR_CACHE_KEY)
+    if sidebar is None:
+        sidebar = build_sidebar()
+        cache.set(SIDEBAR_CACHE_KEY, sidebar, seconds_until_next_publish(SIDEBAR_CACHE_TIMEOUT))
+    return sidebar
+
+
+def invalidate_sidebar():
+    cache.delete(SIDEBAR_CACHE_KEY)
@@ -0,0 +1,112 @@
+# blog/signals.py - Cache invalidation when blog content changes
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from . import page_cache, related, search
+from .conditional import invalidate_listing_version
+from .models import BlogPost, Tag
+from .sidebar import invalidate_sidebar
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def blog_content_changed(sender, **kwargs):
+    invalidate_sidebar()
+    invalidate_listing_version()
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def blog_post_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_sidebar()
+        invalidate_listing_version()
+
+
+# ===== PAGE CACHE =====
+@receiver(pre_save, sender=BlogPost)
+def remember_previous_post(sender, instance, raw=False, **kwargs):
+    """Keep the pre-save values page_cache.purge_post compares against"""
+    instance._page_cache_previous = None
+    if instance.pk and not raw:
+        instance._page_cache_previous = (
+            BlogPost.objects.filter(pk=instance.pk)
+            .values(*page_cache.SITEWIDE_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=BlogPost)
+def purge_saved_post(sender, instance, **kwargs):
+    page_cache.purge_post(instance, getattr(instance, '_page_cache_previous', None))
+
+
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def purge_everything(sender, **kwargs):
+    # Deleting a post or renaming a tag shows up across many pages
+    page_cache.purge_all()
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def purge_retagged_post(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # tag.blogpost_set changed - many posts at once
+        if action.startswith('post_'):
+            page_cache.purge_all()
+        return
+
+    if action == 'pre_clear':
+        instance._page_cache_cleared_tags = list(instance.tags.values_list('slug', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        slugs = Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True)
+        page_cache.purge_paths(page_cache.post_paths(instance, slugs))
+    elif action == 'post_clear':
+        page_cache.purge_paths(page_cache.post_paths(instance, getattr(instance, '_page_cache_cleared_tags', ())))
+
+
+# ===== RELATED POSTS =====
+@receiver(post_save, sender=BlogPost)
+def reindex_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        related.update_post(instance)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def reindex_retagged_post(sender, instance, action, reverse, **kwargs):
+    # Tag words are part of the vector; bulk retagging from the tag side
+    # is left to rebuild_related_posts
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        related.update_post(instance)
+
+
+# ===== SEARCH INDEX =====
+@receiver(post_save, sender=BlogPost)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    # Drafts are indexed too - the admin searches through the same index
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def index_retagged_post(sender, instance, action, reverse, pk_set, model, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_post(instance)
+    elif pk_set:
+        for post in BlogPost.objects.filter(pk__in=pk_set).prefetch_related('tags'):
+            search.index_post(post)
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created=False, raw=False, **kwargs):
+    # Tag names are part of each tagged post's document
+    if not created and not raw:
+        for post in instance.blogpost_set.prefetch_related('tags'):
+            search.index_post(post)
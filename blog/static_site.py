@@ -0,0 +1,338 @@
+# blog/static_site.py - Prebuilt HTML for the research and blog pages
+#
+# `manage.py build_static_site` renders every fixed page - the research,
+# legal, about and contact pages, the blog index, categories, tags and
+# published posts - to STATIC_SITE_ROOT as minified index.html, index.html.gz and,
+# if the brotli package is installed, index.html.br. Forms (home page,
+# survey), search, the JSON API, sitemaps and feeds are left to Django.
+#
+# manifest.json records, for each page, the templates it rendered and a
+# digest of the rows it was built from. A rebuild renders only the pages
+# whose digest or template files changed, spread over worker processes.
+# View counts are left out of the digest, so the counts shown on prebuilt
+# pages lag until something else on the page changes.
+#
+# With STATIC_SITE_SERVE on, PrebuiltPageMiddleware answers GETs without
+# a query string or session cookie straight from these files, picking the
+# best encoding the client accepts. Editing or publishing posts deletes the
+# affected files (page_cache purges call discard()), so those pages fall
+# back to Django until the next build. Blog pages also fall back once the
+# next scheduled post goes live.
+import gzip
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template.base import Template
+from django.test import RequestFactory
+from django.urls import URLPattern, resolve, reverse
+from datinghub_project.compression import accepted_encodings, minify_html
+from research.urls import urlpatterns as research_urlpatterns
+from . import critical_css
+from .counters import record_view
+from .models import BlogPost, RelatedPost, Tag
+
+try:
+    import brotli
+except ImportError:  # optional - pages are still prebuilt as HTML and gzip
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+# research/urls.py pages with forms or per-visitor output
+EXCLUDED_PAGES = ('home', 'dating_recommendations', 'thank_you_page')
+# Post columns left out of the listings digest: the body and timestamps
+# only show on the post's own page, and the counters change on every view
+DETAIL_ONLY_FIELDS = ('content', 'updated_date', 'last_modified', 'views', 'shares')
+
+
+def site_root():
+    return Path(getattr(settings, 'STATIC_SITE_ROOT', settings.BASE_DIR / 'var' / 'static_site'))
+
+
+def site_host():
+    return getattr(settings, 'STATIC_SITE_HOST', 'dating-hub.com.au')
+
+
+def _file_for(root, path, suffix=''):
+    return root / path.strip('/') / f'index.html{suffix}'
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+# ===== INPUTS =====
+def _blog_digest():
+    """Published posts and tags as listings and sidebars show them"""
+    fields = [f.attname for f in BlogPost._meta.concrete_fields if f.attname not in DETAIL_ONLY_FIELDS]
+    posts = BlogPost.objects.published()
+    return _digest(
+        list(posts.order_by('pk').values_list(*fields)),
+        list(Tag.objects.order_by('pk').values_list('pk', 'name', 'slug')),
+        list(BlogPost.tags.through.objects.filter(blogpost__in=posts).order_by('pk').values_list('blogpost', 'tag')),
+    )
+
+
+def pages():
+    """
+    path -> (digest of the rows the page shows, blog page?) for every page
+    to prebuild
+    """
+    found = {}
+    # Every page inlines its family's critical CSS
+    styles = critical_css.digest()
+    for pattern in research_urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name not in EXCLUDED_PAGES and not pattern.pattern.converters:
+            found[reverse(f'research:{pattern.name}')] = (styles, False)
+
+    blog = _digest(_blog_digest(), styles)
+    found[reverse('blog:blog_index')] = (blog, True)
+    for slug, _ in BlogPost.CATEGORY_CHOICES:
+        found[reverse('blog:blog_category', kwargs={'category_slug': slug})] = (blog, True)
+    for slug in Tag.objects.values_list('slug', flat=True):
+        found[reverse('blog:blog_tag', kwargs={'tag_slug': slug})] = (blog, True)
+
+    related = {}
+    for post_id, related_id, score in RelatedPost.objects.order_by('post', '-score').values_list('post', 'related', 'score'):
+        related.setdefault(post_id, []).append((related_id, score))
+    for row in BlogPost.objects.published().values():
+        del row['views'], row['shares']
+        found[reverse('blog:blog_detail', kwargs={'slug': row['slug']})] = (
+            _digest(blog, row, related.get(row['id'], [])), True,
+        )
+    return found
+
+
+def _templates_digest(templates, cache):
+    """Digest of the current contents of template files"""
+    digests = []
+    for name in templates:
+        if name not in cache:
+            try:
+                cache[name] = hashlib.sha256(Path(name).read_bytes()).hexdigest()
+            except OSError:
+                cache[name] = None  # gone - rebuild
+        digests.append(cache[name])
+    return _digest(digests)
+
+
+# ===== RENDERING =====
+@contextmanager
+def _recording_templates():
+    """Collect the files of every template rendered inside the block"""
+    used = set()
+    original = Template._render
+
+    def _render(self, context):
+        used.add(self.origin.name)
+        return original(self, context)
+
+    Template._render = _render
+    try:
+        yield used
+    finally:
+        Template._render = original
+
+
+def _write(target, data):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=target.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    os.replace(temp, target)
+
+
+def render_page(path, host):
+    """
+    Render `path` as an anonymous visitor's request would. Returns the
+    response and the files of the templates it rendered.
+    """
+    request = RequestFactory().get(path, secure=True, HTTP_HOST=host)
+    request.user = AnonymousUser()
+    request.static_export = True
+    match = resolve(path)
+    # Past the page cache and conditional decorators, to the view itself
+    view = inspect.unwrap(match.func)
+    with _recording_templates() as templates:
+        response = view(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    return response, templates
+
+
+def _render(path, root, host):
+    """
+    Render one page and write its files. Returns (path, templates, etag,
+    post pk, encodings), or None if the page didn't render.
+    """
+    response, templates = render_page(path, host)
+    if response.status_code != 200:
+        return None
+
+    content = minify_html(response.content) if getattr(settings, 'HTML_MINIFY', True) else response.content
+    files = {'': content, '.gz': gzip.compress(content, 9, mtime=0)}
+    if brotli is not None:
+        files['.br'] = brotli.compress(content)
+    # Compressed variants first: a served .html always has its siblings
+    for suffix in sorted(files, reverse=True):
+        _write(_file_for(root, path, suffix), files[suffix])
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    return path, sorted(templates), etag, getattr(response, 'blog_post_pk', None), sorted(files)
+
+
+def _render_all(paths, root, host, processes):
+    if processes <= 1 or len(paths) <= 1:
+        yield from (_render(path, root, host) for path in paths)
+        return
+    # Workers are forked - they must not share the parent's connections
+    connections.close_all()
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+        chunksize = max(1, len(paths) // (processes * 4))
+        yield from pool.map(_render, paths, [root] * len(paths), [host] * len(paths), chunksize=chunksize)
+
+
+def remove_files(root, path):
+    for suffix in ('.br', '.gz', ''):
+        try:
+            _file_for(root, path, suffix).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def build(root=None, host=None, processes=1, force=False):
+    """
+    Prebuild every page whose inputs changed since the last build, and
+    remove pages that no longer exist. Returns (pages rendered, pages in total).
+    """
+    root = Path(root or site_root())
+    root.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest(root)
+    current = pages()
+    next_publish = BlogPost.objects.next_scheduled_date()
+    expires = next_publish.timestamp() if next_publish else None
+
+    manifest, todo, file_digests = {}, [], {}
+    for path, (data, is_blog) in current.items():
+        old = previous.get(path)
+        if (
+            not force and old and old['data'] == data
+            and old['templates_digest'] == _templates_digest(old['templates'], file_digests)
+            and all(_file_for(root, path, suffix).exists() for suffix in old['encodings'])
+        ):
+            manifest[path] = {**old, 'expires': expires if is_blog else None}
+        else:
+            todo.append(path)
+
+    for result in _render_all(todo, root, host or site_host(), processes):
+        if result is None:
+            continue
+        path, templates, etag, post, encodings = result
+        data, is_blog = current[path]
+        manifest[path] = {
+            'data': data,
+            'templates': templates,
+            'templates_digest': _templates_digest(templates, file_digests),
+            'etag': etag,
+            'post': post,
+            'encodings': encodings,
+            'expires': expires if is_blog else None,
+        }
+
+    for path in previous.keys() - manifest.keys():
+        remove_files(root, path)
+    _write(root / MANIFEST_NAME, json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return len(todo), len(manifest)
+
+
+def read_manifest(root=None):
+    try:
+        return json.loads(((root or site_root()) / MANIFEST_NAME).read_bytes())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# ===== INVALIDATION =====
+def discard(paths):
+    """Delete the prebuilt files of `paths`; Django serves them until the next build"""
+    root = site_root()
+    if not (root / MANIFEST_NAME).exists():
+        return
+    for path in paths:
+        remove_files(root, path)
+
+
+def discard_blog():
+    blog_prefix = reverse('blog:blog_index')
+    discard(path for path in read_manifest() if path.startswith(blog_prefix))
+
+
+# ===== SERVING =====
+class PrebuiltPageMiddleware:
+    """
+    Answer anonymous GETs of prebuilt pages from STATIC_SITE_ROOT. Goes
+    right after SecurityMiddleware, so nothing else runs for them.
+    """
+    ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'), ('', None))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._manifest = {}
+        self._manifest_mtime = None
+
+    def manifest(self):
+        """The manifest, re-read whenever a build replaces it"""
+        try:
+            mtime = (site_root() / MANIFEST_NAME).stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._manifest_mtime:
+            self._manifest = read_manifest()
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def __call__(self, request):
+        if (
+            not getattr(settings, 'STATIC_SITE_SERVE', False)
+            or request.method not in ('GET', 'HEAD')
+            or request.META.get('QUERY_STRING')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return self.get_response(request)
+        page = self.manifest().get(request.path)
+        if page is None or (page['expires'] and page['expires'] <= time.time()):
+            return self.get_response(request)
+        request.get_host()  # still reject hosts that aren't allowed
+
+        accepted = accepted_encodings(request)
+        for suffix, encoding in self.ENCODINGS:
+            if suffix not in page['encodings'] or (encoding and encoding not in accepted):
+                continue
+            try:
+                content = _file_for(site_root(), request.path, suffix).read_bytes()
+            except FileNotFoundError:
+                return self.get_response(request)  # discarded since the build
+            break
+
+        if page['post']:
+            record_view(page['post'])
+        if page['etag'] in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='text/html; charset=utf-8')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['ETag'] = page['etag']
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY')
+        return response
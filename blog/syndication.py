@@ -0,0 +1,276 @@
+# blog/syndication.py - Sitemaps and RSS/Atom feeds
+#
+# Outputs are generated as a stream of chunks and gzip-compressed on the
+# fly; the compressed bytes are cached once the stream completes. The cache
+# key and the ETag both carry a content version (listing version plus the
+# page-cache generations of the sitemap path), so any purge of blog pages
+# also retires the cached sitemaps and feeds.
+import hashlib
+import math
+import zlib
+from functools import wraps
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from research.urls import urlpatterns as research_urlpatterns
+from .conditional import conditional_response, listing_version, make_etag
+from .models import BlogPost, Tag
+from .page_cache import page_generations
+from .sidebar import seconds_until_next_publish
+
+SITEMAP_CHUNK_SIZE = getattr(settings, 'BLOG_SITEMAP_CHUNK_SIZE', 50000)  # protocol maximum
+FEED_ITEMS = getattr(settings, 'BLOG_FEED_ITEMS', 20)
+SYNDICATION_CACHE_TIMEOUT = getattr(settings, 'BLOG_SYNDICATION_CACHE_TIMEOUT', 60 * 60 * 24)
+SYNDICATION_CACHE_KEY = 'blog:syndication:{}'
+
+# research/urls.py pages that don't belong in a sitemap
+EXCLUDED_PAGES = ('thank_you_page',)
+URLS_PER_WRITE = 500
+STREAM_BLOCK_SIZE = 64 * 1024
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+# ===== SERVING =====
+def _content_version():
+    """Changes whenever a blog page purge or a post publish/edit happens"""
+    return (*page_generations(reverse('blog:blog_sitemap')), *listing_version())
+
+
+def _accepts_gzip(request):
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def _decompressed(blob):
+    decompressor = zlib.decompressobj(31)
+    for start in range(0, len(blob), STREAM_BLOCK_SIZE):
+        yield decompressor.decompress(blob[start:start + STREAM_BLOCK_SIZE])
+    yield decompressor.flush()
+
+
+def _compress_and_cache(chunks, key, timeout, send_gzip):
+    """
+    Yield the encoded chunks (gzipped when `send_gzip`) while building the
+    gzip body; cache it once the whole output has been produced.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    compressed = []
+    for chunk in chunks:
+        data = chunk.encode()
+        packed = compressor.compress(data)
+        if packed:
+            compressed.append(packed)
+        if not send_gzip:
+            yield data
+        elif packed:
+            yield packed
+    tail = compressor.flush()
+    compressed.append(tail)
+    if send_gzip:
+        yield tail
+    cache.set(key, b''.join(compressed), timeout)
+
+
+def syndication_output(content_type):
+    """
+    Serve a view that returns an iterable of str chunks as a cached,
+    gzip-ready, conditional-GET aware response.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            version = _content_version()
+            base_url = request.build_absolute_uri('/')
+            # Weak: the gzip and identity encodings share one validator
+            etag = 'W/' + make_etag(*version, base_url, request.path, *args, *kwargs.values())
+            key = SYNDICATION_CACHE_KEY.format(hashlib.md5(etag.encode()).hexdigest())
+            send_gzip = _accepts_gzip(request)
+
+            def render():
+                blob = cache.get(key)
+                if blob is not None:
+                    if send_gzip:
+                        response = HttpResponse(blob, content_type=content_type)
+                    else:
+                        response = StreamingHttpResponse(_decompressed(blob), content_type=content_type)
+                else:
+                    chunks = view_func(request, *args, **kwargs)
+                    timeout = seconds_until_next_publish(SYNDICATION_CACHE_TIMEOUT)
+                    response = StreamingHttpResponse(
+                        _compress_and_cache(chunks, key, timeout, send_gzip), content_type=content_type,
+                    )
+                if send_gzip:
+                    response.headers['Content-Encoding'] = 'gzip'
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+
+            return conditional_response(request, etag, version[-1], render)
+        return wrapper
+    return decorator
+
+
+# ===== SITEMAPS =====
+def _published_posts():
+    return BlogPost.objects.published()
+
+
+def _tags_with_posts():
+    return Tag.objects.filter(
+        blogpost__status='published',
+        blogpost__published_date__lte=timezone.now(),
+    ).annotate(lastmod=Max('blogpost__last_modified'))
+
+
+def _lastmod(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _static_pages():
+    """(path, lastmod) for the research pages, blog index and categories"""
+    for pattern in research_urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name not in EXCLUDED_PAGES and not pattern.pattern.converters:
+            yield reverse(f'research:{pattern.name}'), None
+
+    categories = dict(
+        _published_posts().order_by().values_list('category').annotate(lastmod=Max('last_modified'))
+    )
+    yield reverse('blog:blog_index'), _lastmod(max(categories.values(), default=None))
+    for slug, _ in BlogPost.CATEGORY_CHOICES:
+        if slug in categories:
+            yield reverse('blog:blog_category', kwargs={'category_slug': slug}), _lastmod(categories[slug])
+
+
+def _chunked_sections():
+    """name -> (rows queryset ordered by pk, path template) of the chunked sections"""
+    return {
+        'posts': (
+            _published_posts().order_by('pk').values_list('pk', 'slug', 'last_modified'),
+            reverse('blog:blog_detail', kwargs={'slug': '__slug__'}),
+        ),
+        'tags': (
+            _tags_with_posts().order_by('pk').values_list('pk', 'slug', 'lastmod'),
+            reverse('blog:blog_tag', kwargs={'tag_slug': '__slug__'}),
+        ),
+    }
+
+
+def _chunk_rows(rows, page):
+    """
+    Rows of 1-based chunk `page`. Only the chunk's first pk is found by
+    offset (over pk values alone); the rows themselves are read by keyset.
+    """
+    try:
+        first_pk = rows.values_list('pk', flat=True)[(page - 1) * SITEMAP_CHUNK_SIZE]
+    except IndexError:
+        raise Http404('Sitemap page not found')
+    return rows.filter(pk__gte=first_pk)[:SITEMAP_CHUNK_SIZE]
+
+
+def _url_entries(base_url, entries):
+    """Stream <url> elements, URLS_PER_WRITE per chunk"""
+    batch = []
+    for path, lastmod in entries:
+        entry = f'<url><loc>{escape(base_url + path.lstrip("/"))}</loc>'
+        if lastmod:
+            entry += f'<lastmod>{lastmod}</lastmod>'
+        batch.append(entry + '</url>\n')
+        if len(batch) >= URLS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _urlset(base_url, entries):
+    yield f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n'
+    yield from _url_entries(base_url, entries)
+    yield '</urlset>\n'
+
+
+@syndication_output('application/xml; charset=utf-8')
+def blog_sitemap(request):
+    """Sitemap index: the static pages plus every chunk of posts and tags"""
+    base_url = request.build_absolute_uri('/')
+
+    def sitemap(section, page):
+        path = reverse('blog:blog_sitemap_section', kwargs={'section': section, 'page': page})
+        return f'<sitemap><loc>{escape(base_url + path.lstrip("/"))}</loc></sitemap>\n'
+
+    def sitemaps():
+        yield f'{XML_HEADER}<sitemapindex xmlns="{SITEMAP_NS}">\n'
+        yield sitemap('pages', 1)
+        for section, (rows, _) in _chunked_sections().items():
+            for page in range(1, math.ceil(rows.count() / SITEMAP_CHUNK_SIZE) + 1):
+                yield sitemap(section, page)
+        yield '</sitemapindex>\n'
+    return sitemaps()
+
+
+@syndication_output('application/xml; charset=utf-8')
+def blog_sitemap_section(request, section, page):
+    """One sitemap file of at most SITEMAP_CHUNK_SIZE URLs"""
+    base_url = request.build_absolute_uri('/')
+    if section == 'pages':
+        if page != 1:
+            raise Http404('Sitemap page not found')
+        return _urlset(base_url, _static_pages())
+
+    sections = _chunked_sections()
+    if section not in sections:
+        raise Http404('Sitemap not found')
+    rows, path_template = sections[section]
+    rows = _chunk_rows(rows, page)
+    entries = (
+        (path_template.replace('__slug__', slug), _lastmod(lastmod))
+        for _, slug, lastmod in rows.iterator(chunk_size=2000)
+    )
+    return _urlset(base_url, entries)
+
+
+# ===== FEEDS =====
+def _feed(request, feed_class):
+    """The FEED_ITEMS latest posts - a bounded document, written in one chunk"""
+    blog_url = request.build_absolute_uri(reverse('blog:blog_index'))
+    feed = feed_class(
+        title='Dating Hub Research Blog',
+        link=blog_url,
+        description='Research insights, dating trends and relationship advice from Dating Hub Research Team.',
+        language='en',
+        feed_url=request.build_absolute_uri(request.path),
+    )
+    posts = _published_posts().order_by('-published_date', '-id').only(
+        'title', 'slug', 'excerpt', 'content', 'author', 'category', 'published_date', 'last_modified',
+    ).prefetch_related('tags')[:FEED_ITEMS]
+    for post in posts:
+        url = request.build_absolute_uri(post.get_absolute_url())
+        feed.add_item(
+            title=post.title,
+            link=url,
+            unique_id=url,
+            description=post.excerpt or Truncator(strip_tags(post.content)).words(60),
+            author_name=post.author,
+            pubdate=post.published_date,
+            updateddate=post.last_modified,
+            categories=[post.get_category_display(), *(tag.name for tag in post.tags.all())],
+        )
+    yield feed.writeString('utf-8')
+
+
+@syndication_output('application/rss+xml; charset=utf-8')
+def blog_feed(request):
+    return _feed(request, Rss201rev2Feed)
+
+
+@syndication_output('application/atom+xml; charset=utf-8')
+def blog_atom_feed(request):
+    return _feed(request, Atom1Feed)
@@ -0,0 +1,10 @@
+from django import template
+from blog.critical_css import stylesheet_tags
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def critical_css(context):
+    """{% critical_css %} - the page's stylesheet, critical rules inlined (blog/critical_css.py)"""
+    return stylesheet_tags(context.template.name)
@@ -1,3 +1,928 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import zlib
+from io import StringIO
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from research import views as research_views
+from . import conditional, counters, critical_css, page_cache, pagination, related, search, static_site, syndication, views
+from .pagination import KeysetPaginator
+from .models import BlogPost, PostTerm, RelatedPost, Tag
+from .sidebar import SIDEBAR_CACHE_TIMEOUT, get_sidebar, seconds_until_next_publish
+
+
+def make_post(title, **kwargs):
+    kwargs.setdefault('status', 'published')
+    kwargs.setdefault('content', 'Some words about modern dating.')
+    kwargs.setdefault('published_date', timezone.now() - timedelta(days=1))
+    return BlogPost.objects.create(title=title, **kwargs)
+
+
+def add_posts(total):
+    """Grow the blog to `total` published posts"""
+    count = BlogPost.objects.count()
+    base = timezone.now() - timedelta(days=1)
+    BlogPost.objects.bulk_create([
+        BlogPost(
+            title=f'Post {i}', slug=f'post-{i}', content='Body', status='published',
+            category=BlogPost.CATEGORY_CHOICES[i % 5][0],
+            published_date=base - timedelta(minutes=i),
+        ) for i in range(count, min(total, 1000))
+    ])
+    # Past 1,000 rows, copy existing rows in SQL - bulk_create is too slow here
+    fields = [f.column for f in BlogPost._meta.concrete_fields if not f.primary_key]
+    columns = ', '.join(connection.ops.quote_name(c) for c in fields)
+    count = BlogPost.objects.count()
+    with connection.cursor() as cursor:
+        while count < total:
+            copied = ', '.join(
+                f"slug || '-{count}'" if c == 'slug' else connection.ops.quote_name(c) for c in fields
+            )
+            cursor.execute(
+                f'INSERT INTO blog_blogpost ({columns}) '
+                f'SELECT {copied} FROM blog_blogpost ORDER BY id LIMIT %s',
+                [min(count, total - count)],
+            )
+            count = BlogPost.objects.count()
+
+
+class BlogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        counters._touched.clear()
+
+
+class SidebarTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(name='Apps')
+        for i in range(3):
+            make_post(f'Research {i}', category='research').tags.add(self.tag)
+        make_post('Trend', category='trends')
+        make_post('Draft', category='advice', status='draft')
+
+    def test_category_counts_skip_empty_and_unpublished(self):
+        categories = get_sidebar()['categories']
+        self.assertEqual(
+            [(c['slug'], c['post_count']) for c in categories],
+            [('research', 3), ('trends', 1)],
+        )
+
+    def test_popular_tags_and_recent_posts(self):
+        sidebar = get_sidebar()
+        self.assertEqual([(t.name, t.post_count) for t in sidebar['popular_tags']], [('Apps', 3)])
+        self.assertEqual(len(sidebar['recent_posts']), 4)
+
+    def test_cached_after_first_build(self):
+        get_sidebar()
+        with self.assertNumQueries(0):
+            get_sidebar()
+
+    def test_invalidated_when_post_saved(self):
+        get_sidebar()
+        make_post('Advice', category='advice')
+        slugs = [c['slug'] for c in get_sidebar()['categories']]
+        self.assertIn('advice', slugs)
+
+    def test_invalidated_when_tags_change(self):
+        get_sidebar()
+        self.tag.blogpost_set.clear()
+        self.assertEqual(get_sidebar()['popular_tags'], [])
+
+    def test_scheduled_post_expires_cache(self):
+        make_post('Soon', category='advice', published_date=timezone.now() + timedelta(seconds=30))
+        self.assertNotIn('advice', [c['slug'] for c in get_sidebar()['categories']])
+        self.assertLessEqual(seconds_until_next_publish(SIDEBAR_CACHE_TIMEOUT), 31)
+
+    def test_index_page_uses_sidebar(self):
+        response = self.client.get('/blog/')
+        self.assertContains(response, 'Research Insights')
+        self.assertContains(response, 'Research 0')
+
+
+class ViewCounterTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = make_post('Counted')
+
+    def test_views_are_buffered_until_flush(self):
+        for _ in range(3):
+            counters.record_view(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+
+        self.assertEqual(counters.flush_views(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+        self.assertEqual(counters.flush_views(), 0)
+
+    def test_threshold_triggers_flush(self):
+        with mock.patch.object(counters, 'FLUSH_THRESHOLD', 2):
+            counters.flush_views()
+            counters.record_view(self.post.pk)
+            counters.record_view(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_detail_view_counts_without_saving_row(self):
+        with mock.patch.object(BlogPost, 'save') as save:
+            response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, '1 views')
+        save.assert_not_called()
+
+    def test_management_command_drains_all_posts(self):
+        other = make_post('Other')
+        counters.record_view(self.post.pk)
+        counters.record_view(other.pk)
+        counters._touched.clear()  # as if counted by another worker
+        call_command('flush_view_counts', stdout=mock.Mock())
+        self.assertEqual(
+            sorted(BlogPost.objects.values_list('views', flat=True)),
+            [1, 1],
+        )
+
+    def test_concurrent_workers_lose_no_views(self):
+        workers, hits = 8, 250
+
+        def worker():
+            for _ in range(hits):
+                counters.record_view(self.post.pk)
+
+        with mock.patch.object(counters, 'FLUSH_THRESHOLD', 10 ** 9), \
+                mock.patch.object(counters, 'FLUSH_INTERVAL', 10 ** 9):
+            threads = [threading.Thread(target=worker) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            # Flush repeatedly while the workers are still counting
+            while any(thread.is_alive() for thread in threads):
+                counters.flush_views([self.post.pk])
+            for thread in threads:
+                thread.join()
+            counters.flush_views([self.post.pk])
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, workers * hits)
+
+    def test_overlapping_flushes_write_each_view_once(self):
+        for _ in range(50):
+            counters.record_view(self.post.pk)
+        get_many = cache.get_many
+        overlapping = []
+
+        def get_many_then_flush(keys):
+            # Another flusher, as another process sharing the cache, starts
+            # while this one holds the counts
+            found = get_many(keys)
+            if not overlapping:
+                overlapping.append(counters.flush_views([self.post.pk]))
+            return found
+
+        with mock.patch.object(cache, 'get_many', get_many_then_flush):
+            counters.drain_all_views()
+        self.assertEqual(overlapping, [0])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 50)
+        self.assertEqual(counters.record_view(self.post.pk), 1)
+
+    def test_flush_skips_while_another_process_flushes(self):
+        counters.record_view(self.post.pk)
+        cache.add(counters.FLUSH_LOCK_KEY, 'elsewhere')
+        self.assertEqual(counters.flush_views(), 0)
+        cache.delete(counters.FLUSH_LOCK_KEY)
+        self.assertEqual(counters.flush_views(), 1)  # still buffered, still touched
+
+
+class PageCacheTestsMixin:
+    def setUp(self):
+        super().setUp()
+        self.post = make_post('Cached', content='First version.')
+        self.other = make_post('Neighbour', content='Untouched.')
+        counters.flush_views()
+
+    def get_counting_renders(self, url):
+        """GET a page; return the response and how many templates the views rendered"""
+        with mock.patch('blog.views.render', wraps=views.render) as render:
+            response = self.client.get(url)
+        return response, render.call_count
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get('/blog/')
+        response, renders = self.get_counting_renders('/blog/')
+        self.assertContains(response, 'Cached')
+        self.assertEqual(renders, 0)
+
+    def test_page_number_is_part_of_key(self):
+        self.client.get('/blog/')
+        _, renders = self.get_counting_renders('/blog/?page=2')
+        self.assertEqual(renders, 1)
+
+    def test_content_edit_purges_only_that_post(self):
+        self.client.get(self.post.get_absolute_url())
+        self.client.get(self.other.get_absolute_url())
+
+        self.post.content = 'Second version.'
+        self.post.save()
+
+        self.assertContains(self.client.get(self.post.get_absolute_url()), 'Second version.')
+        _, renders = self.get_counting_renders(self.other.get_absolute_url())
+        self.assertEqual(renders, 0)
+
+    def test_publishing_purges_listings(self):
+        self.client.get('/blog/')
+        make_post('Fresh')
+        self.assertContains(self.client.get('/blog/'), 'Fresh')
+
+    def test_cache_hit_still_counts_view(self):
+        self.client.get(self.post.get_absolute_url())
+        self.client.get(self.post.get_absolute_url())
+        counters.flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LocMemPageCacheTests(PageCacheTestsMixin, BlogTestCase):
+    pass
+
+
+class FilePageCacheTests(PageCacheTestsMixin, BlogTestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'blog_test_cache',
+}})
+class DatabasePageCacheTests(PageCacheTestsMixin, BlogTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        super().setUp()
+
+
+class ConditionalGetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = make_post('Conditional', content='Body text.')
+        counters.flush_views()
+
+    def test_detail_revalidation_is_one_query_and_counts_view(self):
+        response = self.client.get(self.post.get_absolute_url())
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1), mock.patch('blog.views.render') as render:
+            response = self.client.get(self.post.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+        counters.flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_detail_etag_changes_when_post_edited(self):
+        etag = self.client.get(self.post.get_absolute_url())['ETag']
+        self.post.content = 'Edited body.'
+        self.post.save()
+        response = self.client.get(self.post.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Edited body.')
+
+    def test_listing_revalidation_runs_no_queries(self):
+        response = self.client.get('/blog/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/blog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_listing_etag_depends_on_page(self):
+        etag = self.client.get('/blog/')['ETag']
+        response = self.client.get('/blog/?page=2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_post_changes_listing_etag(self):
+        etag = self.client.get('/blog/')['ETag']
+        make_post('Another')
+        response = self.client.get('/blog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Another')
+
+
+class DetailQueryBudgetTests(BlogTestCase):
+    # post + tags + related/next/previous + conditional-GET lookup +
+    # next scheduled post (for the page cache timeout)
+    DETAIL_QUERIES = 5
+
+    def assert_detail_budget(self, slug):
+        page_cache.purge_all()
+        with self.assertNumQueries(self.DETAIL_QUERIES), \
+                mock.patch.object(counters, 'FLUSH_INTERVAL', 10 ** 9):
+            response = self.client.get(f'/blog/{slug}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_count_is_constant(self):
+        for total in (10, 1000, 100000):
+            with self.subTest(posts=total):
+                add_posts(total)
+                self.assertEqual(BlogPost.objects.count(), total)
+                # Warm the listing version so only per-page work is measured
+                conditional.listing_version()
+                self.assert_detail_budget('post-5')
+
+    def test_navigation(self):
+        add_posts(10)
+        posts = {p.slug: p for p in BlogPost.objects.all()}
+        post = posts['post-5']
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post=post, related=posts['post-8'], score=0.9),
+            RelatedPost(post=post, related=posts['post-2'], score=0.5),
+        ])
+
+        related, next_post, prev_post = views._post_navigation(post)
+        self.assertEqual(next_post.slug, 'post-4')
+        self.assertEqual(prev_post.slug, 'post-6')
+        self.assertEqual([p.slug for p in related], ['post-8', 'post-2'])
+
+
+class RelatedPostsEngineTests(BlogTestCase):
+    TOPICS = {
+        'apps': 'swipe matching algorithm profile photos messaging notifications',
+        'ghosting': 'ghosting silence unanswered messages closure rejection anxiety',
+        'budget': 'restaurant budget splitting bill expensive cheap venues',
+    }
+
+    def setUp(self):
+        super().setUp()
+        for topic, words in self.TOPICS.items():
+            for i in range(3):
+                make_post(f'{topic} study {i}', content=f'{words} {words} report')
+        related.rebuild_all()
+
+    def related_slugs(self, slug, limit=3):
+        post = BlogPost.objects.get(slug=slug)
+        return {r.related.slug for r in post.related_links.select_related('related')[:limit]}
+
+    def test_rebuild_groups_posts_by_topic(self):
+        self.assertEqual(self.related_slugs('ghosting-study-0', 2), {'ghosting-study-1', 'ghosting-study-2'})
+        self.assertEqual(PostTerm.objects.filter(term='ghosting').count(), 3)
+
+    def test_saving_a_post_updates_it_and_its_neighbours(self):
+        make_post('budget study new', content=self.TOPICS['budget'])
+        self.assertEqual(
+            self.related_slugs('budget-study-new'),
+            {'budget-study-0', 'budget-study-1', 'budget-study-2'},
+        )
+        self.assertIn('budget-study-new', self.related_slugs('budget-study-0'))
+
+    def test_unpublishing_removes_post_from_index(self):
+        post = BlogPost.objects.get(slug='apps-study-0')
+        post.status = 'draft'
+        post.save()
+        self.assertFalse(post.terms.exists())
+        self.assertNotIn('apps-study-0', self.related_slugs('apps-study-1'))
+
+    def test_detail_page_shows_related_posts(self):
+        response = self.client.get('/blog/apps-study-0/')
+        self.assertContains(response, 'apps study 1')
+
+
+class SearchTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ghosting = make_post('Why ghosting happens', excerpt='Silence after a few dates.',
+                                  content='<p>Most people who disappear feel awkward, not cruel.</p>')
+        self.budget = make_post('Splitting the bill', excerpt='Who pays?',
+                                content='Who pays on a first date? Ghosting is rare here.')
+        self.tagged = make_post('Swipe fatigue', content='Too many profiles.')
+        self.tagged.tags.add(Tag.objects.create(name='Burnout', slug='burnout'))
+
+    def slugs(self, query, queryset=None):
+        return [post.slug for post in search.search_posts(query, queryset)]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.slugs('ghosting'), ['why-ghosting-happens', 'splitting-the-bill'])
+
+    def test_index_follows_saves_tags_and_deletes(self):
+        self.assertEqual(self.slugs('burnout'), ['swipe-fatigue'])
+        self.budget.content = 'Dutch treat etiquette.'
+        self.budget.save()
+        self.assertEqual(self.slugs('ghosting'), ['why-ghosting-happens'])
+        self.assertEqual(self.slugs('etiquette'), ['splitting-the-bill'])
+        self.ghosting.delete()
+        self.assertEqual(self.slugs('ghosting'), [])
+
+    def test_rebuild_reads_tags_from_the_prefetch(self):
+        for i in range(3):
+            make_post(f'Burnout story {i}').tags.add(Tag.objects.get(slug='burnout'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(search.rebuild_index(), 6)
+        self.assertEqual(len([q for q in queries.captured_queries if 'blog_tag' in q['sql']]), 1)
+        self.assertEqual(len(self.slugs('burnout')), 4)
+
+    def test_drafts_are_indexed_but_not_public(self):
+        make_post('Ghosting draft', status='draft')
+        self.assertEqual(len(self.slugs('ghosting')), 2)
+        self.assertEqual(len(self.slugs('ghosting', BlogPost.objects.all())), 3)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.slugs('ghosting" (*'), ['why-ghosting-happens', 'splitting-the-bill'])
+        self.assertEqual(self.slugs('  '), [])
+
+    def test_rebuild_command(self):
+        search.get_backend().clear()
+        self.assertEqual(self.slugs('ghosting'), [])
+        call_command('rebuild_search_index', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(self.slugs('ghosting')), 2)
+
+    def test_search_view_paginates(self):
+        for i in range(10):
+            make_post(f'Ghosting survey {i}')
+        response = self.client.get('/blog/search/', {'q': 'ghosting'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), 9)
+        response = self.client.get('/blog/search/', {'q': 'ghosting', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertContains(self.client.get('/blog/search/', {'q': 'nothing'}), 'No articles match')
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/blog/blogpost/', {'q': 'awkward'})
+        self.assertEqual([p.slug for p in response.context['cl'].result_list], ['why-ghosting-happens'])
+
+
+class SyndicationTests(BlogTestCase):
+    GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            make_post(f'Syndicated {i}', category='trends')
+        BlogPost.objects.get(slug='syndicated-0').tags.add(Tag.objects.create(name='Apps', slug='apps'))
+
+    def get(self, path, **headers):
+        response = self.client.get(path, headers=headers)
+        if response.status_code != 200:
+            return response, b''
+        body = response.getvalue()
+        if response.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 31)
+        return response, body.decode()
+
+    def test_sitemap_index_lists_chunks(self):
+        with mock.patch.object(syndication, 'SITEMAP_CHUNK_SIZE', 2):
+            response, body = self.get('/blog/sitemap.xml')
+            self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+            for section in ('pages-1', 'posts-1', 'posts-2', 'posts-3', 'tags-1'):
+                self.assertIn(f'http://testserver/blog/sitemap-{section}.xml', body)
+            self.assertNotIn('posts-4', body)
+
+            _, body = self.get('/blog/sitemap-posts-3.xml')
+            self.assertEqual(body.count('<url>'), 1)
+            self.assertIn('<loc>http://testserver/blog/syndicated-4/</loc><lastmod>', body)
+            self.assertEqual(self.get('/blog/sitemap-posts-4.xml')[0].status_code, 404)
+            self.assertEqual(self.get('/blog/sitemap-other-1.xml')[0].status_code, 404)
+
+    def test_pages_and_tags_sections(self):
+        _, body = self.get('/blog/sitemap-pages-1.xml')
+        self.assertIn('<loc>http://testserver/about/</loc>', body)
+        self.assertIn('<loc>http://testserver/blog/category/trends/</loc><lastmod>', body)
+        self.assertNotIn('/blog/category/advice/', body)
+        self.assertNotIn('thank-you', body)
+        _, body = self.get('/blog/sitemap-tags-1.xml')
+        self.assertIn('<loc>http://testserver/blog/tag/apps/</loc>', body)
+
+    def test_gzip_output_is_cached_until_content_changes(self):
+        response, plain = self.get('/blog/sitemap-posts-1.xml')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        with self.assertNumQueries(0):
+            response, unzipped = self.get('/blog/sitemap-posts-1.xml', **self.GZIP)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(unzipped, plain)
+
+        post = BlogPost.objects.get(slug='syndicated-1')
+        post.slug = 'renamed'
+        post.save()
+        _, body = self.get('/blog/sitemap-posts-1.xml', **self.GZIP)
+        self.assertIn('/blog/renamed/', body)
+
+    def test_edit_refreshes_feed(self):
+        self.get('/blog/feed/')
+        post = BlogPost.objects.get(slug='syndicated-2')
+        post.title = 'Edited title'
+        post.save()
+        self.assertIn('Edited title', self.get('/blog/feed/')[1])
+
+    def test_conditional_get(self):
+        response = self.client.get('/blog/sitemap.xml')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        response = self.client.get('/blog/sitemap.xml', headers={'If-None-Match': etag, **self.GZIP})
+        self.assertEqual(response.status_code, 304)
+
+    def test_feeds(self):
+        response, body = self.get('/blog/feed/')
+        self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
+        self.assertEqual(body.count('<item>'), 5)
+        self.assertIn('<link>http://testserver/blog/syndicated-0/</link>', body)
+        self.assertIn('<category>Apps</category>', body)
+        response, body = self.get('/blog/feed/atom/', **self.GZIP)
+        self.assertEqual(response['Content-Type'], 'application/atom+xml; charset=utf-8')
+        self.assertEqual(body.count('<entry>'), 5)
+
+    def test_sitemaps_for_200k_posts(self):
+        add_posts(200000)
+        _, body = self.get('/blog/sitemap.xml')
+        self.assertIn('sitemap-posts-4.xml', body)
+        self.assertNotIn('sitemap-posts-5.xml', body)
+        with self.assertNumQueries(3):  # listing version, chunk start, rows
+            response, body = self.get('/blog/sitemap-posts-4.xml', **self.GZIP)
+        self.assertEqual(body.count('<url>'), 50000)
+        self.assertTrue(response.streaming)
+        # Served from the cached gzip body from now on
+        with self.assertNumQueries(0):
+            response, cached = self.get('/blog/sitemap-posts-4.xml', **self.GZIP)
+        self.assertFalse(response.streaming)
+        self.assertEqual(cached, body)
+
+
+class KeysetPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        tag = Tag.objects.create(name='Apps', slug='apps')
+        base = timezone.now() - timedelta(days=1)
+        for i in range(25):
+            # Every third post shares a timestamp to exercise the id tie-break
+            post = make_post(f'Keyset {i}', category='trends' if i % 2 else 'advice',
+                             published_date=base - timedelta(hours=i - i % 3))
+            post.tags.add(tag)
+        make_post('Scheduled', published_date=timezone.now() + timedelta(days=1))
+        self.expected = list(
+            BlogPost.objects.published().order_by('-published_date', '-id').values_list('slug', flat=True)
+        )
+
+    def paginator(self, cache_key=None):
+        return KeysetPaginator(BlogPost.objects.published(), 9, cache_key=cache_key)
+
+    def test_pages_match_offset_pagination(self):
+        offset = Paginator(BlogPost.objects.published().order_by('-published_date', '-id'), 9)
+        for number in (1, 2, 3):
+            page = self.paginator().get_page(number)
+            self.assertEqual([p.slug for p in page], [p.slug for p in offset.page(number)])
+            self.assertEqual(page.has_next(), number < 3)
+            self.assertEqual(page.paginator.num_pages, 3)
+
+    def test_cursors_walk_every_post_once(self):
+        paginator = self.paginator()
+        page = paginator.get_page(1)
+        slugs = [p.slug for p in page]
+        while page.has_next():
+            page = paginator.page_after(page.next_cursor)
+            slugs.extend(p.slug for p in page)
+        self.assertEqual(slugs, self.expected)
+        self.assertEqual(page.number, 3)
+
+    def test_out_of_range_page_numbers(self):
+        self.assertEqual(self.paginator().get_page('abc').number, 1)
+        self.assertEqual(self.paginator().get_page(0).number, 1)
+        last = self.paginator().get_page(99)
+        self.assertEqual(last.number, 3)
+        self.assertEqual([p.slug for p in last], self.expected[18:])
+
+    def test_page_boundaries_are_cached(self):
+        self.paginator('listing-v1').get_page(3)
+        with self.assertNumQueries(1):
+            page = self.paginator('listing-v1').get_page(3)
+        self.assertEqual([p.slug for p in page], self.expected[18:])
+
+    def test_listing_pages_skip_count_and_offset(self):
+        for path in ('/blog/?page=2', '/blog/category/trends/?page=2', '/blog/tag/apps/?page=2'):
+            with self.subTest(path=path):
+                self.client.get(path)
+                page_cache.purge_all()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page_obj'].number, 2)
+                sql = ' '.join(q['sql'] for q in queries.captured_queries)
+                self.assertNotIn('OFFSET', sql)
+                if 'tag' not in path:
+                    self.assertNotIn('COUNT(', sql)
+
+    def test_json_endpoint_follows_cursors(self):
+        response = self.client.get('/blog/api/posts/', {'count': 1})
+        data = response.json()
+        self.assertEqual(data['approximate_count'], 25)
+        slugs = [post['slug'] for post in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            slugs.extend(post['slug'] for post in data['results'])
+        self.assertEqual(slugs, self.expected)
+        self.assertEqual(data['page'], 3)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_json_endpoint_filters_and_rejects_bad_cursors(self):
+        data = self.client.get('/blog/api/posts/', {'category': 'trends'}).json()
+        self.assertEqual({post['category'] for post in data['results']}, {'trends'})
+        self.assertIn('category=trends', data['next'])
+        self.assertEqual(self.client.get('/blog/api/posts/', {'cursor': 'nonsense'}).status_code, 400)
+
+
+class ListingProjectionTests(BlogTestCase):
+    def test_excerpt_generated_at_save(self):
+        post = make_post('No excerpt', content='<h2>Intro</h2>\n<p>' + 'word ' * 100 + '</p>')
+        self.assertTrue(post.excerpt.startswith('Intro word word'))
+        self.assertLessEqual(len(post.excerpt), 160)
+        self.assertEqual(make_post('Own excerpt', excerpt='Hand written.').excerpt, 'Hand written.')
+
+    def test_listings_never_load_bodies(self):
+        tag = Tag.objects.create(name='Apps', slug='apps')
+        for i in range(12):
+            make_post(f'Card {i}', category='trends', content='Body ' * 2000).tags.add(tag)
+        for path in ('/blog/', '/blog/category/trends/', '/blog/tag/apps/', '/blog/search/?q=card',
+                     '/blog/api/posts/'):
+            with self.subTest(path=path):
+                page_cache.purge_all()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                listing = [q['sql'] for q in queries.captured_queries if 'Card' not in q['sql']
+                           and '"blog_blogpost"."slug"' in q['sql'] and 'LIMIT' in q['sql']]
+                self.assertTrue(listing)
+                for sql in listing:
+                    self.assertNotIn('"blog_blogpost"."content"', sql)
+                    self.assertNotIn('"blog_blogpost"."author_bio"', sql)
+
+    def test_cards_render_without_extra_queries(self):
+        make_post('Card 0', category='trends')
+        page_cache.purge_all()
+        self.client.get('/blog/category/trends/')
+        page_cache.purge_all()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/blog/category/trends/')
+        for i in range(1, 9):
+            make_post(f'Card {i}', category='trends')
+        self.client.get('/blog/category/trends/')
+        page_cache.purge_all()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/blog/category/trends/')
+        self.assertEqual(len(many), len(few))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        with mock.patch.object(pagination.cache, 'set', wraps=pagination.cache.set) as cache_set:
+            call_command('benchmark_listings', posts=30, words=500, repeat=3, stdout=out)
+        self.assertIn('cards()', out.getvalue())
+        # Each paginator scans for its page boundaries once, and cleans up
+        keys = [call.args[0] for call in cache_set.call_args_list if call.args[0].startswith('blog:page_keys:')]
+        self.assertTrue(keys)
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertFalse([key for key in keys if cache.get(key) is not None])
+        self.assertFalse(BlogPost.objects.filter(slug__startswith='benchmark-post').exists())
+
+
+class StaticSiteMixin:
+    """Prebuilt pages in a temporary STATIC_SITE_ROOT, served"""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.root = Path(root)
+        settings_override = override_settings(STATIC_SITE_ROOT=self.root, STATIC_SITE_SERVE=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.post = make_post('Prebuilt', content='First version.')
+        self.other = make_post('Neighbour', content='Untouched.', category='trends')
+
+
+class StaticSiteTests(StaticSiteMixin, BlogTestCase):
+    def build(self):
+        """Build; return the paths rendered"""
+        with mock.patch.object(static_site, '_render', wraps=static_site._render) as render:
+            static_site.build(processes=1)
+        return {call.args[0] for call in render.call_args_list}
+
+    def test_builds_fixed_pages_only(self):
+        make_post('Draft', status='draft')
+        rendered = self.build()
+        self.assertIn('/research/methodology/', rendered)
+        self.assertIn('/blog/category/trends/', rendered)
+        self.assertIn(self.post.get_absolute_url(), rendered)
+        for path in ('/', '/tools/dating-recommendations/', '/blog/draft/', '/blog/search/'):
+            self.assertNotIn(path, rendered)
+        html = (self.root / 'blog' / 'prebuilt' / 'index.html').read_bytes()
+        self.assertIn(b'First version.', html)
+        self.assertEqual(gzip.decompress((self.root / 'blog' / 'prebuilt' / 'index.html.gz').read_bytes()), html)
+        manifest = static_site.read_manifest()
+        self.assertIn(str(settings.BASE_DIR / 'templates' / 'base.html'), manifest['/about/']['templates'])
+        self.assertEqual(manifest[self.post.get_absolute_url()]['post'], self.post.pk)
+
+    def test_rebuild_renders_only_changed_pages(self):
+        self.build()
+        self.assertEqual(self.build(), set())
+
+        self.post.content = 'Second version.'
+        self.post.save()
+        rendered = self.build()
+        self.assertIn(self.post.get_absolute_url(), rendered)
+        self.assertNotIn(self.other.get_absolute_url(), rendered)
+        self.assertNotIn('/research/methodology/', rendered)
+        self.assertIn(b'Second version.', (self.root / 'blog' / 'prebuilt' / 'index.html').read_bytes())
+
+        # Views alone don't count as a change
+        BlogPost.objects.filter(pk=self.other.pk).update(views=50)
+        self.assertEqual(self.build(), set())
+
+    def test_unpublished_posts_are_removed(self):
+        self.build()
+        BlogPost.objects.filter(pk=self.post.pk).update(status='draft')
+        self.build()
+        self.assertFalse((self.root / 'blog' / 'prebuilt').joinpath('index.html').exists())
+        self.assertNotIn(self.post.get_absolute_url(), static_site.read_manifest())
+
+    def test_served_without_reaching_views(self):
+        self.build()
+        with mock.patch('research.views.render') as render:
+            response = self.client.get('/research/methodology/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        render.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'<html', gzip.decompress(response.content))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        plain = self.client.get('/research/methodology/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(
+            self.client.get('/research/methodology/', HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304,
+        )
+
+    def test_session_cookie_and_query_string_reach_django(self):
+        self.build()
+        self.client.cookies['sessionid'] = 'x' * 32
+        with mock.patch('research.views.render', wraps=research_views.render) as render:
+            self.client.get('/research/methodology/')
+            del self.client.cookies['sessionid']
+            self.client.get('/research/methodology/?ref=mail')
+        self.assertEqual(render.call_count, 2)
+
+    def test_served_post_counts_view_and_edits_fall_back(self):
+        self.build()
+        self.client.get(self.post.get_absolute_url())
+        counters.flush_views()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 1)
+
+        self.post.content = 'Edited after the build.'
+        self.post.save()
+        self.assertContains(self.client.get(self.post.get_absolute_url()), 'Edited after the build.')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_static_site', processes=1, stdout=out)
+        self.assertIn('Rendered', out.getvalue())
+        call_command('build_static_site', processes=1, stdout=out)
+        self.assertIn(f'Rendered 0 of {len(static_site.read_manifest())} pages', out.getvalue())
+
+
+class PreviewServerTests(StaticSiteMixin, BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        static_site.build(processes=1)
+        import simple_server
+        quiet = mock.patch.object(simple_server.PreviewRequestHandler, 'log_message')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        self.server = simple_server.make_server(0, '127.0.0.1')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def fetch(self, path, **headers):
+        request = urllib.request.Request(f'http://127.0.0.1:{self.server.server_port}{path}', headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def test_pages_and_assets(self):
+        status, headers, body = self.fetch('/research/methodology/', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual((status, headers['Content-Encoding']), (200, 'gzip'))
+        self.assertEqual(gzip.decompress(body), (self.root / 'research' / 'methodology' / 'index.html').read_bytes())
+        self.assertEqual(self.fetch('/research/methodology/', **{'If-None-Match': headers['ETag']})[0], 304)
+        self.assertEqual(self.fetch('/research/methodology/', **{'If-Modified-Since': headers['Last-Modified']})[0], 304)
+        self.assertEqual(self.fetch('/research/methodology/', **{
+            'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT',
+        })[0], 200)
+        self.assertEqual(self.fetch('/research/methodology/', **{
+            'If-None-Match': '"other"', 'If-Modified-Since': headers['Last-Modified'],
+        })[0], 200)
+
+        status, headers, body = self.fetch('/static/css/style.css')
+        self.assertEqual((status, headers['Content-Type']), (200, 'text/css; charset=utf-8'))
+        self.assertEqual(body, (settings.BASE_DIR / 'static' / 'css' / 'style.css').read_bytes())
+
+    def test_manifest_is_parsed_once_per_build(self):
+        import simple_server
+        with mock.patch.object(static_site, 'read_manifest', wraps=static_site.read_manifest) as read_manifest:
+            for _ in range(3):
+                self.assertEqual(self.fetch('/research/methodology/')[0], 200)
+            self.assertLessEqual(read_manifest.call_count, 1)
+            static_site.build(processes=1, force=True)
+            os.utime(self.root / static_site.MANIFEST_NAME, ns=(1, 1))  # a different version, whatever the clock
+            self.fetch('/research/methodology/')
+        self.assertEqual(simple_server._manifest['version'][1], 1)
+
+    def test_other_urls_go_to_django(self):
+        status, _, body = self.fetch('/tools/dating-recommendations/')
+        self.assertEqual(status, 200)
+        self.assertIn(b'submission_token', body)
+        self.assertEqual(self.fetch('/static/../manage.py')[0], 404)
+
+
+class CriticalCSSTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(CRITICAL_CSS_FILE=self.root / 'critical_css.json', CRITICAL_CSS=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.post = make_post('Critical')
+
+    def test_extract_keeps_rules_at_the_top_of_the_page(self):
+        css = '''
+            @keyframes pulse { to { opacity: 0 } }
+            @keyframes unused { to { opacity: 1 } }
+            body { margin: 0 }
+            .hero, .footer { color: red }
+            a:not(.skip):hover { color: blue }
+            #top > .cta { animation: pulse 1s }
+            .footer { color: green }
+            @media (max-width: 768px) { .hero { padding: 0 } .footer { padding: 1rem } }
+        '''
+        html = ('<html><head><style>.footer {}</style></head><body>'
+                '<div id="top" class="hero"><a class="cta" href="/">Go</a></div>'
+                + 'x' * critical_css.FOLD_CHARS + '<div class="footer"></div></body></html>')
+        self.assertEqual(critical_css.extract(css, [html]), (
+            '@keyframes pulse{to{opacity: 0}}body{margin: 0}.hero{color: red}a:not(.skip):hover{color: blue}'
+            '#top > .cta{animation: pulse 1s}@media (max-width: 768px){.hero{padding: 0}}'
+        ))
+
+    def test_build_is_incremental(self):
+        self.assertEqual(critical_css.build(), (5, 5))
+        manifest = critical_css.read_manifest()
+        self.assertEqual(manifest['blog_detail']['paths'], [self.post.get_absolute_url()])
+        self.assertIn('.content-container{', manifest['research']['css'])
+        self.assertIn(str(settings.BASE_DIR / 'templates' / 'base.html'), manifest['research']['templates'])
+
+        self.assertEqual(critical_css.build(), (0, 5))
+        newer = make_post('Newer')
+        self.assertEqual(critical_css.build(), (1, 5))
+        self.assertEqual(critical_css.read_manifest()['blog_detail']['paths'], [newer.get_absolute_url()])
+
+    def test_pages_inline_critical_css(self):
+        critical_css.build()
+        content = self.client.get('/research/methodology/').content.decode()
+        css = critical_css.read_manifest()['research']['css']
+        self.assertIn(f'<style>{css}</style>', content)
+        self.assertIn('<link rel="preload" href="/static/css/base.css" as="style"', content)
+        self.assertIn('<noscript><link rel="stylesheet" href="/static/css/base.css"></noscript>', content)
+        self.assertIn('href="/static/css/home.css" as="style"', self.client.get('/').content.decode())
+
+        with override_settings(CRITICAL_CSS=False):
+            content = self.client.get('/research/methodology/').content.decode()
+        self.assertIn('<link rel="stylesheet" href="/static/css/base.css">', content)
+        self.assertNotIn(css, content)
+
+    def test_prebuilt_pages_follow_critical_css(self):
+        with override_settings(STATIC_SITE_ROOT=self.root / 'site'):
+            static_site.build()
+            critical_css.build()
+            rendered, total = static_site.build()
+        self.assertEqual(rendered, total)
@@ -1,6 +1,6 @@
 # blog/urls.py - UPDATED WITH TAG SUPPORT
 from django.urls import path
-from . import views
+from . import syndication, views
 
 app_name = 'blog'
 
@@ -9,9 +9,13 @@ urlpatterns = [
     path('', views.blog_index, name='blog_index'),
     path('category/<str:category_slug>/', views.blog_category, name='blog_category'),
     path('tag/<slug:tag_slug>/', views.blog_tag, name='blog_tag'),
-    path('<slug:slug>/', views.blog_detail, name='blog_detail'),
+    path('search/', views.blog_search, name='blog_search'),
+    path('api/posts/', views.blog_posts_api, name='blog_posts_api'),
     
-    # SEO sitemaps (you'll need to create these views)
-    # path('sitemap.xml', views.blog_sitemap, name='blog_sitemap'),
-    # path('feed/', views.blog_feed, name='blog_feed'),
+    # Sitemaps and feeds (blog/syndication.py)
+    path('sitemap.xml', syndication.blog_sitemap, name='blog_sitemap'),
+    path('sitemap-<slug:section>-<int:page>.xml', syndication.blog_sitemap_section, name='blog_sitemap_section'),
+    path('feed/', syndication.blog_feed, name='blog_feed'),
+    path('feed/atom/', syndication.blog_atom_feed, name='blog_atom_feed'),
+    path('<slug:slug>/', views.blog_detail, name='blog_detail'),
 ]
@@ -1,54 +1,51 @@
 # blog/views.py - SEO OPTIMIZED
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.core.paginator import InvalidPage, Paginator
+from django.http import JsonResponse
+from django.db.models import BooleanField, ExpressionWrapper, OuterRef, Q, Subquery
 from django.utils import timezone
-from .models import BlogPost, Tag
+from .models import BlogPost, RelatedPost, Tag
+from .counters import record_view
+from .page_cache import cache_blog_page, page_generations
+from .conditional import conditional_detail, conditional_listing, listing_version
+from .pagination import KeysetPaginator
+from .search import search_posts
+from .sidebar import get_sidebar
 
+LISTING_PAGE_SIZE = 9
+
+def _listing_paginator(request, posts_list, count=None):
+    """
+    Keyset paginator for a listing page. Its page boundary table is keyed on
+    the same content version as the page cache and ETags.
+    """
+    version = (request.path, *page_generations(request.path), *listing_version())
+    return KeysetPaginator(posts_list, LISTING_PAGE_SIZE, cache_key=version, count=count)
+
+@conditional_listing
+@cache_blog_page
 def blog_index(request):
     """Main blog page with paginated posts and SEO optimization"""
+    # Card columns only - article bodies stay in the database
     posts_list = BlogPost.objects.filter(
         status='published',
         published_date__lte=timezone.now()
-    ).select_related().prefetch_related('tags')
+    ).cards()
     
-    # Pagination - 9 posts per page (good for SEO with proper pagination)
-    paginator = Paginator(posts_list, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination - 9 posts per page, ?page=N URLs kept for SEO.
+    # The total is the cached listing version's count, so no COUNT(*) here.
+    paginator = _listing_paginator(request, posts_list, count=listing_version()[0])
+    page_obj = paginator.get_page(request.GET.get('page'))
     
-    # Get categories with post counts for sidebar
-    categories = []
-    for choice_value, choice_label in BlogPost.CATEGORY_CHOICES:
-        count = BlogPost.objects.filter(
-            status='published',
-            published_date__lte=timezone.now(),
-            category=choice_value
-        ).count()
-        if count > 0:
-            categories.append({
-                'name': choice_label,
-                'slug': choice_value,
-                'post_count': count
-            })
-    
-    # Get popular tags (with at least 2 posts)
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('blogpost')
-    ).filter(post_count__gte=2).order_by('-post_count')[:10]
-    
-    # Get recent posts
-    recent_posts = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now()
-    ).order_by('-published_date')[:5]
+    # Sidebar (categories, popular tags, recent posts) comes from the
+    # blog_sidebar context processor
     
     # Get featured posts
     featured_posts = BlogPost.objects.filter(
         status='published',
         published_date__lte=timezone.now(),
         is_featured=True
-    ).order_by('-published_date')[:3]
+    ).cards().order_by('-published_date')[:3]
     
     # SEO Meta Data
     seo_data = {
@@ -61,57 +58,69 @@ def blog_index(request):
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
-        'popular_tags': popular_tags,
-        'recent_posts': recent_posts,
         'featured_posts': featured_posts,
         'seo': seo_data,
     }
     return render(request, 'blog/index.html', context)
 
-def blog_detail(request, slug):
-    """Single blog post detail view with full SEO optimization"""
-    post = get_object_or_404(
-        BlogPost.objects.select_related().prefetch_related('tags'),
-        slug=slug,
-        status='published',
-        published_date__lte=timezone.now()
-    )
+# Columns the related/next/previous blocks render
+NAVIGATION_FIELDS = ('id', 'title', 'slug', 'category', 'featured_image', 'published_date')
+
+def _post_navigation(post):
+    """
+    Related posts plus next/previous posts for a detail page in one query.
+    Each block is an index-backed ORDER BY ... LIMIT subquery, so the cost
+    does not grow with the number of posts.
+    """
+    published = BlogPost.objects.published().exclude(pk=post.pk)
     
-    # Increment view count
-    post.views += 1
-    post.save(update_fields=['views'])
+    # Precomputed by the related-posts engine (blog/related.py)
+    related_ids = published.filter(related_to__post=post).order_by('-related_to__score').values('pk')[:4]
+    related_score = RelatedPost.objects.filter(post=post, related=OuterRef('pk')).values('score')[:1]
     
-    # Get related posts (same category or tags, excluding current)
-    related_posts = BlogPost.objects.filter(
-        Q(category=post.category) | Q(tags__in=post.tags.all()),
-        status='published',
-        published_date__lte=timezone.now()
-    ).exclude(id=post.id).distinct()[:4]
+    # Ties on published_date are broken by id so navigation never skips a post
+    after = Q(published_date__gt=post.published_date) | Q(published_date=post.published_date, pk__gt=post.pk)
+    before = Q(published_date__lt=post.published_date) | Q(published_date=post.published_date, pk__lt=post.pk)
+    next_ids = published.filter(after).order_by('published_date', 'id').values('pk')[:1]
+    prev_ids = published.filter(before).order_by('-published_date', '-id').values('pk')[:1]
     
-    # Get next and previous posts for better navigation
-    next_post = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now(),
-        published_date__gt=post.published_date
-    ).order_by('published_date').first()
+    rows = published.filter(
+        Q(pk__in=related_ids) | Q(pk__in=next_ids) | Q(pk__in=prev_ids)
+    ).annotate(
+        is_related=ExpressionWrapper(Q(pk__in=related_ids), output_field=BooleanField()),
+        related_score=Subquery(related_score),
+    ).only(*NAVIGATION_FIELDS).order_by('-published_date', '-id')
     
-    prev_post = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now(),
-        published_date__lt=post.published_date
-    ).order_by('-published_date').first()
+    related_posts, next_post, prev_post = [], None, None
+    position = (post.published_date, post.pk)
+    for row in rows:
+        if row.is_related:
+            related_posts.append(row)
+        # Rows come newest first: the last one after the post is the next post,
+        # the first one before it is the previous post
+        if (row.published_date, row.pk) > position:
+            next_post = row
+        elif prev_post is None:
+            prev_post = row
+    related_posts.sort(key=lambda row: row.related_score, reverse=True)
+    return related_posts, next_post, prev_post
+
+@conditional_detail
+@cache_blog_page
+def blog_detail(request, slug):
+    """Single blog post detail view with full SEO optimization"""
+    post = get_object_or_404(
+        BlogPost.objects.published().prefetch_related('tags'),
+        slug=slug
+    )
     
-    # Get popular tags
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('blogpost')
-    ).filter(post_count__gte=2).order_by('-post_count')[:10]
+    # Count the view - buffered and written to the database in batches.
+    # Prebuilt copies (blog/static_site.py) count theirs when served.
+    if not getattr(request, 'static_export', False):
+        post.views += record_view(post.pk)
     
-    # Get recent posts
-    recent_posts = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now()
-    ).exclude(id=post.id).order_by('-published_date')[:5]
+    # Related, next and previous posts - one query
+    related_posts, next_post, prev_post = _post_navigation(post)
     
     # SEO Meta Data
     seo_data = {
@@ -134,12 +143,14 @@ def blog_detail(request, slug):
         'related_posts': related_posts,
         'next_post': next_post,
         'prev_post': prev_post,
-        'popular_tags': popular_tags,
-        'recent_posts': recent_posts,
         'seo': seo_data,
     }
-    return render(request, 'blog/detail.html', context)
+    response = render(request, 'blog/detail.html', context)
+    response.blog_post_pk = post.pk  # lets page cache hits count views too
+    return response
 
+@conditional_listing
+@cache_blog_page
 def blog_category(request, category_slug):
     """Posts filtered by category with SEO optimization"""
     # Find the category label for the given slug
@@ -158,38 +169,14 @@ def blog_category(request, category_slug):
         category=category_slug,
         status='published',
         published_date__lte=timezone.now()
-    ).select_related().prefetch_related('tags')
-    
-    # Pagination
-    paginator = Paginator(posts_list, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    ).cards()
     
-    # Get categories for sidebar
-    categories = []
-    for choice_value, choice_label in BlogPost.CATEGORY_CHOICES:
-        count = BlogPost.objects.filter(
-            status='published',
-            published_date__lte=timezone.now(),
-            category=choice_value
-        ).count()
-        if count > 0:
-            categories.append({
-                'name': choice_label,
-                'slug': choice_value,
-                'post_count': count
-            })
+    # Keyset pagination - the total comes from the cached sidebar counts
+    post_count = next((c['post_count'] for c in get_sidebar()['categories'] if c['slug'] == category_slug), 0)
+    paginator = _listing_paginator(request, posts_list, count=post_count)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
-    # Get popular tags
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('blogpost')
-    ).filter(post_count__gte=2).order_by('-post_count')[:10]
-    
-    # Get recent posts
-    recent_posts = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now()
-    ).order_by('-published_date')[:5]
+    # Sidebar comes from the blog_sidebar context processor
     
     # SEO Meta Data
     seo_data = {
@@ -203,13 +190,12 @@ def blog_category(request, category_slug):
     context = {
         'category': {'slug': category_slug, 'name': category_label},
         'page_obj': page_obj,
-        'categories': categories,
-        'popular_tags': popular_tags,
-        'recent_posts': recent_posts,
         'seo': seo_data,
     }
     return render(request, 'blog/category.html', context)
 
+@conditional_listing
+@cache_blog_page
 def blog_tag(request, tag_slug):
     """Posts filtered by tag with SEO optimization"""
     tag = get_object_or_404(Tag, slug=tag_slug)
@@ -219,38 +205,13 @@ def blog_tag(request, tag_slug):
         tags=tag,
         status='published',
         published_date__lte=timezone.now()
-    ).select_related().prefetch_related('tags')
-    
-    # Pagination
-    paginator = Paginator(posts_list, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    ).cards()
     
-    # Get categories for sidebar
-    categories = []
-    for choice_value, choice_label in BlogPost.CATEGORY_CHOICES:
-        count = BlogPost.objects.filter(
-            status='published',
-            published_date__lte=timezone.now(),
-            category=choice_value
-        ).count()
-        if count > 0:
-            categories.append({
-                'name': choice_label,
-                'slug': choice_value,
-                'post_count': count
-            })
+    # Keyset pagination - total from approximate_count(), only if rendered
+    paginator = _listing_paginator(request, posts_list)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
-    # Get popular tags
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('blogpost')
-    ).filter(post_count__gte=2).order_by('-post_count')[:10]
-    
-    # Get recent posts
-    recent_posts = BlogPost.objects.filter(
-        status='published',
-        published_date__lte=timezone.now()
-    ).order_by('-published_date')[:5]
+    # Sidebar comes from the blog_sidebar context processor
     
     # SEO Meta Data
     seo_data = {
@@ -264,9 +225,77 @@ def blog_tag(request, tag_slug):
     context = {
         'tag': tag,
         'page_obj': page_obj,
-        'categories': categories,
-        'popular_tags': popular_tags,
-        'recent_posts': recent_posts,
         'seo': seo_data,
     }
     return render(request, 'blog/tag.html', context)
+
+def blog_search(request):
+    """Full-text search over published posts, best match first"""
+    query = request.GET.get('q', '').strip()
+    posts_list = search_posts(query).cards()
+    
+    # Pagination
+    paginator = Paginator(posts_list, 9)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    # SEO Meta Data
+    seo_data = {
+        'title': f'Search: {query} - Dating Hub Research' if query else 'Search - Dating Hub Research',
+        'meta_description': 'Search research insights and dating advice from Dating Hub Research Team.',
+        'canonical_url': request.build_absolute_uri(request.path),
+        'og_type': 'website',
+    }
+    
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'seo': seo_data,
+    }
+    return render(request, 'blog/search.html', context)
+
+@conditional_listing
+def blog_posts_api(request):
+    """
+    JSON listing for infinite scroll: ?cursor= from the previous response's
+    next_cursor, optional ?category= / ?tag= filters, and ?count=1 for an
+    approximate total.
+    """
+    posts_list = BlogPost.objects.published().cards()
+    if request.GET.get('category'):
+        posts_list = posts_list.filter(category=request.GET['category'])
+    if request.GET.get('tag'):
+        posts_list = posts_list.filter(tags__slug=request.GET['tag'])
+    
+    paginator = KeysetPaginator(posts_list, LISTING_PAGE_SIZE)
+    try:
+        cursor = request.GET.get('cursor')
+        page_obj = paginator.page_after(cursor) if cursor else paginator.get_page(1)
+    except InvalidPage as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    next_url = None
+    if page_obj.has_next():
+        params = request.GET.copy()
+        params['cursor'] = page_obj.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    
+    data = {
+        'results': [{
+            'id': post.pk,
+            'title': post.title,
+            'slug': post.slug,
+            'url': post.get_absolute_url(),
+            'excerpt': post.excerpt,
+            'category': post.category,
+            'category_name': post.get_category_display(),
+            'featured_image': post.featured_image.url if post.featured_image else None,
+            'published_date': post.published_date.isoformat(),
+        } for post in page_obj],
+        'page': page_obj.number,
+        'next_cursor': page_obj.next_cursor,
+        'next': next_url,
+    }
+    if request.GET.get('count'):
+        data['approximate_count'] = paginator.count
+    return JsonResponse(data)
@@ -16,7 +16,8 @@ ls -la
 echo "1. Installing dependencies..."
 pip install -r requirements.txt
 
-# Collect static files (CRITICAL)
+# Collect static files (CRITICAL). Every build starts from a fresh
+# checkout, so everything is collected, minified and compressed each time.
 echo "2. Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
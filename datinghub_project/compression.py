@@ -0,0 +1,247 @@
+# datinghub_project/compression.py - Minified, compressed responses
+#
+# CompressionMiddleware minifies HTML and compresses text responses with
+# brotli (if installed) or gzip, whichever the client prefers. WhiteNoise
+# and the prebuilt pages already send precompressed files, and anything
+# with a Content-Encoding is passed through untouched.
+#
+# Most pages are byte-for-byte the same for every visitor, so the minified
+# body and each compressed encoding are kept in a per-process LRU. The key
+# is the SHA-256 of the uncompressed body, so the same response is never
+# minified or compressed twice. Bodies differ for every visitor when they
+# carry a CSRF token (forms). Those skip the cache and get gzip with random
+# padding (Django's "Heal the BREACH"), so the token can't be recovered
+# from the compressed sizes.
+#
+# Streaming responses (exports, feeds) are compressed chunk by chunk, and
+# so are bodies of COMPRESSION_STREAM_MIN_SIZE or more, which are streamed
+# rather than cached. `manage.py benchmark_compression` measures the CPU
+# time and bytes saved at each gzip level and brotli quality.
+import gzip
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # optional - gzip only
+    brotli = None
+
+# Smaller bodies gain less than the Content-Encoding costs
+MIN_SIZE = 200
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml',
+    'application/rss+xml', 'application/atom+xml', 'image/svg+xml',
+)
+STREAM_CHUNK_SIZE = 64 * 1024
+# Padding for gzip bodies carrying a CSRF token, as GZipMiddleware adds
+BREACH_RANDOM_BYTES = 100
+
+
+def gzip_level():
+    return getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+
+
+def brotli_quality():
+    return getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+
+# ===== MINIFYING =====
+# Comments, and the elements whose whitespace must not change
+_PROTECTED = re.compile(
+    rb'<!--.*?-->|<(script|pre|textarea)\b.*?</\1\s*>|<style\b.*?</style\s*>',
+    re.S | re.I,
+)
+# Line breaks with the indentation around them
+_LINE_BREAK = re.compile(rb'[ \t\r]*\n\s*')
+
+
+def minify_html(html):
+    """
+    Drop comments, indentation and blank lines from HTML bytes. Runs of
+    whitespace that hold a line break become one line break, which renders
+    the same; <script>, <pre> and <textarea> are left as they are.
+    """
+    parts, end = [], 0
+    for match in _PROTECTED.finditer(html):
+        parts.append(_LINE_BREAK.sub(b'\n', html[end:match.start()]))
+        piece = match.group()
+        if piece.startswith(b'<!--'):
+            if piece.startswith(b'<!--[if'):  # conditional comment
+                parts.append(piece)
+        elif piece[:6].lower() == b'<style':
+            parts.append(_LINE_BREAK.sub(b'\n', piece))
+        else:
+            parts.append(piece)
+        end = match.end()
+    parts.append(_LINE_BREAK.sub(b'\n', html[end:]))
+    return b''.join(parts)
+
+
+# ===== ENCODING =====
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(request):
+    """'br', 'gzip' or None, in that order of preference"""
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality() if level is None else level)
+    return gzip.compress(data, gzip_level() if level is None else level, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of bytes, flushing after each chunk so none is held back"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality())
+        for chunk in chunks:
+            packed = compressor.process(chunk) + compressor.flush()
+            if packed:
+                yield packed
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(gzip_level(), zlib.DEFLATED, 31)  # wbits 31: gzip container
+        for chunk in chunks:
+            packed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if packed:
+                yield packed
+        yield compressor.flush()
+
+
+def _chunked(data):
+    for start in range(0, len(data), STREAM_CHUNK_SIZE):
+        yield data[start:start + STREAM_CHUNK_SIZE]
+
+
+# ===== CACHE =====
+class OutputCache:
+    """Minified and compressed bodies by (body digest, encoding), least recently used dropped first"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, make):
+        """The entry for `key`, from make() if it isn't cached"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = make()  # outside the lock - other threads carry on meanwhile
+        with self._lock:
+            if key not in self._entries and len(value) <= self.max_bytes:
+                self._entries[key] = value
+                self.size += len(value)
+                while self.size > self.max_bytes:
+                    self.size -= len(self._entries.popitem(last=False)[1])
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = self.hits = self.misses = 0
+
+
+output_cache = OutputCache(getattr(settings, 'COMPRESSION_CACHE_BYTES', 32 * 1024 * 1024))
+
+
+# ===== MIDDLEWARE =====
+class CompressionMiddleware:
+    """
+    Goes after WhiteNoise and PrebuiltPageMiddleware, which send their own
+    compressed files, and before everything that renders pages.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '').lower()
+        if response.has_header('Content-Encoding') or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if response.streaming:
+            if response.is_async:
+                return response
+            patch_vary_headers(response, ('Accept-Encoding',))
+            encoding = choose_encoding(request)
+            if encoding:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+                if response.has_header('Content-Length'):
+                    del response.headers['Content-Length']
+                self._encoded(response, encoding)
+            return response
+        if len(response.content) < MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        minify = content_type.startswith('text/html') and getattr(settings, 'HTML_MINIFY', True)
+        content = response.content
+        if settings.CSRF_COOKIE_NAME in response.cookies:
+            # The page used the CSRF token, whose masking makes the body unique
+            if minify:
+                content = minify_html(content)
+            if encoding:
+                content, encoding = compress_string(content, max_random_bytes=BREACH_RANDOM_BYTES), 'gzip'
+        else:
+            digest = hashlib.sha256(content).digest()
+            if minify:
+                content = output_cache.get((digest, None), lambda: minify_html(response.content))
+            if encoding and len(content) >= getattr(settings, 'COMPRESSION_STREAM_MIN_SIZE', 1024 * 1024):
+                return self._streamed(response, content, encoding)
+            if encoding:
+                minified = content
+                content = output_cache.get((digest, encoding), lambda: compress(minified, encoding))
+
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        if encoding:
+            self._encoded(response, encoding)
+        return response
+
+    def _encoded(self, response, encoding):
+        response.headers['Content-Encoding'] = encoding
+        # The ETag was computed on the uncompressed body
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+    def _streamed(self, response, content, encoding):
+        """A StreamingHttpResponse like `response`, sending `content` compressed chunk by chunk"""
+        streamed = StreamingHttpResponse(
+            compress_stream(_chunked(content), encoding), status=response.status_code, reason=response.reason_phrase,
+        )
+        for header, value in response.items():
+            if header.lower() != 'content-length':
+                streamed.headers[header] = value
+        streamed.cookies = response.cookies
+        self._encoded(streamed, encoding)
+        return streamed
@@ -0,0 +1,17 @@
+# datinghub_project/db.py - Database helpers shared by the apps
+import json
+
+from django.db import connection
+
+
+def approximate_count(queryset):
+    """The Postgres planner's row estimate; an exact COUNT(*) elsewhere"""
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
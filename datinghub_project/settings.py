@@ -38,6 +38,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Hashed static files with far-future caching, .br/.gz when accepted
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Prebuilt pages from `manage.py build_static_site`, when STATIC_SITE_SERVE is on
+    'blog.static_site.PrebuiltPageMiddleware',
+    # Minified HTML; brotli or gzip for everything below it
+    'datinghub_project.compression.CompressionMiddleware',
+    # Serves the static research pages from memory, ahead of sessions and CSRF
+    'research.fast_path.FastPathMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'blog.context_processors.blog_sidebar',
             ],
         },
     },
@@ -80,6 +89,8 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'info@dating-hub.com.au')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
+# Absolute links in outgoing mail (newsletter unsubscribe links)
+SITE_URL = os.environ.get('SITE_URL', 'https://dating-hub.com.au')
 
 
 # Database
@@ -94,6 +105,19 @@ DATABASES = {
     )
 }
 
+# Shared by every gunicorn worker and management command: page cache
+# generations (blog/page_cache.py), buffered view counts (blog/counters.py)
+# and rate limit buckets (research/ratelimit.py) only work across processes
+# with one cache. Without REDIS_URL (local development, tests) each process
+# has its own in-memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -132,6 +156,22 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Content-hashed names plus gzip/brotli copies
+# (datinghub_project/storage.py). Hashed URLs are on by default whenever
+# DEBUG is off.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'datinghub_project.storage.StaticAssetStorage'},
+}
+STATIC_HASHED_URLS = os.environ.get('STATIC_HASHED_URLS', str(not DEBUG)).lower() == 'true'
+# A file missing from the manifest keeps its plain URL instead of failing the page
+WHITENOISE_MANIFEST_STRICT = False
+# WhiteNoise bases these on DEBUG, which is always on here: rescanning the
+# files on every request, serving them through the finders, and no caching
+# of files without a hashed name
+WHITENOISE_AUTOREFRESH = os.environ.get('WHITENOISE_AUTOREFRESH', str(DEBUG)).lower() == 'true'
+WHITENOISE_USE_FINDERS = os.environ.get('WHITENOISE_USE_FINDERS', str(DEBUG)).lower() == 'true'
+WHITENOISE_MAX_AGE = int(os.environ.get('WHITENOISE_MAX_AGE', 0 if DEBUG else 60))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -142,6 +182,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Survey submissions are spooled here before the database insert
+# (research/spool.py) - point it at a disk that survives restarts
+SURVEY_SPOOL_DIR = Path(os.environ.get('SURVEY_SPOOL_DIR', BASE_DIR / 'var' / 'survey_spool'))
+
+# Monthly archives of old processed submissions (research/archive.py) -
+# private files, kept out of MEDIA_ROOT
+SURVEY_ARCHIVE_DIR = Path(os.environ.get('SURVEY_ARCHIVE_DIR', BASE_DIR / 'var' / 'survey_archive'))
+SURVEY_RETENTION_DAYS = int(os.environ.get('SURVEY_RETENTION_DAYS', 180))
+
+# Proxies in front of the app that add to X-Forwarded-For - the survey and
+# newsletter rate limits (research/ratelimit.py) key on the client IP
+RATE_LIMIT_PROXY_COUNT = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', 0))
+
+# Serve the static research pages from memory (research/fast_path.py);
+# defaults to on whenever DEBUG is off
+RESEARCH_FAST_PATH = os.environ.get('RESEARCH_FAST_PATH', str(not DEBUG)).lower() == 'true'
+
+# Prebuilt research and blog pages (blog/static_site.py), rendered with
+# STATIC_SITE_HOST in their absolute URLs
+STATIC_SITE_ROOT = Path(os.environ.get('STATIC_SITE_ROOT', BASE_DIR / 'var' / 'static_site'))
+STATIC_SITE_HOST = os.environ.get('STATIC_SITE_HOST', 'dating-hub.com.au')
+STATIC_SITE_SERVE = os.environ.get('STATIC_SITE_SERVE', 'False').lower() == 'true'
+
+# Inline each template family's critical CSS from `manage.py
+# build_critical_css` (blog/critical_css.py); defaults to on whenever DEBUG is off
+CRITICAL_CSS = os.environ.get('CRITICAL_CSS', str(not DEBUG)).lower() == 'true'
+CRITICAL_CSS_FILE = Path(os.environ.get('CRITICAL_CSS_FILE', BASE_DIR / 'var' / 'critical_css.json'))
+
+# Response compression (datinghub_project/compression.py). Each body is
+# compressed once per process, so the levels trade first-request CPU for
+# bytes; `manage.py benchmark_compression` shows the curve. Past brotli 8
+# the cost jumps tenfold.
+HTML_MINIFY = True
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+# Bodies this size or larger are compressed as a stream instead of cached
+COMPRESSION_STREAM_MIN_SIZE = 1024 * 1024
+COMPRESSION_CACHE_BYTES = 32 * 1024 * 1024
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -0,0 +1,106 @@
+# datinghub_project/storage.py - Static files storage for collectstatic
+#
+# WhiteNoise's CompressedManifestStaticFilesStorage gives every file a
+# content-hashed name and gzip/brotli copies. The WhiteNoise middleware
+# serves the hashed names with a one-year immutable Cache-Control, and picks
+# the .br or .gz copy the browser accepts. On top of that, this storage:
+#
+# - minifies the project's own CSS and JavaScript (static/css/style.css,
+#   static/js/main.js and the rest of STATICFILES_DIRS) before they are
+#   hashed and compressed. App files such as the admin's are left alone;
+# - skips compressing files whose .gz/.br copies are already up to date.
+#   A hashed name never changes content, so only new files are compressed
+#   where STATIC_ROOT is kept between runs (not on Render, whose builds
+#   start from a fresh checkout);
+# - links hashed URLs whenever STATIC_HASHED_URLS is on. Django only does
+#   that with DEBUG off, and this project's DEBUG setting isn't read from
+#   the environment.
+#
+# minify_css() is also used for the critical CSS inlined in pages
+# (blog/critical_css.py).
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import HashedFilesMixin
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+# ===== MINIFYING =====
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    # Not around ':' or '>' - 'a :hover' and 'a:hover' are different selectors
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Conservative: drops blank lines, indentation and whole-line // comments only"""
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class StaticAssetStorage(CompressedManifestStaticFilesStorage):
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force=force or getattr(settings, 'STATIC_HASHED_URLS', False))
+        except ValueError:
+            # Not collected yet (a fresh checkout, the test run): the plain
+            # name, which the finders and WhiteNoise's autorefresh still serve
+            return super(HashedFilesMixin, self).url(name)
+
+    # ===== MINIFYING =====
+    def minify_files(self, paths):
+        """
+        Minify the collected copies of the project's CSS and JS in place, and
+        point `paths` at them: the hashed copies are made from its entries.
+        """
+        project_dirs = {os.path.abspath(d) for d in settings.STATICFILES_DIRS}
+        for name, (source_storage, _) in paths.items():
+            minify = MINIFIERS.get(os.path.splitext(name)[1])
+            if (
+                minify is None or name.endswith(('.min.css', '.min.js'))
+                or os.path.abspath(getattr(source_storage, 'location', '')) not in project_dirs
+            ):
+                continue
+            with self.open(name) as f:
+                original = f.read().decode()
+            minified = minify(original)
+            if minified != original:
+                with open(self.path(name), 'w') as f:
+                    f.write(minified)
+            paths[name] = (self, name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            self.minify_files(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    # ===== COMPRESSION =====
+    def _compressed_is_current(self, name, compressor):
+        path = self.path(name)
+        suffixes = ['.gz'] if compressor.use_gzip else []
+        if compressor.use_brotli:
+            suffixes.append('.br')
+        try:
+            if name in self._hashed_names:
+                # The name is a hash of the final content, but Django rewrites
+                # hashed CSS and JS on every run - any existing copy is current
+                return all(os.path.exists(path + suffix) for suffix in suffixes)
+            source = os.stat(path).st_mtime
+            # The compressor copies the source's mtime to what it writes
+            return all(os.stat(path + suffix).st_mtime >= source - 0.001 for suffix in suffixes)
+        except FileNotFoundError:
+            return False
+
+    def compress_files(self, names):
+        compressor = self.create_compressor(
+            extensions=getattr(settings, 'WHITENOISE_SKIP_COMPRESS_EXTENSIONS', None), quiet=True,
+        )
+        self._hashed_names = set(self.hashed_files.values())
+        stale = [name for name in names if not self._compressed_is_current(name, compressor)]
+        yield from super().compress_files(stale)
@@ -0,0 +1,130 @@
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from . import compression, storage
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        compression.output_cache.clear()
+        self.addCleanup(compression.output_cache.clear)
+
+    def test_minify_html(self):
+        html = (b'<div>\n    <p>Two  spaces</p>   \n\n  <!-- note --><!--[if IE]>old<![endif]-->\n'
+                b'<pre>\n  kept\n</pre>\n  <script>\n  var a = 1;\n</script>\n  <style>\n  a { b: c }\n</style>\n</div>')
+        self.assertEqual(compression.minify_html(html), (
+            b'<div>\n<p>Two  spaces</p>\n<!--[if IE]>old<![endif]-->\n'
+            b'<pre>\n  kept\n</pre>\n<script>\n  var a = 1;\n</script>\n<style>\na { b: c }\n</style>\n</div>'
+        ))
+
+    def test_negotiates_and_compresses_each_body_once(self):
+        plain = self.client.get('/research/ethics/')
+        self.assertNotIn('Content-Encoding', plain)
+        with override_settings(HTML_MINIFY=False):
+            raw = self.client.get('/research/ethics/')
+        self.assertEqual(plain.content, compression.minify_html(raw.content))
+        self.assertLess(len(plain.content), len(raw.content) * 0.8)
+
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            packed = self.client.get('/research/ethics/', HTTP_ACCEPT_ENCODING='gzip, br')
+            again = self.client.get('/research/ethics/', HTTP_ACCEPT_ENCODING='br;q=1.0, gzip;q=0.5')
+            zipped = self.client.get('/research/ethics/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 2)  # br, then gzip
+        self.assertEqual((packed['Content-Encoding'], packed['Vary']), ('br', 'Accept-Encoding'))
+        self.assertEqual(int(packed['Content-Length']), len(packed.content))
+        self.assertEqual(again.content, packed.content)
+        self.assertEqual(compression.brotli.decompress(packed.content), plain.content)
+        self.assertEqual(gzip.decompress(zipped.content), plain.content)
+
+    def test_pages_with_a_csrf_token_are_padded_not_cached(self):
+        first = self.client.get('/tools/dating-recommendations/', HTTP_ACCEPT_ENCODING='br, gzip')
+        second = self.client.get('/tools/dating-recommendations/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(first.content))
+        self.assertNotEqual(first.content, second.content)
+        self.assertEqual(compression.output_cache.size, 0)
+
+    @override_settings(COMPRESSION_STREAM_MIN_SIZE=1000)
+    def test_large_and_streaming_responses_are_streamed(self):
+        plain = self.client.get('/research/ethics/')
+        response = self.client.get('/research/ethics/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Content-Length', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain.content)
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br')
+        chunks = [b'id,email\n', b'1,a@example.com\n' * 100]
+        middleware = compression.CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(chunks), content_type='text/csv'))
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+    def test_skips_encoded_and_binary_responses(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        for response in (
+            HttpResponse(b'x' * 1000, content_type='text/plain', headers={'Content-Encoding': 'gzip'}),
+            HttpResponse(b'x' * 1000, content_type='image/png'),
+            HttpResponse(b'x' * 100, content_type='text/plain'),
+        ):
+            content = response.content
+            result = compression.CompressionMiddleware(lambda request: response)(request)
+            self.assertEqual(result.content, content)
+            self.assertEqual(result.get('Content-Encoding'), response.get('Content-Encoding'))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_compression', repeat=1, stdout=out)
+        self.assertIn('gzip 6', out.getvalue())
+        self.assertIn('<- current setting', out.getvalue())
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(STATIC_ROOT=self.root, STATIC_HASHED_URLS=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_minify_css(self):
+        css = '/* note */\na :hover  {\n  color: red;\n}\n\na > b { margin: 0 }'
+        self.assertEqual(storage.minify_css(css), 'a :hover{color: red}a > b{margin: 0}')
+
+    def test_collectstatic_minifies_hashes_and_compresses(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = staticfiles_storage.url('css/base.css')
+        self.assertRegex(url, r'/static/css/base\.[0-9a-f]{12}\.css$')
+        collected = self.root / url.removeprefix(settings.STATIC_URL)
+        source = (settings.BASE_DIR / 'static' / 'css' / 'base.css').read_text()
+        self.assertEqual(collected.read_text(), storage.minify_css(source))
+        self.assertLess(collected.stat().st_size, len(source.encode()))
+        script = (self.root / 'js' / 'main.js').read_text()
+        self.assertLess(len(script), len((settings.BASE_DIR / 'static' / 'js' / 'main.js').read_text()))
+        # App files aren't touched
+        self.assertIn('\n', (self.root / 'admin' / 'css' / 'base.css').read_text())
+        self.assertEqual(gzip.decompress(Path(f'{collected}.gz').read_bytes()), collected.read_bytes())
+        self.assertTrue(Path(f'{collected}.br').exists())
+
+        # Files with compressed copies aren't compressed again. Tiny files
+        # never get copies (compression wouldn't shrink them), so they are
+        compressed = Path(f'{collected}.gz').stat().st_mtime_ns
+        with mock.patch('whitenoise.compress.Compressor.compress', return_value=[]) as compress:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        recompressed = [Path(call.args[0]) for call in compress.call_args_list]
+        self.assertTrue(recompressed)
+        self.assertFalse([path for path in recompressed if Path(f'{path}.gz').exists()])
+        self.assertEqual(Path(f'{collected}.gz').stat().st_mtime_ns, compressed)
+
+    def test_uncollected_files_keep_their_names(self):
+        self.assertEqual(staticfiles_storage.url('css/style.css'), '/static/css/style.css')
@@ -1,11 +1,44 @@
+from datetime import datetime
+
 from django.contrib import admin
-from django.utils.html import format_html
-from .models import SurveySubmission
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connection
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from datinghub_project.db import approximate_count
+from .archive import search as search_archives
+from .export import export_response
+from .models import BroadcastRun, NewsletterIssue, OutboxMessage, Subscriber, SurveyArchive, SurveySubmission
+from .ratelimit import metrics as rate_limit_metrics
+from .recommend import QUESTIONS
+from .rollups import QUESTION_LABELS, UNKNOWN, distribution
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Changelist paginator that takes the Postgres planner's row estimate
+    instead of COUNT(*) once a result is large enough for an exact count
+    to hurt. Small results, and other databases, are counted exactly.
+    """
+    EXACT_BELOW = 10000
+    
+    @cached_property
+    def count(self):
+        if connection.vendor != 'postgresql':
+            return self.object_list.count()
+        estimate = approximate_count(self.object_list)
+        return self.object_list.count() if estimate < self.EXACT_BELOW else estimate
+
 
 @admin.register(SurveySubmission)
 class SurveySubmissionAdmin(admin.ModelAdmin):
     # ===== LIST VIEW CONFIGURATION =====
     list_display = [
+        'number',
         'email_display', 
         'name_display', 
         'survey_type_display',
@@ -30,10 +63,17 @@ class SurveySubmissionAdmin(admin.ModelAdmin):
     list_editable = ['processed']
     
     list_per_page = 25
+    # Filtered lists skip the extra COUNT(*) over the whole table, and big
+    # result counts come from the planner's estimate
+    show_full_result_count = False
+    paginator = ApproximateCountPaginator
     
     actions = [
         'mark_as_processed',
         'mark_as_unprocessed',
+        'export_csv',
+        'export_csv_gzip',
+        'export_jsonl',
     ]
     
     # ===== DETAIL VIEW CONFIGURATION =====
@@ -43,7 +83,7 @@ class SurveySubmissionAdmin(admin.ModelAdmin):
             'classes': ('wide',),
         }),
         ('Survey Data', {
-            'fields': ('answers_display',),
+            'fields': ('answers_display', 'recommendations_display', 'recommended_at'),
             'classes': ('collapse', 'wide'),
             'description': 'All submitted answers in readable format'
         }),
@@ -56,7 +96,9 @@ class SurveySubmissionAdmin(admin.ModelAdmin):
     readonly_fields = [
         'submitted_at', 
         'updated_at',
-        'answers_display'
+        'answers_display',
+        'recommendations_display',
+        'recommended_at',
     ]
     
     # ===== CUSTOM METHODS =====
@@ -106,6 +148,53 @@ class SurveySubmissionAdmin(admin.ModelAdmin):
         return format_html(html)
     answers_display.short_description = 'Answers'
     
+    def recommendations_display(self, obj):
+        if not obj.recommendations:
+            return "Not scored yet"
+        return format_html_join(
+            '', '<div>{}. <a href="{}">{}</a> ({})</div>',
+            ((rank, platform['url'], platform['name'], platform['score'])
+             for rank, platform in enumerate(obj.recommendations, start=1)),
+        )
+    recommendations_display.short_description = 'Recommendations'
+    
+    # ===== ANALYTICS DASHBOARD =====
+    # Reads only the rollups (research/rollups.py), never the submissions
+    change_list_template = 'admin/research/surveysubmission/change_list.html'
+    
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view),
+                 name='research_surveysubmission_dashboard'),
+            *super().get_urls(),
+        ]
+    
+    def dashboard_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        question = request.GET.get('question', 'q1')
+        if question not in QUESTION_LABELS:
+            question = 'q1'
+        try:
+            days = min(max(int(request.GET.get('days', 30)), 1), 365)
+        except ValueError:
+            days = 30
+        gender = request.GET.get('gender', '')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Survey dashboard',
+            'questions': QUESTION_LABELS.items(),
+            'question': question,
+            'question_label': QUESTION_LABELS[question],
+            'days': days,
+            'gender': gender,
+            'gender_choices': [*QUESTIONS['gender'], UNKNOWN],
+            'stats': distribution(question, days, gender or None),
+            'rate_limits': rate_limit_metrics(),
+        }
+        return TemplateResponse(request, 'admin/research/surveysubmission/dashboard.html', context)
+    
     # ===== ADMIN ACTIONS =====
     def mark_as_processed(self, request, queryset):
         updated = queryset.update(processed=True)
@@ -116,3 +205,116 @@ class SurveySubmissionAdmin(admin.ModelAdmin):
         updated = queryset.update(processed=False)
         self.message_user(request, f"Marked {updated} submissions as unprocessed.")
     mark_as_unprocessed.short_description = "Mark as unprocessed"
+    
+    # Exports stream - "select all" over a million rows is fine
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+    export_csv.short_description = "Export as CSV"
+    
+    def export_csv_gzip(self, request, queryset):
+        return export_response(queryset, 'csv', compress=True)
+    export_csv_gzip.short_description = "Export as CSV (gzip)"
+    
+    def export_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+    export_jsonl.short_description = "Export as JSON Lines"
+
+
+@admin.register(SurveyArchive)
+class SurveyArchiveAdmin(admin.ModelAdmin):
+    """Monthly archives written by `manage.py archive_survey_submissions`"""
+    list_display = ['month_display', 'rows', 'size_display', 'compacted', 'created_at']
+    readonly_fields = ['month', 'name', 'rows', 'size', 'compacted', 'created_at']
+    change_list_template = 'admin/research/surveyarchive/change_list.html'
+    
+    def month_display(self, obj):
+        return obj.month.strftime('%Y-%m')
+    month_display.short_description = 'Month'
+    
+    def size_display(self, obj):
+        return f"{obj.size / 1024:.1f} KiB"
+    size_display.short_description = 'Size'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    # ===== SEARCH =====
+    def get_urls(self):
+        return [
+            path('search/', self.admin_site.admin_view(self.search_view), name='research_surveyarchive_search'),
+            *super().get_urls(),
+        ]
+    
+    def search_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        query = request.GET.get('q', '').strip()
+        months = {}
+        for key in ('from', 'to'):
+            try:
+                months[key] = datetime.strptime(request.GET.get(key, ''), '%Y-%m').date()
+            except ValueError:
+                months[key] = None
+        results = search_archives(query, months['from'], months['to']) if query else []
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Search archived submissions',
+            'query': query,
+            'first_month': request.GET.get('from', ''),
+            'last_month': request.GET.get('to', ''),
+            'results': results,
+        }
+        return TemplateResponse(request, 'admin/research/surveyarchive/search.html', context)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipients', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['subject']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+    list_per_page = 50
+    actions = ['retry_now']
+    
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+    recipients.short_description = 'To'
+    
+    # ===== ADMIN ACTIONS =====
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboxMessage.SENT).update(
+            status=OutboxMessage.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Queued {updated} messages to be sent again.")
+    retry_now.short_description = "Retry now"
+
+
+@admin.register(Subscriber)
+class SubscriberAdmin(admin.ModelAdmin):
+    list_display = ['email', 'is_active', 'subscribed_at']
+    list_filter = ['is_active', 'subscribed_at']
+    search_fields = ['email']
+    list_per_page = 50
+
+
+class BroadcastRunInline(admin.TabularInline):
+    model = BroadcastRun
+    fields = ['status', 'total', 'sent', 'failed', 'throughput_display', 'started_at', 'finished_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def throughput_display(self, obj):
+        return f"{obj.throughput:.1f}/s"
+    throughput_display.short_description = 'Throughput'
+
+
+@admin.register(NewsletterIssue)
+class NewsletterIssueAdmin(admin.ModelAdmin):
+    """Issues are sent with `manage.py send_newsletter <id>`"""
+    list_display = ['__str__', 'message_type', 'created_at']
+    inlines = [BroadcastRunInline]
@@ -0,0 +1,181 @@
+# research/archive.py - Retention and monthly archives for survey submissions
+#
+# Processed submissions from whole months older than RETENTION_DAYS move
+# out of the table into gzipped JSON Lines files. The job works in batches:
+# each batch is written to a new part file first, and only then are its
+# rows deleted, in the same transaction that records the part
+# (SurveyArchive). A crash loses nothing. At worst it leaves an orphaned
+# file whose rows are still in the table. Once a month is done its parts
+# are compacted into one file.
+#
+# Files live in the SURVEY_ARCHIVE_STORAGE storage (an alias in STORAGES,
+# e.g. S3) or else on the local disk in SURVEY_ARCHIVE_DIR - never under
+# MEDIA_ROOT, which is public. Archived rows can still be searched from the
+# admin. The rollups (research/rollups.py) keep counting them.
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from .models import SurveyArchive, SurveySubmission
+
+RETENTION_DAYS = getattr(settings, 'SURVEY_RETENTION_DAYS', 180)
+BATCH_SIZE = getattr(settings, 'SURVEY_ARCHIVE_BATCH_SIZE', 5000)
+SEARCH_LIMIT = 200
+
+# Whole rows, so an archive holds everything the table did
+FIELDS = [field.attname for field in SurveySubmission._meta.concrete_fields]
+
+
+def archive_storage():
+    alias = getattr(settings, 'SURVEY_ARCHIVE_STORAGE', None)
+    if alias:
+        return storages[alias]
+    return FileSystemStorage(
+        location=getattr(settings, 'SURVEY_ARCHIVE_DIR', settings.BASE_DIR / 'var' / 'survey_archive'),
+    )
+
+
+def month_bounds(value):
+    """(first instant, first instant of the next month) of the local month of `value`"""
+    start = timezone.localtime(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def cutoff(retention_days=RETENTION_DAYS):
+    """Start of the month holding the oldest day kept - everything before it is archived"""
+    oldest_kept = timezone.localdate() - timedelta(days=retention_days)
+    return timezone.make_aware(datetime.combine(oldest_kept.replace(day=1), time.min))
+
+
+def archivable(retention_days=RETENTION_DAYS):
+    return SurveySubmission.objects.filter(processed=True, submitted_at__lt=cutoff(retention_days))
+
+
+# ===== WRITING =====
+def _save(month, lines):
+    """Gzip `lines` into a new file of `month`. Returns (name, compressed size)."""
+    storage = archive_storage()
+    with tempfile.TemporaryFile() as temp:
+        with gzip.GzipFile(fileobj=temp, mode='wb') as compressed:
+            for line in lines:
+                compressed.write(line)
+        size = temp.tell()
+        temp.seek(0)
+        name = storage.save(f'{month:%Y-%m}/{uuid.uuid4().hex}.jsonl.gz', File(temp))
+    if isinstance(storage, FileSystemStorage):
+        # The rows are deleted next - make sure the file really is on disk
+        with open(storage.path(name), 'rb') as saved:
+            os.fsync(saved.fileno())
+    return name, size
+
+
+def _archive_batch(queryset, batch_size):
+    """
+    Move up to batch_size rows of the oldest month in `queryset` to a new
+    part file. Returns (month, rows moved); (None, 0) when there's nothing left.
+    """
+    first = queryset.order_by('submitted_at').values_list('submitted_at', flat=True).first()
+    if first is None:
+        return None, 0
+    start, end = month_bounds(first)
+    rows = list(
+        queryset.filter(submitted_at__gte=start, submitted_at__lt=end).order_by('pk').values(*FIELDS)[:batch_size]
+    )
+    name, size = _save(start.date(), (
+        (json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode() for row in rows
+    ))
+    with transaction.atomic():
+        SurveyArchive.objects.create(month=start.date(), name=name, rows=len(rows), size=size)
+        SurveySubmission.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+    return start.date(), len(rows)
+
+
+def compact(month):
+    """Merge the files of `month` into one. Returns the month's SurveyArchive, or None."""
+    parts = list(SurveyArchive.objects.filter(month=month).order_by('pk'))
+    if not parts:
+        return None
+    if len(parts) == 1 and parts[0].compacted:
+        return parts[0]
+
+    storage = archive_storage()
+
+    def lines():
+        for part in parts:
+            with storage.open(part.name, 'rb') as raw, gzip.GzipFile(fileobj=raw) as compressed:
+                yield from compressed
+
+    name, size = _save(month, lines())
+    with transaction.atomic():
+        archive = SurveyArchive.objects.create(
+            month=month, name=name, rows=sum(part.rows for part in parts), size=size, compacted=True,
+        )
+        SurveyArchive.objects.filter(pk__in=[part.pk for part in parts]).delete()
+        transaction.on_commit(lambda: [storage.delete(part.name) for part in parts])
+    return archive
+
+
+def archive(retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE):
+    """
+    Archive every processed submission from before cutoff(), batch by
+    batch, then compact the months touched. Returns the number of rows moved.
+    """
+    queryset = archivable(retention_days)
+    months = set()
+    moved = 0
+    while True:
+        month, rows = _archive_batch(queryset, batch_size)
+        if not rows:
+            break
+        months.add(month)
+        moved += rows
+    for month in sorted(months):
+        compact(month)
+    return moved
+
+
+# ===== READING =====
+def read(archive):
+    """The rows of one archive file, as dicts"""
+    with archive_storage().open(archive.name, 'rb') as raw, gzip.GzipFile(fileobj=raw) as compressed:
+        for line in compressed:
+            yield json.loads(line)
+
+
+def search(query, first_month=None, last_month=None, limit=SEARCH_LIMIT):
+    """
+    (archive, row) for archived submissions whose email or name contains
+    `query`, newest month first. Scans the files, so narrow it by month.
+    """
+    needle = query.strip().lower()
+    if not needle:
+        return []
+    archives = SurveyArchive.objects.order_by('-month', '-pk')
+    if first_month:
+        archives = archives.filter(month__gte=first_month)
+    if last_month:
+        archives = archives.filter(month__lte=last_month)
+
+    found = []
+    storage = archive_storage()
+    for archive in archives:
+        with storage.open(archive.name, 'rb') as raw, gzip.GzipFile(fileobj=raw) as compressed:
+            for line in compressed:
+                # Cheap test on the raw line before parsing it
+                if needle not in line.decode().lower():
+                    continue
+                row = json.loads(line)
+                if needle in (row['email'] or '').lower() or needle in (row['name'] or '').lower():
+                    found.append((archive, row))
+                    if len(found) >= limit:
+                        return found
+    return found
@@ -0,0 +1,125 @@
+# research/emails.py - Emails sent for survey submissions and newsletter signups
+#
+# These only queue the messages - `manage.py send_outbox` delivers them.
+from django.conf import settings
+from django.utils import timezone
+from .newsletter import MESSAGE_TYPES, unsubscribe_headers, with_unsubscribe
+from .outbox import enqueue
+
+
+def _recommendations_text(recommendations):
+    """Numbered list of recommended platforms for an email body"""
+    return "\n\n".join(
+        f"{rank}. {platform['name']}\n   {platform['blurb']}\n   {platform['url']}"
+        for rank, platform in enumerate(recommendations, start=1)
+    )
+
+
+def send_confirmation_email(email, name, survey_type, answers, submission_id=None, recommendations=None,
+                            number=None):
+    """
+    Queue confirmation emails for SURVEY submissions
+    - To user: Their recommendations (or a simple confirmation without them)
+    - To admin: Detailed notification with database reference
+    """
+    
+    # Map survey_type to display text
+    survey_type_display = {
+        'completed': 'Completed Survey - Personalized Recommendations',
+        'skipped': 'Skipped Survey - Basic Recommendations'
+    }.get(survey_type, survey_type)
+    
+    # 1. EMAIL TO USER
+    if recommendations:
+        send_recommendations_email(email, name, recommendations)
+    else:
+        user_subject = "Your Dating Site Recommendations Are Being Prepared"
+        
+        user_message = f"""Hi {name if name else 'there'},
+
+Thank you for using our AI Dating Site Matchmaker!
+
+We've received your request for dating site recommendations.
+
+{survey_type_display}
+
+Our team is currently analyzing your preferences and will send personalized recommendations within 72 hours.
+
+In the meantime, you can browse our research:
+https://dating-hub.com.au/research/
+
+Best regards,
+Dating Hub Research Team
+"""
+        
+        enqueue(user_subject, user_message, [email], kind='survey_confirmation')
+    
+    # 2. SEPARATE EMAIL TO ADMIN
+    # The submission's own number - no COUNT(*) over the table
+    survey_number = number or submission_id or '?'
+    
+    admin_subject = f"📋 Survey #{survey_number}: {name if name else 'Anonymous'}"
+    
+    # Format answers for admin
+    if answers:
+        answers_text = "\n".join([f"  • {key}: {value}" for key, value in answers.items()])
+    else:
+        answers_text = "  • User skipped detailed survey"
+    
+    # Database reference link
+    db_link = ""
+    if submission_id:
+        db_link = f"\nDATABASE LINK: https://dating-hub.com.au/admin/research/surveysubmission/{submission_id}/change/"
+    
+    admin_message = f"""NEW SURVEY SUBMISSION #{survey_number}
+
+USER INFORMATION:
+• Name: {name if name else 'Not provided'}
+• Email: {email}
+• Survey Type: {survey_type_display}
+• Submission ID: {submission_id or 'N/A'}
+
+SURVEY ANSWERS:
+{answers_text}
+
+RECOMMENDED:
+{_recommendations_text(recommendations) if recommendations else '  • Not scored yet'}
+
+TIMESTAMP: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}
+{db_link}
+
+---
+This submission has been automatically saved to the database.
+Admin panel: https://dating-hub.com.au/admin/
+"""
+    
+    enqueue(admin_subject, admin_message, [settings.DEFAULT_FROM_EMAIL], kind='survey_admin_notification')
+
+
+def send_recommendations_email(email, name, recommendations):
+    """Queue the email with a user's ranked dating site recommendations"""
+    subject = "Your Dating Site Recommendations"
+    message = f"""Hi {name if name else 'there'},
+
+Thank you for using our AI Dating Site Matchmaker!
+
+Based on your answers, these are the dating sites we recommend for you:
+
+{_recommendations_text(recommendations)}
+
+Want to know why? Browse the research behind our recommendations:
+https://dating-hub.com.au/research/
+
+Best regards,
+Dating Hub Research Team
+"""
+    enqueue(subject, message, [email], kind='survey_recommendations')
+
+
+def send_newsletter_welcome_email(email):
+    """Queue welcome email for NEWSLETTER signups (from homepage)"""
+    subject, message = MESSAGE_TYPES['welcome']
+    enqueue(
+        subject, with_unsubscribe(message, email), [email], kind='newsletter_welcome',
+        headers=unsubscribe_headers(email),
+    )
@@ -0,0 +1,79 @@
+# research/fast_path.py - In-process cache of the static research pages
+#
+# The research, legal, about and contact pages are plain templates: no
+# forms, no messages, nothing per user. FastPathMiddleware sits right after
+# SecurityMiddleware. The first GET of one of these pages goes through the
+# full stack as usual, and the rendered bytes are kept in a dict in this
+# process. Later GETs are answered from the dict, so they never reach the
+# session, auth, messages or CSRF middleware, the URL resolver or the
+# template engine.
+#
+# Templates only change with a deploy, which starts new processes, so
+# entries never expire. The pages use request.build_absolute_uri, so the
+# key includes the scheme and host. A request with a query string takes the
+# normal path. `manage.py benchmark_fast_path` compares the two paths.
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import reverse
+
+PAGES = (
+    'research:research_index', 'research:micromance', 'research:ai_matchmaking',
+    'research:methodology', 'research:research_ethics', 'research:digital_boundaries',
+    'research:data_library', 'research:privacy', 'research:terms',
+    'research:about', 'research:contact',
+)
+# Bounds the dict when ALLOWED_HOSTS lets many host names through
+MAX_ENTRIES = 256
+
+# (scheme, host, path) -> (content, headers)
+_pages = {}
+
+
+def enabled():
+    # Off in development, where templates are edited under a running server
+    return getattr(settings, 'RESEARCH_FAST_PATH', not settings.DEBUG)
+
+
+def clear():
+    _pages.clear()
+
+
+class FastPathMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._paths = None
+
+    @property
+    def paths(self):
+        # Reversed on first use - the URLconf can't be imported while
+        # middleware is being loaded
+        if self._paths is None:
+            self._paths = frozenset(reverse(name) for name in PAGES)
+        return self._paths
+
+    def __call__(self, request):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.META.get('QUERY_STRING')
+            or request.path not in self.paths
+            or not enabled()
+        ):
+            return self.get_response(request)
+
+        key = (request.scheme, request.get_host(), request.path)
+        cached = _pages.get(key)
+        if cached is not None:
+            content, headers = cached
+            return HttpResponse(content, headers=headers)
+
+        response = self.get_response(request)
+        if (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not response.has_header('Vary')
+        ):
+            if len(_pages) >= MAX_ENTRIES:
+                _pages.clear()
+            _pages[key] = (response.content, dict(response.items()))
+        return response
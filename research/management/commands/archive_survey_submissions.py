@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from research.archive import BATCH_SIZE, RETENTION_DAYS, archive, cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move processed survey submissions older than the retention period into monthly archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION_DAYS, help='Retention period in days')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moved = archive(options['days'], options['batch_size'])
+        self.stdout.write(f"Archived {moved} submissions from before {cutoff(options['days']):%Y-%m-%d}.")
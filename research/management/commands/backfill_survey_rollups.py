@@ -0,0 +1,16 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from research.rollups import CHUNK_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = 'Recount the survey answer rollups from the submissions table and the archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Only recount from this day (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        counted = backfill(options['since'], options['chunk_size'])
+        self.stdout.write(f'Counted {counted} submissions.')
@@ -0,0 +1,62 @@
+import hashlib
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+from datinghub_project import compression
+from research import fast_path
+
+
+class Command(BaseCommand):
+    help = 'Measure HTML minifying and the CPU time and size of each gzip level and brotli quality'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Times each page is compressed per level')
+
+    def handle(self, *args, **options):
+        pages = self.pages()
+        raw = sum(len(page) for page in pages)
+        started = time.perf_counter()
+        minified = [compression.minify_html(page) for page in pages]
+        minify_ms = (time.perf_counter() - started) * 1000 / len(pages)
+        total = sum(len(page) for page in minified)
+        self.stdout.write(f'{len(pages)} pages, {raw / 1024:.1f} KB of HTML; minified {total / 1024:.1f} KB '
+                          f'({100 * total / raw:.0f}%) at {minify_ms:.2f} ms/page')
+
+        levels = [('gzip', level) for level in range(1, 10)]
+        if compression.brotli is not None:
+            levels += [('br', quality) for quality in range(12)]
+        else:
+            self.stdout.write('brotli is not installed - gzip only.')
+        current = {('gzip', compression.gzip_level()), ('br', compression.brotli_quality())}
+
+        self.stdout.write(f"\n{'encoding':<10} {'KB sent':>8} {'of raw':>7} {'ms/page':>8} {'MB/s':>7}")
+        for encoding, level in levels:
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                sent = sum(len(compression.compress(page, encoding, level)) for page in minified)
+            elapsed = (time.perf_counter() - started) / options['repeat']
+            marker = '  <- current setting' if (encoding, level) in current else ''
+            self.stdout.write(
+                f'{f"{encoding} {level}":<10} {sent / 1024:>8.1f} {100 * sent / raw:>6.1f}% '
+                f'{elapsed * 1000 / len(pages):>8.2f} {total / elapsed / 1e6:>7.1f}{marker}'
+            )
+
+        # What a repeat response costs: hashing the body, then the lookup
+        started = time.perf_counter()
+        for _ in range(options['repeat']):
+            for page in pages:
+                compression.output_cache.get((hashlib.sha256(page).digest(), 'gzip'), lambda: b'')
+        elapsed = (time.perf_counter() - started) / options['repeat']
+        self.stdout.write(f'{"cached":<10} {"":>8} {"":>7} {elapsed * 1000 / len(pages):>8.3f}')
+
+    def pages(self):
+        """The research pages, home page and blog index as the views render them"""
+        paths = [reverse(name) for name in (*fast_path.PAGES, 'research:home', 'blog:blog_index')]
+        client = Client(HTTP_HOST='testserver')
+        with override_settings(ALLOWED_HOSTS=['testserver'], HTML_MINIFY=False, RESEARCH_FAST_PATH=False):
+            responses = [client.get(path, secure=True) for path in paths]
+        for path, response in zip(paths, responses):
+            assert response.status_code == 200, (path, response.status_code)
+        return [response.content for response in responses]
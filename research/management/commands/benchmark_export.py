@@ -0,0 +1,81 @@
+import csv
+import io
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from research import export
+from research.models import SurveySubmission
+from research.recommend import recommend
+
+ANSWERS = {'gender': 'woman', 'q1': 'serious', 'q2': '26-35', 'q3': 'algorithm',
+           'q4': 'medium', 'q5': 'mixed', 'q6': 'some'}
+
+
+def add_submissions(total):
+    """Grow the submissions table to `total` rows, copying rows in SQL past the first 1,000"""
+    count = SurveySubmission.objects.count()
+    SurveySubmission.objects.bulk_create([
+        SurveySubmission(name=f'User {i}', email=f'user{i}@example.com', answers=ANSWERS,
+                         recommendations=recommend(ANSWERS))
+        for i in range(count, min(total, 1000))
+    ])
+    fields = [f.column for f in SurveySubmission._meta.concrete_fields if f.column not in ('id', 'ingest_id', 'number')]
+    columns = ', '.join(connection.ops.quote_name(c) for c in fields)
+    count = SurveySubmission.objects.count()
+    with connection.cursor() as cursor:
+        while count < total:
+            cursor.execute(
+                f'INSERT INTO {SurveySubmission._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM {SurveySubmission._meta.db_table} ORDER BY id LIMIT %s',
+                [min(count, total - count)],
+            )
+            count = SurveySubmission.objects.count()
+
+
+class Command(BaseCommand):
+    help = 'Measure peak memory of the streaming export against materialising the queryset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--naive-max', type=int, default=100000,
+                            help='Largest table to also export the naive way')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>9} {'stream s':>9} {'stream MiB':>11} {'naive s':>9} {'naive MiB':>10}")
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            for total in sorted(options['rows']):
+                add_submissions(total)
+                stream = self.measure(self.stream, options['chunk_size'])
+                naive = self.measure(self.naive) if total <= options['naive_max'] else None
+                line = f'{total:>9} {stream[0]:>9.2f} {stream[1]:>11.2f}'
+                if naive:
+                    line += f' {naive[0]:>9.2f} {naive[1]:>10.2f}'
+                self.stdout.write(line)
+            transaction.set_rollback(True)
+
+    def measure(self, run, *args):
+        """(seconds, peak MiB) of one export"""
+        tracemalloc.start()
+        started = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak / 1024 / 1024
+
+    def stream(self, chunk_size):
+        for _ in export.export(SurveySubmission.objects.all(), 'csv', chunk_size=chunk_size):
+            pass
+
+    def naive(self):
+        """What an export action that builds one response body would do"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for submission in list(SurveySubmission.objects.all()):
+            writer.writerow([submission.pk, submission.submitted_at, submission.name, submission.email,
+                             submission.survey_type, submission.processed, *(submission.answers or {}).values()])
+        return buffer.getvalue().encode()
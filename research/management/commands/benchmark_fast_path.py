@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+from research import fast_path
+
+
+class Command(BaseCommand):
+    help = 'Measure requests per second for the static research pages with and without the fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per page and mode')
+
+    def handle(self, *args, **options):
+        paths = [reverse(name) for name in fast_path.PAGES]
+        # A returning visitor: the session cookie is sent with every request
+        client = Client(HTTP_HOST='testserver')
+        client.cookies['sessionid'] = 'x' * 32
+        self.stdout.write(f"{'page':<32} {'stack req/s':>12} {'fast req/s':>11} {'speedup':>8}")
+        totals = [0.0, 0.0]
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for path in paths:
+                stack = self.measure(client, path, options['requests'], enabled=False)
+                fast = self.measure(client, path, options['requests'], enabled=True)
+                totals[0] += stack
+                totals[1] += fast
+                self.stdout.write(f'{path:<32} {options["requests"] / stack:>12.0f} '
+                                  f'{options["requests"] / fast:>11.0f} {stack / fast:>7.1f}x')
+        requests = options['requests'] * len(paths)
+        self.stdout.write(f"{'all pages':<32} {requests / totals[0]:>12.0f} "
+                          f'{requests / totals[1]:>11.0f} {totals[0] / totals[1]:>7.1f}x')
+
+    def measure(self, client, path, requests, enabled):
+        """Seconds for `requests` GETs of `path`"""
+        fast_path.clear()
+        with override_settings(RESEARCH_FAST_PATH=enabled):
+            client.get(path, secure=True)  # warm up: templates loaded, page cached
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = client.get(path, secure=True)
+            elapsed = time.perf_counter() - started
+        assert response.status_code == 200, (path, response.status_code)
+        return elapsed
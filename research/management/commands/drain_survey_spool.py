@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from research.spool import BATCH_SIZE, drain, pending
+
+
+class Command(BaseCommand):
+    help = 'Insert spooled survey submissions into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new submissions')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            inserted = drain(options['batch_size'])
+            if inserted:
+                self.stdout.write(f'Saved {inserted} submissions.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        if not options['loop']:
+            self.stdout.write(f'{pending()} bytes still spooled.')
@@ -0,0 +1,30 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from research import export
+from research.models import SurveySubmission
+
+
+class Command(BaseCommand):
+    help = 'Stream survey submissions to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output')
+        parser.add_argument('--output', help='File to write (default: survey-submissions-<date>.<format>)')
+        parser.add_argument('--since', type=date.fromisoformat, help='Only submissions from this day (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = SurveySubmission.objects.all()
+        if options['since']:
+            queryset = queryset.filter(submitted_at__gte=timezone.make_aware(datetime.combine(options['since'], time.min)))
+        output = options['output'] or export.filename(options['format'], options['gzip'])
+
+        written = 0
+        with open(output, 'wb') as out:
+            for chunk in export.export(queryset, options['format'], options['gzip'], options['chunk_size']):
+                out.write(chunk)
+                written += len(chunk)
+        self.stdout.write(f'Wrote {written} bytes to {output}.')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from research.recommend import BATCH_SIZE, recommend_pending
+
+
+class Command(BaseCommand):
+    help = 'Score every unprocessed survey submission and email its recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        done = recommend_pending(options['batch_size'])
+        self.stdout.write(f'Sent recommendations for {done} submissions.')
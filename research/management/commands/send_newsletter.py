@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from research.models import BroadcastRun, NewsletterIssue
+from research.newsletter import CHUNK_SIZE, CONNECTIONS, RATE_LIMIT, run_broadcast, start_run
+
+
+class Command(BaseCommand):
+    help = 'Broadcast a newsletter issue to every active subscriber, resuming an unfinished run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('issue_id', type=int)
+        parser.add_argument('--connections', type=int, default=CONNECTIONS, help='Parallel SMTP connections')
+        parser.add_argument('--rate', type=float, default=RATE_LIMIT, help='Messages per second (0 = unthrottled)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--restart', action='store_true', help='Start a new run instead of resuming')
+
+    def handle(self, *args, **options):
+        try:
+            issue = NewsletterIssue.objects.get(pk=options['issue_id'])
+        except NewsletterIssue.DoesNotExist:
+            raise CommandError(f"Newsletter issue {options['issue_id']} does not exist")
+
+        run = None if options['restart'] else issue.runs.filter(status=BroadcastRun.RUNNING).first()
+        if run is None:
+            run = start_run(issue, options['connections'], options['rate'], options['chunk_size'])
+            self.stdout.write(f'Started run #{run.pk} to {run.total} subscribers.')
+        else:
+            self.stdout.write(f'Resuming run #{run.pk} after subscriber {run.checkpoint}.')
+
+        run = run_broadcast(run)
+        self.stdout.write(self.style.SUCCESS(
+            f'Run #{run.pk}: {run.sent} sent, {run.failed} failed, '
+            f'{run.throughput:.1f} messages/s over {run.elapsed_seconds:.1f}s.'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from research.outbox import BATCH_SIZE, send_due
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over one SMTP connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new messages')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_due(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed.')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        if not options['loop'] and not (sent or failed):
+            self.stdout.write('Nothing to send.')
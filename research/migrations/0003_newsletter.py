@@ -0,0 +1,80 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0002_outbox_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=10)),
+                ('checkpoint', models.BigIntegerField(default=0)),
+                ('connections', models.PositiveSmallIntegerField()),
+                ('rate_limit', models.FloatField(help_text='Messages per second, 0 for unthrottled')),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('total', models.PositiveIntegerField(default=0, help_text='Recipients when the run started')),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('elapsed_seconds', models.FloatField(default=0, help_text='Sending time, summed over resumes')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Broadcast Run',
+                'verbose_name_plural': 'Broadcast Runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsletterIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_type', models.CharField(choices=[('welcome', 'Welcome / 2026 Dating Predictions'), ('custom', 'Custom')], default='custom', max_length=20)),
+                ('subject', models.CharField(blank=True, help_text="Overrides the message type's subject", max_length=255)),
+                ('body', models.TextField(blank=True, help_text="Overrides the message type's text")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Newsletter Issue',
+                'verbose_name_plural': 'Newsletter Issues',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('error', models.TextField()),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failures', to='research.broadcastrun')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='broadcastrun',
+            name='issue',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='research.newsletterissue'),
+        ),
+        migrations.CreateModel(
+            name='Subscriber',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='Email Address')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Subscribed')),
+                ('subscribed_at', models.DateTimeField(auto_now_add=True, verbose_name='Subscribed At')),
+            ],
+            options={
+                'verbose_name': 'Subscriber',
+                'verbose_name_plural': 'Subscribers',
+                'ordering': ['-subscribed_at'],
+                'indexes': [models.Index(fields=['is_active', 'id'], name='research_su_is_acti_90ba6e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0003_newsletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveysubmission',
+            name='ingest_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='Ingest ID'),
+        ),
+        migrations.AlterField(
+            model_name='surveysubmission',
+            name='submitted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Submission Time'),
+        ),
+    ]
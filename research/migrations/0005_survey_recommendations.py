@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0004_survey_ingest_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveysubmission',
+            name='recommendations',
+            field=models.JSONField(blank=True, help_text='Platforms scored against the answers, best first', null=True, verbose_name='Recommendations'),
+        ),
+        migrations.AddField(
+            model_name='surveysubmission',
+            name='recommended_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Recommended At'),
+        ),
+    ]
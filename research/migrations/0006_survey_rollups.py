@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0005_survey_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyAnswerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('question', models.CharField(max_length=20)),
+                ('answer', models.CharField(max_length=50)),
+                ('gender', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Survey Answer Rollup',
+                'verbose_name_plural': 'Survey Answer Rollups',
+                'ordering': ['-day', 'question', 'answer'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='surveyanswerrollup',
+            constraint=models.UniqueConstraint(fields=('question', 'day', 'answer', 'gender'), name='unique_survey_rollup'),
+        ),
+    ]
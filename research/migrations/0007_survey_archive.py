@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0006_survey_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month the submissions are from')),
+                ('name', models.CharField(help_text='File name in the archive storage', max_length=255, unique=True)),
+                ('rows', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField(help_text='Compressed size in bytes')),
+                ('compacted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Survey Archive',
+                'verbose_name_plural': 'Survey Archives',
+                'ordering': ['-month', '-created_at'],
+                'indexes': [models.Index(fields=['month'], name='research_su_month_320133_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:10
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+BATCH_SIZE = 1000
+
+
+def number_submissions(apps, schema_editor):
+    """Number the existing submissions in id order, after the ones already archived"""
+    Sequence = apps.get_model('research', 'Sequence')
+    SurveyArchive = apps.get_model('research', 'SurveyArchive')
+    SurveySubmission = apps.get_model('research', 'SurveySubmission')
+    number = SurveyArchive.objects.aggregate(total=Sum('rows'))['total'] or 0
+    last_pk = 0
+    while batch := list(SurveySubmission.objects.filter(pk__gt=last_pk).order_by('pk').only('pk')[:BATCH_SIZE]):
+        for submission in batch:
+            number += 1
+            submission.number = number
+        SurveySubmission.objects.bulk_update(batch, ['number'])
+        last_pk = batch[-1].pk
+    Sequence.objects.update_or_create(name='survey_submission', defaults={'last_value': number})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0007_survey_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='surveysubmission',
+            name='number',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, unique=True, verbose_name='Number'),
+        ),
+        migrations.RunPython(number_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('research', '0008_survey_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='headers',
+            field=models.JSONField(blank=True, default=dict, help_text='Extra message headers, e.g. List-Unsubscribe'),
+        ),
+    ]
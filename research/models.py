@@ -1,7 +1,36 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+class Sequence(models.Model):
+    """
+    A named counter for human-facing numbers. allocate() takes a row lock,
+    so concurrent workers never get the same number, and numbers taken in a
+    transaction that rolls back are handed out again. Numbers are unique
+    and increasing but may have gaps: a caller can reserve a block and use
+    only part of it, as the spool drainer does when a row it inserts with
+    ignore_conflicts turns out to be in the table already.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+    
+    @classmethod
+    def allocate(cls, name, count=1):
+        """Reserve `count` consecutive numbers. Returns the first; unused ones are skipped for good."""
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(name=name)
+            first = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=['last_value'])
+        return first
+
 
 class SurveySubmission(models.Model):
     """Stores all survey submissions for admin viewing"""
+    NUMBER_SEQUENCE = 'survey_submission'
+    
     # User Information
     name = models.CharField(
         max_length=100, 
@@ -32,9 +61,40 @@ class SurveySubmission(models.Model):
         help_text="JSON format of all survey questions and answers"
     )
     
-    # Timestamps
+    # "Survey #N" - from the survey_submission sequence, in ingest order
+    number = models.PositiveBigIntegerField(
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Number"
+    )
+    
+    # Ranked platforms from research/recommend.py, best first
+    recommendations = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Recommendations",
+        help_text="Platforms scored against the answers, best first"
+    )
+    recommended_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Recommended At"
+    )
+    
+    # Set by the survey form; replays of a spooled submission share it
+    ingest_id = models.UUIDField(
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Ingest ID"
+    )
+    
+    # Timestamps (submitted_at comes from the spool record, not the insert)
     submitted_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name="Submission Time"
     )
     updated_at = models.DateTimeField(
@@ -66,6 +126,13 @@ class SurveySubmission(models.Model):
             return len(self.answers)
         return 0
     
+    def save(self, *args, **kwargs):
+        # Rows created one at a time (admin, shell) are numbered here; the
+        # spool drainer numbers its batches when it bulk-inserts them
+        if self.number is None and self._state.adding:
+            self.number = Sequence.allocate(self.NUMBER_SEQUENCE)
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-submitted_at']
         verbose_name = "Survey Submission"
@@ -75,3 +142,186 @@ class SurveySubmission(models.Model):
             models.Index(fields=['submitted_at']),
             models.Index(fields=['processed']),
         ]
+
+
+class SurveyAnswerRollup(models.Model):
+    """
+    How many submissions on `day` gave `answer` to `question`, by gender.
+    Kept up to date by research/rollups.py as submissions are ingested.
+    """
+    day = models.DateField()
+    question = models.CharField(max_length=20)
+    answer = models.CharField(max_length=50)
+    gender = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.day} {self.question}={self.answer} ({self.gender}): {self.count}"
+    
+    class Meta:
+        ordering = ['-day', 'question', 'answer']
+        verbose_name = "Survey Answer Rollup"
+        verbose_name_plural = "Survey Answer Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'day', 'answer', 'gender'], name='unique_survey_rollup'),
+        ]
+
+
+class SurveyArchive(models.Model):
+    """
+    A gzipped JSON Lines file of archived submissions from one month, written
+    by research/archive.py. A month is archived in parts, then compacted
+    into a single file.
+    """
+    month = models.DateField(help_text="First day of the month the submissions are from")
+    name = models.CharField(max_length=255, unique=True, help_text="File name in the archive storage")
+    rows = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField(help_text="Compressed size in bytes")
+    compacted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.rows} submissions)"
+    
+    class Meta:
+        ordering = ['-month', '-created_at']
+        verbose_name = "Survey Archive"
+        verbose_name_plural = "Survey Archives"
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """An outgoing email, queued by the request path and sent by `manage.py send_outbox`"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    
+    kind = models.CharField(max_length=50, blank=True, verbose_name="Kind")
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(help_text="List of recipient addresses")
+    headers = models.JSONField(default=dict, blank=True, help_text="Extra message headers, e.g. List-Unsubscribe")
+    
+    # Delivery state
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (PENDING, 'Pending'),
+            (SENT, 'Sent'),
+            (FAILED, 'Failed'),
+        ],
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Outbox Message"
+        verbose_name_plural = "Outbox Messages"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class Subscriber(models.Model):
+    """Newsletter subscriber from the homepage signup form"""
+    email = models.EmailField(unique=True, verbose_name="Email Address")
+    is_active = models.BooleanField(default=True, verbose_name="Subscribed")
+    subscribed_at = models.DateTimeField(auto_now_add=True, verbose_name="Subscribed At")
+    
+    def __str__(self):
+        return self.email
+    
+    class Meta:
+        ordering = ['-subscribed_at']
+        verbose_name = "Subscriber"
+        verbose_name_plural = "Subscribers"
+        indexes = [
+            models.Index(fields=['is_active', 'id']),
+        ]
+
+
+class NewsletterIssue(models.Model):
+    """One newsletter to broadcast to every active subscriber"""
+    # Keys of research.newsletter.MESSAGE_TYPES
+    message_type = models.CharField(
+        max_length=20,
+        choices=[
+            ('welcome', 'Welcome / 2026 Dating Predictions'),
+            ('custom', 'Custom'),
+        ],
+        default='custom',
+    )
+    subject = models.CharField(max_length=255, blank=True, help_text="Overrides the message type's subject")
+    body = models.TextField(blank=True, help_text="Overrides the message type's text")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"#{self.pk} {self.subject or self.get_message_type_display()}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Newsletter Issue"
+        verbose_name_plural = "Newsletter Issues"
+
+
+class BroadcastRun(models.Model):
+    """One send of an issue, with its resume checkpoint and metrics"""
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    
+    issue = models.ForeignKey(NewsletterIssue, on_delete=models.CASCADE, related_name='runs')
+    status = models.CharField(
+        max_length=10,
+        choices=[(RUNNING, 'Running'), (COMPLETED, 'Completed')],
+        default=RUNNING,
+    )
+    # Every active subscriber with id <= checkpoint has been handled
+    checkpoint = models.BigIntegerField(default=0)
+    
+    # Settings the run was started with
+    connections = models.PositiveSmallIntegerField()
+    rate_limit = models.FloatField(help_text="Messages per second, 0 for unthrottled")
+    chunk_size = models.PositiveIntegerField()
+    
+    # Metrics
+    total = models.PositiveIntegerField(default=0, help_text="Recipients when the run started")
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    elapsed_seconds = models.FloatField(default=0, help_text="Sending time, summed over resumes")
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"Run #{self.pk} of {self.issue}"
+    
+    @property
+    def throughput(self):
+        """Messages per second"""
+        return (self.sent + self.failed) / self.elapsed_seconds if self.elapsed_seconds else 0
+    
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = "Broadcast Run"
+        verbose_name_plural = "Broadcast Runs"
+
+
+class BroadcastFailure(models.Model):
+    """A recipient a broadcast run could not deliver to"""
+    run = models.ForeignKey(BroadcastRun, on_delete=models.CASCADE, related_name='failures')
+    email = models.EmailField()
+    error = models.TextField()
+    
+    def __str__(self):
+        return f"{self.email}: {self.error}"
@@ -0,0 +1,283 @@
+# research/newsletter.py - Newsletter broadcast engine
+#
+# An issue goes to every active subscriber in id order, CHUNK_SIZE at a time.
+# Chunks are sent by a bounded pool of threads, each holding its own SMTP
+# connection, and all threads share one rate limiter. Only the main thread
+# touches the database: it reads chunks and, as chunks finish, advances the
+# run's checkpoint past the lowest chunk still in flight. A crashed run is
+# resumed from that checkpoint, so at most the chunks that were in flight
+# can be delivered twice.
+#
+# Every message carries a signed unsubscribe link in its body and in a
+# List-Unsubscribe header with one-click support (RFC 8058); the link's
+# view sets the subscriber inactive.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from .models import BroadcastFailure, BroadcastRun, Subscriber
+
+CONNECTIONS = getattr(settings, 'NEWSLETTER_CONNECTIONS', 4)
+RATE_LIMIT = getattr(settings, 'NEWSLETTER_RATE_LIMIT', 14)  # messages per second, 0 = unthrottled
+CHUNK_SIZE = getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 500)
+
+# ===== MESSAGE TYPES =====
+MESSAGE_TYPES = {
+    'welcome': (
+        "Welcome to Dating Hub's 2026 Dating Predictions!",
+        """Welcome to Dating Hub's exclusive newsletter!
+
+Thank you for subscribing to "Don't Just Date. Strategize."
+
+You'll now receive:
+• 2026 dating trend predictions
+• Behavioral research insights
+• Platform algorithm updates
+• Success stories and case studies
+
+Our first newsletter will arrive in your inbox soon.
+
+In the meantime, explore our latest research:
+https://dating-hub.com.au/research/
+
+You can also try our AI Dating Site Matchmaker to get personalized platform recommendations:
+https://dating-hub.com.au/tools/dating-recommendations/
+
+Best regards,
+Dating Hub Research Team
+""",
+    ),
+}
+
+
+def issue_content(issue):
+    """(subject, body) of an issue - its own text over its message type's"""
+    subject, body = MESSAGE_TYPES.get(issue.message_type, ('', ''))
+    return issue.subject or subject, issue.body or body
+
+
+# ===== SUBSCRIPTIONS =====
+UNSUBSCRIBE_SALT = 'research.newsletter.unsubscribe'
+UNSUBSCRIBE_FOOTER = """
+--
+You're receiving this because you subscribed to the Dating Hub newsletter.
+Unsubscribe: {url}
+"""
+
+
+def subscribe(email):
+    """Add or reactivate a subscriber. Returns (subscriber, created)."""
+    subscriber, created = Subscriber.objects.get_or_create(email=email.lower())
+    if not created and not subscriber.is_active:
+        subscriber.is_active = True
+        subscriber.save(update_fields=['is_active'])
+    return subscriber, created
+
+
+def unsubscribe_url(email):
+    token = signing.Signer(salt=UNSUBSCRIBE_SALT).sign_object(email.lower())
+    return getattr(settings, 'SITE_URL', 'https://dating-hub.com.au') + reverse('research:unsubscribe', args=[token])
+
+
+def unsubscribe_email(token):
+    """The address an unsubscribe token was signed for, or None"""
+    try:
+        return signing.Signer(salt=UNSUBSCRIBE_SALT).unsign_object(token)
+    except signing.BadSignature:
+        return None
+
+
+def unsubscribe(email):
+    Subscriber.objects.filter(email=email.lower()).update(is_active=False)
+
+
+def with_unsubscribe(body, email):
+    """The body of a message to `email`, with its unsubscribe link"""
+    return body + UNSUBSCRIBE_FOOTER.format(url=unsubscribe_url(email))
+
+
+def unsubscribe_headers(email):
+    """List-Unsubscribe headers for one-click unsubscribe (RFC 8058)"""
+    return {
+        'List-Unsubscribe': f'<{unsubscribe_url(email)}>',
+        'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+    }
+
+
+def newsletter_message(subject, body, email, connection=None):
+    return EmailMessage(
+        subject, with_unsubscribe(body, email), settings.DEFAULT_FROM_EMAIL, [email],
+        connection=connection, headers=unsubscribe_headers(email),
+    )
+
+
+# ===== SENDING =====
+class RateLimiter:
+    """Spaces calls to wait() at least 1/per_second apart, across threads"""
+
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ConnectionPool:
+    """One SMTP connection per sending thread, opened on first use"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def get(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = get_connection()
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def reset(self):
+        """Drop this thread's connection after an error; the next get() reconnects"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            connection.open()
+
+    def close_all(self):
+        for connection in self.connections:
+            connection.close()
+
+
+def _send_chunk(recipients, subject, body, pool, limiter):
+    """Send to one chunk of (id, email). Returns (sent, [(email, error)])."""
+    connection = pool.get()
+    connection.open()
+    sent, failures = 0, []
+    for _, email in recipients:
+        limiter.wait()
+        try:
+            newsletter_message(subject, body, email, connection).send()
+            sent += 1
+        except Exception as e:
+            failures.append((email, f'{type(e).__name__}: {e}'))
+            try:
+                pool.reset()
+            except Exception:
+                pass  # relay gone - the next send() tries to reconnect
+    return sent, failures
+
+
+def _chunks(after, chunk_size):
+    """Active subscribers with id > `after`, as lists of (id, email)"""
+    subscribers = Subscriber.objects.filter(is_active=True).order_by('id').values_list('id', 'email')
+    while chunk := list(subscribers.filter(id__gt=after)[:chunk_size]):
+        yield chunk
+        after = chunk[-1][0]
+
+
+def start_run(issue, connections=CONNECTIONS, rate_limit=RATE_LIMIT, chunk_size=CHUNK_SIZE):
+    return BroadcastRun.objects.create(
+        issue=issue,
+        connections=connections,
+        rate_limit=rate_limit,
+        chunk_size=chunk_size,
+        total=Subscriber.objects.filter(is_active=True).count(),
+    )
+
+
+def run_broadcast(run):
+    """
+    Send (or resume) a broadcast run. Returns the run, completed, with its
+    metrics saved. Exceptions leave it RUNNING at its last checkpoint.
+    """
+    subject, body = issue_content(run.issue)
+    pool = ConnectionPool()
+    limiter = RateLimiter(run.rate_limit)
+    # chunk futures in id order; the checkpoint moves past a prefix of done ones
+    in_flight = []
+    chunks = _chunks(run.checkpoint, run.chunk_size)
+    exhausted = False
+
+    def record(done, elapsed):
+        """Save the results of finished chunks up to the first that raised"""
+        sent = failed = 0
+        failures = []
+        error = None
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                break
+            chunk_sent, chunk_failures = future.result()
+            sent += chunk_sent
+            failed += len(chunk_failures)
+            failures.extend(BroadcastFailure(run=run, email=email, error=reason) for email, reason in chunk_failures)
+            run.checkpoint = future.last_id
+        BroadcastFailure.objects.bulk_create(failures)
+        BroadcastRun.objects.filter(pk=run.pk).update(
+            checkpoint=run.checkpoint,
+            sent=F('sent') + sent,
+            failed=F('failed') + failed,
+            elapsed_seconds=F('elapsed_seconds') + elapsed,
+        )
+        if error is not None:
+            raise error
+
+    try:
+        with ThreadPoolExecutor(max_workers=run.connections) as executor:
+            last_recorded = time.monotonic()
+            while in_flight or not exhausted:
+                # Keep every connection busy, with one chunk queued behind each
+                while not exhausted and len(in_flight) < run.connections * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    future = executor.submit(_send_chunk, chunk, subject, body, pool, limiter)
+                    future.last_id = chunk[-1][0]
+                    in_flight.append(future)
+                if not in_flight:
+                    break
+
+                # The checkpoint can only move once the oldest chunk is done
+                wait(in_flight[:1])
+                finished = 0
+                while finished < len(in_flight) and in_flight[finished].done():
+                    finished += 1
+                now = time.monotonic()
+                record(in_flight[:finished], now - last_recorded)
+                last_recorded = now
+                in_flight = in_flight[finished:]
+    except BaseException:
+        # Don't start queued chunks past the checkpoint - the resume sends them
+        for future in in_flight:
+            future.cancel()
+        raise
+    finally:
+        pool.close_all()
+
+    BroadcastRun.objects.filter(pk=run.pk).update(status=BroadcastRun.COMPLETED, finished_at=timezone.now())
+    run.refresh_from_db()
+    return run
+
+
+def broadcast(issue, **options):
+    """Send an issue, resuming its unfinished run if there is one"""
+    run = issue.runs.filter(status=BroadcastRun.RUNNING).first() or start_run(issue, **options)
+    return run_broadcast(run)
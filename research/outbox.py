@@ -0,0 +1,132 @@
+# research/outbox.py - Persistent outbox for outgoing email
+#
+# Views call enqueue(), which only inserts a row. `manage.py send_outbox`
+# claims due messages in batches and sends each batch over one SMTP
+# connection. A failed message is retried with exponential backoff until
+# OUTBOX_MAX_ATTEMPTS, then left as failed for the admin to look at.
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 6)
+RETRY_BASE_DELAY = getattr(settings, 'OUTBOX_RETRY_BASE_DELAY', 60)  # seconds, doubled per attempt
+RETRY_MAX_DELAY = getattr(settings, 'OUTBOX_RETRY_MAX_DELAY', 60 * 60 * 6)
+# Claimed messages are hidden from other workers for this long
+CLAIM_TIMEOUT = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', 60 * 10)
+
+
+def enqueue(subject, body, to, from_email=None, kind='', headers=None):
+    """Queue an email for the outbox worker. Returns the OutboxMessage."""
+    return OutboxMessage.objects.create(
+        kind=kind,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        headers=headers or {},
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the `attempts`-th failed attempt"""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def _claim(batch_size):
+    """Due messages, leased to this worker so concurrent workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = (
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxMessage.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')
+        )
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        OutboxMessage.objects.filter(pk__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=CLAIM_TIMEOUT)
+        )
+    return list(OutboxMessage.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def _mark_sent(message):
+    OutboxMessage.objects.filter(pk=message.pk).update(
+        status=OutboxMessage.SENT,
+        attempts=F('attempts') + 1,
+        sent_at=timezone.now(),
+        last_error='',
+    )
+
+
+def _mark_failed(message, error):
+    attempts = message.attempts + 1
+    gave_up = attempts >= MAX_ATTEMPTS
+    OutboxMessage.objects.filter(pk=message.pk).update(
+        status=OutboxMessage.FAILED if gave_up else OutboxMessage.PENDING,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=retry_delay(attempts)),
+        last_error=f'{type(error).__name__}: {error}',
+    )
+    logger.warning('Outbox message %s failed (attempt %s%s): %s',
+                   message.pk, attempts, ', giving up' if gave_up else '', error)
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """
+    Send one batch of due messages over a single SMTP connection.
+    Returns (sent, failed); (0, 0) means nothing was due.
+    """
+    messages = _claim(batch_size)
+    if not messages:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Relay unreachable - the whole batch waits for its next attempt
+        for message in messages:
+            _mark_failed(message, e)
+        return 0, len(messages)
+
+    sent = failed = 0
+    try:
+        for message in messages:
+            email = EmailMessage(message.subject, message.body, message.from_email,
+                                 message.to, connection=connection, headers=message.headers)
+            try:
+                email.send()
+            except Exception as e:
+                _mark_failed(message, e)
+                failed += 1
+                # The session may be unusable after an error - start a fresh one
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass  # send() reconnects on its own
+            else:
+                _mark_sent(message)
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def send_due(batch_size=BATCH_SIZE):
+    """Send batches until nothing is due. Returns (sent, failed)."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent += sent
+        total_failed += failed
@@ -0,0 +1,126 @@
+# research/ratelimit.py - Rate limiting and duplicate suppression for form posts
+#
+# The survey and newsletter forms check every POST here before any database
+# or email work. Each client IP and each email address has a token bucket
+# in the cache. A post takes one token, and tokens refill at a steady rate
+# up to the bucket's capacity. The same email posted again within
+# DEDUPE_WINDOW of an allowed post is answered as if it had gone through,
+# but nothing is done. A post turned away by a bucket isn't remembered, so
+# the retry after a 429 is a new post, and the view calls release() when
+# its work fails so the retry after an error is too.
+#
+# Buckets are read and written without a lock, so concurrent requests can
+# let a token or two extra through. Buckets and dedupe keys only hold across
+# workers when CACHES points at a shared cache (Redis, via REDIS_URL).
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# bucket scope -> (capacity, seconds to refill one token)
+RATE_LIMITS = getattr(settings, 'RESEARCH_RATE_LIMITS', {
+    'survey:ip': (10, 60),
+    'survey:email': (5, 60 * 60),
+    'newsletter:ip': (10, 60),
+    'newsletter:email': (3, 60 * 60),
+})
+DEDUPE_WINDOW = getattr(settings, 'RESEARCH_DEDUPE_WINDOW', 60 * 10)
+# Proxies in front of the app that append to X-Forwarded-For (1 on Render)
+PROXY_COUNT = getattr(settings, 'RATE_LIMIT_PROXY_COUNT', 0)
+
+FORMS = ('survey', 'newsletter')
+ALLOWED = 'allowed'
+LIMITED_IP = 'limited_ip'
+LIMITED_EMAIL = 'limited_email'
+DUPLICATE = 'duplicate'
+OUTCOMES = (ALLOWED, LIMITED_IP, LIMITED_EMAIL, DUPLICATE)
+
+BUCKET_KEY = 'research:bucket:{}:{}'
+DEDUPE_KEY = 'research:dedupe:{}:{}'
+METRIC_KEY = 'research:ratelimit:{}:{}'
+
+
+def _digest(value):
+    """Cache keys carry a hash, not the IP or email itself"""
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def client_ip(request):
+    if PROXY_COUNT:
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(hops) >= PROXY_COUNT:
+            # Anything left of what our own proxies saw can be forged by the client
+            return hops[-PROXY_COUNT]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take(scope, identity):
+    """Take a token from `identity`'s bucket in `scope`. False when it's empty."""
+    capacity, refill = RATE_LIMITS[scope]
+    key = BUCKET_KEY.format(scope, _digest(identity))
+    now = time.time()
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) / refill)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    # Once it would have refilled completely the bucket needn't be kept
+    cache.set(key, (tokens, now), int(capacity * refill) + 1)
+    return allowed
+
+
+def _dedupe_key(form, email):
+    return DEDUPE_KEY.format(form, _digest(email.lower()))
+
+
+def is_duplicate(form, email):
+    """True if `email` was posted to `form` within DEDUPE_WINDOW; remembers it otherwise"""
+    return not cache.add(_dedupe_key(form, email), 1, DEDUPE_WINDOW)
+
+
+def release(form, email):
+    """Forget an allowed post whose work failed, so it can be retried"""
+    cache.delete(_dedupe_key(form, email))
+
+
+def record(form, outcome):
+    key = METRIC_KEY.format(form, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)  # evicted between add() and incr()
+
+
+def check(request, form, email):
+    """
+    The outcome for a POST of `form` from `email`: ALLOWED, LIMITED_IP,
+    LIMITED_EMAIL or DUPLICATE. Only touches the cache. Only an allowed
+    post is remembered for duplicate suppression.
+    """
+    if not take(f'{form}:ip', client_ip(request)):
+        outcome = LIMITED_IP
+    elif not take(f'{form}:email', email.lower()):
+        outcome = LIMITED_EMAIL
+    elif is_duplicate(form, email):
+        outcome = DUPLICATE
+    else:
+        outcome = ALLOWED
+    record(form, outcome)
+    if outcome != ALLOWED:
+        logger.info('%s post %s from %s', form, outcome, client_ip(request))
+    return outcome
+
+
+def metrics():
+    """{form: {outcome: count}} since the cache was last cleared"""
+    keys = {(form, outcome): METRIC_KEY.format(form, outcome) for form in FORMS for outcome in OUTCOMES}
+    values = cache.get_many(keys.values())
+    return {
+        form: {outcome: values.get(keys[form, outcome], 0) for outcome in OUTCOMES}
+        for form in FORMS
+    }
@@ -0,0 +1,242 @@
+# research/recommend.py - Dating platform recommendations from survey answers
+#
+# Every platform in the catalogue is a row of feature strengths (0-1), and
+# every survey option a vector of how much it cares about each feature. A
+# submission's weights are the sum of its options' vectors, so scoring a
+# batch is two matrix products: one-hot answers x option weights x the
+# platform matrix. The answer space is small and discrete (seven questions,
+# four or five options each), so results are memoized per answer tuple and
+# a batch only scores the tuples it hasn't seen before.
+#
+# recommend_pending() scores every unprocessed submission in batches. The
+# spool drainer (research/spool.py) inserts submissions unprocessed and
+# runs it after each pass; `manage.py recommend_submissions` runs it too,
+# for submissions added in the admin.
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .emails import send_confirmation_email
+from .models import SurveySubmission
+
+TOP_N = getattr(settings, 'RECOMMENDATIONS_TOP_N', 3)
+BATCH_SIZE = 2000
+
+FEATURES = (
+    'serious', 'casual', 'friendship',
+    'age_18_25', 'age_26_35', 'age_36_50', 'age_50_plus',
+    'matching', 'userbase', 'safety', 'free', 'low_effort',
+    'video', 'voice', 'easy', 'fresh', 'women_first', 'inclusive',
+)
+
+# ===== CATALOGUE =====
+PLATFORMS = [
+    {
+        'slug': 'hinge', 'name': 'Hinge', 'url': 'https://hinge.co/',
+        'blurb': 'Prompt-based profiles built for getting off the app and into a relationship.',
+        'features': {'serious': 0.9, 'friendship': 0.3, 'age_26_35': 0.9, 'age_36_50': 0.5, 'matching': 0.8,
+                     'userbase': 0.6, 'safety': 0.6, 'free': 0.6, 'low_effort': 0.6, 'video': 0.6, 'voice': 0.8,
+                     'easy': 0.7, 'fresh': 0.7, 'inclusive': 0.7},
+    },
+    {
+        'slug': 'bumble', 'name': 'Bumble', 'url': 'https://bumble.com/',
+        'blurb': 'Women make the first move, with photo verification and a BFF mode for friends.',
+        'features': {'serious': 0.6, 'casual': 0.5, 'friendship': 0.9, 'age_18_25': 0.7, 'age_26_35': 0.8,
+                     'age_36_50': 0.4, 'matching': 0.5, 'userbase': 0.8, 'safety': 0.9, 'free': 0.5,
+                     'low_effort': 0.6, 'video': 0.8, 'voice': 0.6, 'easy': 0.8, 'women_first': 1.0,
+                     'inclusive': 0.6},
+    },
+    {
+        'slug': 'tinder', 'name': 'Tinder', 'url': 'https://tinder.com/',
+        'blurb': 'The biggest pool of people nearby - fast, swipe-driven and mostly free.',
+        'features': {'serious': 0.3, 'casual': 1.0, 'friendship': 0.3, 'age_18_25': 1.0, 'age_26_35': 0.7,
+                     'age_36_50': 0.3, 'matching': 0.3, 'userbase': 1.0, 'safety': 0.5, 'free': 0.7,
+                     'low_effort': 0.9, 'video': 0.6, 'easy': 1.0, 'inclusive': 0.6},
+    },
+    {
+        'slug': 'eharmony', 'name': 'eharmony', 'url': 'https://www.eharmony.com.au/',
+        'blurb': 'A detailed compatibility questionnaire matches you for long-term relationships.',
+        'features': {'serious': 1.0, 'age_26_35': 0.5, 'age_36_50': 0.9, 'age_50_plus': 0.7, 'matching': 1.0,
+                     'userbase': 0.5, 'safety': 0.8, 'low_effort': 0.7, 'video': 0.5, 'easy': 0.6,
+                     'fresh': 0.5},
+    },
+    {
+        'slug': 'rsvp', 'name': 'RSVP', 'url': 'https://www.rsvp.com.au/',
+        'blurb': 'A long-running Australian site with detailed profiles and a mature membership.',
+        'features': {'serious': 0.8, 'friendship': 0.4, 'age_26_35': 0.4, 'age_36_50': 0.9,
+                     'age_50_plus': 0.8, 'matching': 0.6, 'userbase': 0.5, 'safety': 0.7, 'free': 0.3,
+                     'easy': 0.7},
+    },
+    {
+        'slug': 'coffee-meets-bagel', 'name': 'Coffee Meets Bagel', 'url': 'https://coffeemeetsbagel.com/',
+        'blurb': 'A few curated matches a day instead of endless swiping.',
+        'features': {'serious': 0.8, 'friendship': 0.4, 'age_26_35': 0.9, 'age_36_50': 0.5, 'matching': 0.7,
+                     'userbase': 0.3, 'safety': 0.6, 'free': 0.5, 'low_effort': 1.0, 'voice': 0.4,
+                     'easy': 0.8, 'fresh': 0.9, 'women_first': 0.5},
+    },
+    {
+        'slug': 'okcupid', 'name': 'OkCupid', 'url': 'https://www.okcupid.com/',
+        'blurb': 'Hundreds of optional questions drive the matching, with broad identity options.',
+        'features': {'serious': 0.6, 'casual': 0.6, 'friendship': 0.5, 'age_18_25': 0.6, 'age_26_35': 0.8,
+                     'age_36_50': 0.5, 'matching': 0.8, 'userbase': 0.7, 'safety': 0.5, 'free': 0.9,
+                     'low_effort': 0.3, 'video': 0.4, 'easy': 0.5, 'fresh': 0.6, 'inclusive': 1.0},
+    },
+    {
+        'slug': 'her', 'name': 'HER', 'url': 'https://weareher.com/',
+        'blurb': 'A dating and community app made by and for LGBTQ+ women and non-binary people.',
+        'features': {'serious': 0.5, 'casual': 0.6, 'friendship': 0.8, 'age_18_25': 0.8, 'age_26_35': 0.8,
+                     'age_36_50': 0.3, 'matching': 0.4, 'userbase': 0.3, 'safety': 0.8, 'free': 0.6,
+                     'low_effort': 0.5, 'easy': 0.7, 'fresh': 0.6, 'women_first': 0.9, 'inclusive': 1.0},
+    },
+    {
+        'slug': 'silversingles', 'name': 'SilverSingles', 'url': 'https://www.silversingles.com.au/',
+        'blurb': 'Personality-test matching for singles over 50.',
+        'features': {'serious': 0.9, 'friendship': 0.6, 'age_50_plus': 1.0, 'matching': 0.7, 'userbase': 0.3,
+                     'safety': 0.8, 'low_effort': 0.7, 'easy': 0.9},
+    },
+    {
+        'slug': 'facebook-dating', 'name': 'Facebook Dating', 'url': 'https://www.facebook.com/dating',
+        'blurb': 'Free, inside an app you already have, with video calls and groups-based matching.',
+        'features': {'serious': 0.5, 'casual': 0.5, 'friendship': 0.5, 'age_26_35': 0.6, 'age_36_50': 0.8,
+                     'age_50_plus': 0.6, 'matching': 0.4, 'userbase': 0.8, 'safety': 0.5, 'free': 1.0,
+                     'low_effort': 0.8, 'video': 0.9, 'easy': 0.9},
+    },
+]
+
+# What each survey option asks of a platform - keys match the form's values
+QUESTIONS = {
+    'gender': {
+        'woman': {'women_first': 0.6, 'safety': 0.4},
+        'man': {'userbase': 0.3},
+        'nonbinary': {'inclusive': 1.2},
+        'prefer_not_say': {'inclusive': 0.3},
+    },
+    'q1': {
+        'serious': {'serious': 1.5},
+        'casual': {'casual': 1.5},
+        'explore': {'serious': 0.6, 'casual': 0.6, 'userbase': 0.4},
+        'friendship': {'friendship': 1.5, 'serious': 0.4},
+    },
+    'q2': {
+        '18-25': {'age_18_25': 1.2},
+        '26-35': {'age_26_35': 1.2},
+        '36-50': {'age_36_50': 1.2},
+        '50+': {'age_50_plus': 1.5},
+    },
+    'q3': {
+        'algorithm': {'matching': 1.2},
+        'userbase': {'userbase': 1.2},
+        'safety': {'safety': 1.2},
+        'free': {'free': 1.2},
+    },
+    'q4': {
+        'low': {'low_effort': 1.0},
+        'medium': {'low_effort': 0.3, 'userbase': 0.3},
+        'high': {'userbase': 0.6, 'matching': 0.3},
+    },
+    'q5': {
+        'text': {'easy': 0.3},
+        'video': {'video': 1.0},
+        'voice': {'voice': 1.0},
+        'mixed': {'video': 0.5, 'voice': 0.5},
+    },
+    'q6': {
+        'beginner': {'easy': 1.0, 'safety': 0.4},
+        'some': {'matching': 0.3},
+        'experienced': {'matching': 0.4, 'userbase': 0.3},
+        'frustrated': {'fresh': 1.2, 'matching': 0.6},
+    },
+}
+# Every submission gets these too - all a skipped survey is scored on
+BASE_WEIGHTS = {'userbase': 0.3, 'matching': 0.3, 'safety': 0.3, 'easy': 0.2}
+
+
+# ===== MATRICES =====
+def _vector(weights):
+    return np.array([weights.get(feature, 0.0) for feature in FEATURES])
+
+
+PLATFORM_MATRIX = np.array([_vector(platform['features']) for platform in PLATFORMS])  # platforms x features
+OPTIONS = [(question, value) for question, values in QUESTIONS.items() for value in values]
+OPTION_INDEX = {option: index for index, option in enumerate(OPTIONS)}
+OPTION_WEIGHTS = np.array([_vector(QUESTIONS[q][v]) for q, v in OPTIONS])  # options x features
+BASE_VECTOR = _vector(BASE_WEIGHTS)
+
+
+def answer_key(answers):
+    """
+    The answers as a tuple of option indices, one per question; -1 for a
+    question that was skipped or has an unknown value
+    """
+    answers = answers or {}
+    return tuple(OPTION_INDEX.get((question, answers.get(question)), -1) for question in QUESTIONS)
+
+
+def score_keys(keys):
+    """Scores of every platform for each answer key (keys x platforms)"""
+    keys = np.asarray(keys, dtype=np.int64).reshape(-1, len(QUESTIONS))
+    # One extra column soaks up the -1s of unanswered questions
+    onehot = np.zeros((len(keys), len(OPTIONS) + 1))
+    onehot[np.arange(len(keys)).repeat(keys.shape[1]), keys.ravel()] = 1
+    weights = onehot[:, :-1] @ OPTION_WEIGHTS + BASE_VECTOR
+    return weights @ PLATFORM_MATRIX.T
+
+
+# answer key -> ranked recommendations; bounded by the size of the answer space
+_results = {}
+
+
+def recommend_many(answer_sets):
+    """Ranked recommendations for each answers dict, scoring each distinct tuple once"""
+    keys = [answer_key(answers) for answers in answer_sets]
+    missing = list(dict.fromkeys(key for key in keys if key not in _results))
+    if missing:
+        scores = score_keys(missing)
+        ranked = np.argsort(-scores, axis=1, kind='stable')[:, :TOP_N]
+        for key, order, row in zip(missing, ranked, scores):
+            _results[key] = [
+                {
+                    'slug': PLATFORMS[i]['slug'],
+                    'name': PLATFORMS[i]['name'],
+                    'url': PLATFORMS[i]['url'],
+                    'blurb': PLATFORMS[i]['blurb'],
+                    'score': round(float(row[i]), 3),
+                }
+                for i in order
+            ]
+    return [_results[key] for key in keys]
+
+
+def recommend(answers):
+    return recommend_many([answers])[0]
+
+
+# ===== SUBMISSIONS =====
+def recommend_pending(batch_size=BATCH_SIZE):
+    """
+    Score every unprocessed submission without recommendations, store the
+    results and queue its emails: the recommendations to the user and the
+    notification to the admin. Returns how many were sent. The spool
+    drainer runs it after each pass, so new submissions are scored in
+    batches within seconds.
+    """
+    pending = SurveySubmission.objects.filter(processed=False, recommendations__isnull=True).order_by('pk')
+    done = 0
+    last_pk = 0
+    fields = ('name', 'email', 'survey_type', 'answers', 'number')
+    while batch := list(pending.filter(pk__gt=last_pk).only(*fields)[:batch_size]):
+        last_pk = batch[-1].pk
+        now = timezone.now()
+        for submission, recommendations in zip(batch, recommend_many(s.answers for s in batch)):
+            submission.recommendations = recommendations
+            submission.recommended_at = now
+            submission.processed = True
+        with transaction.atomic():
+            SurveySubmission.objects.bulk_update(batch, ['recommendations', 'recommended_at', 'processed'])
+            for submission in batch:
+                send_confirmation_email(
+                    submission.email, submission.name, submission.survey_type, submission.answers, submission.pk,
+                    recommendations=submission.recommendations, number=submission.number,
+                )
+        done += len(batch)
+    return done
@@ -0,0 +1,164 @@
+# research/rollups.py - Per-day answer counters for survey analytics
+#
+# SurveyAnswerRollup holds one counter per (day, question, answer, gender).
+# The spool drainer adds each ingested batch to them in the same
+# transaction as the insert, and `manage.py backfill_survey_rollups`
+# recounts them in chunks from the submissions table and the monthly
+# archives (research/archive.py). The admin dashboard
+# only reads rollups: its queries touch days x answers x genders rows, not
+# the submissions. Counters are never decremented, so deleting or
+# archiving old submissions leaves their history in place.
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import archive
+from .models import SurveyAnswerRollup, SurveyArchive, SurveySubmission
+from .recommend import QUESTIONS
+
+# The survey type is counted as a question too - it gives totals per day
+QUESTION_LABELS = {
+    'survey_type': 'Survey type',
+    'gender': 'Gender',
+    'q1': 'Relationship goal',
+    'q2': 'Age range',
+    'q3': 'Platform priority',
+    'q4': 'Weekly time',
+    'q5': 'Communication style',
+    'q6': 'Experience level',
+}
+UNKNOWN = 'unknown'
+OTHER = 'other'
+CHUNK_SIZE = 2000
+
+
+# ===== COUNTING =====
+def _answer(question, value):
+    """The value as counted - free-form input can't add counters"""
+    if not value:
+        return UNKNOWN
+    return value if value in QUESTIONS.get(question, ()) else OTHER
+
+
+def count_submissions(submissions):
+    """Counter of (day, question, answer, gender) for (submitted_at, survey_type, answers) rows"""
+    counts = Counter()
+    for submitted_at, survey_type, answers in submissions:
+        day = timezone.localdate(submitted_at)
+        answers = answers or {}
+        gender = _answer('gender', answers.get('gender'))
+        counts[day, 'survey_type', survey_type, gender] += 1
+        if survey_type == 'skipped':
+            continue
+        for question in QUESTIONS:
+            counts[day, question, _answer(question, answers.get(question)), gender] += 1
+    return counts
+
+
+def add_counts(counts):
+    """Add to the counters in one upsert per row - safe alongside other writers"""
+    if not counts:
+        return
+    table = SurveyAnswerRollup._meta.db_table
+    sql = (
+        f'INSERT INTO {table} (day, question, answer, gender, count) VALUES (%s, %s, %s, %s, %s) '
+        f'ON CONFLICT (question, day, answer, gender) DO UPDATE SET count = {table}.count + excluded.count'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(*key, count) for key, count in counts.items()])
+
+
+def record(submissions):
+    """Count newly inserted SurveySubmission objects"""
+    add_counts(count_submissions((s.submitted_at, s.survey_type, s.answers) for s in submissions))
+
+
+def _archived_rows(start=None):
+    """(submitted_at, survey_type, answers) of the archived submissions, from `start` on"""
+    archives = SurveyArchive.objects.order_by('month', 'pk')
+    if start is not None:
+        archives = archives.filter(month__gte=timezone.localdate(start).replace(day=1))
+    for part in archives:
+        for row in archive.read(part):
+            submitted_at = parse_datetime(row['submitted_at'])
+            if start is None or submitted_at >= start:
+                yield submitted_at, row['survey_type'], row['answers']
+
+
+def backfill(since=None, chunk_size=CHUNK_SIZE):
+    """
+    Recount the rollups from the submissions table and the archives, from
+    day `since` on (or everything). Submissions inserted while it runs are
+    left to the drainer. Returns the number of submissions counted.
+    """
+    start = None
+    submissions = SurveySubmission.objects.order_by('pk')
+    rollups = SurveyAnswerRollup.objects.all()
+    if since is not None:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        submissions = submissions.filter(submitted_at__gte=start)
+        rollups = rollups.filter(day__gte=since)
+    last_pk = submissions.values_list('pk', flat=True).last()
+
+    counted, after = 0, 0
+    rows = submissions.filter(pk__lte=last_pk or 0).values_list('pk', 'submitted_at', 'survey_type', 'answers')
+    with transaction.atomic():
+        rollups.delete()
+        archived = _archived_rows(start)
+        while chunk := list(islice(archived, chunk_size)):
+            add_counts(count_submissions(chunk))
+            counted += len(chunk)
+        while chunk := list(rows.filter(pk__gt=after)[:chunk_size]):
+            add_counts(count_submissions(row[1:] for row in chunk))
+            counted += len(chunk)
+            after = chunk[-1][0]
+    return counted
+
+
+# ===== READING =====
+def distribution(question, days=30, gender=None):
+    """
+    Answers to `question` over the last `days` days, shaped for a template:
+
+        answers: [{answer, count, percent, by_gender: [count per genders]}],
+                 most given first
+        genders: the genders seen
+        total:   submissions counted
+        trend:   [(day, total, [count per answers])], oldest first
+    """
+    first_day = timezone.localdate() - timedelta(days=days - 1)
+    rows = SurveyAnswerRollup.objects.filter(question=question, day__gte=first_day).order_by()
+    if gender:
+        rows = rows.filter(gender=gender)
+    cells = list(rows.values_list('day', 'answer', 'gender').annotate(total=Sum('count')))
+
+    totals, by_gender, by_day = Counter(), defaultdict(Counter), defaultdict(Counter)
+    for day, answer, row_gender, count in cells:
+        totals[answer] += count
+        by_gender[answer][row_gender] += count
+        by_day[day][answer] += count
+    total = sum(totals.values())
+    order = [answer for answer, _ in totals.most_common()]
+    genders = sorted({row_gender for _, _, row_gender, _ in cells})
+
+    return {
+        'answers': [
+            {
+                'answer': answer,
+                'count': totals[answer],
+                'percent': round(100 * totals[answer] / total, 1),
+                'by_gender': [by_gender[answer][g] for g in genders],
+            }
+            for answer in order
+        ],
+        'genders': genders,
+        'total': total,
+        'trend': [
+            (day, sum(by_day[day].values()), [by_day[day][answer] for answer in order])
+            for day in (first_day + timedelta(days=offset) for offset in range(days))
+        ],
+    }
@@ -0,0 +1,311 @@
+# research/spool.py - Write-behind spool for survey submissions
+#
+# The survey view appends each submission as one JSON line to a local,
+# append-only segment file and fsyncs it before answering, so a form post
+# never waits on the database. A drainer thread in every web process (and
+# `manage.py drain_survey_spool`) bulk-inserts the spooled records into
+# SurveySubmission, unprocessed, then scores every pending submission in
+# one batch and queues their emails (recommend_pending() in
+# research/recommend.py). Each record carries an ingest_id that is unique
+# in the table: replaying a segment after a crash, or a form posted twice,
+# never inserts the same submission twice.
+#
+# Segments are named <created ns>-<pid>.jsonl. A process appends only to
+# its own segment and starts a new one after SEGMENT_MAX_AGE seconds or
+# SEGMENT_MAX_BYTES, so once a segment is older than that (plus a grace
+# period) nothing writes to it any more and it is deleted when drained.
+# How far each segment has been drained is kept in a <segment>.offset file.
+#
+# The drainer thread is a daemon, so a worker that exits drains once more
+# on the way out rather than leaving its last submissions for the next
+# start. SURVEY_SPOOL_DIR must be on a disk that outlives deploys (see
+# render.yaml) for anything still spooled then to survive.
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from itertools import count
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import rollups
+from .models import Sequence, SurveySubmission
+from .recommend import recommend_pending
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'SURVEY_SPOOL_BATCH_SIZE', 500)
+SEGMENT_MAX_BYTES = getattr(settings, 'SURVEY_SPOOL_SEGMENT_MAX_BYTES', 4 * 1024 * 1024)
+SEGMENT_MAX_AGE = getattr(settings, 'SURVEY_SPOOL_SEGMENT_MAX_AGE', 60)  # seconds
+# Extra wait before a segment counts as sealed, for an append already under way
+SEAL_GRACE = 10
+SEGMENT_SUFFIX = '.jsonl'
+OFFSET_SUFFIX = '.offset'
+LOCK_NAME = '.drain.lock'
+
+
+def spool_dir():
+    return Path(getattr(settings, 'SURVEY_SPOOL_DIR', settings.BASE_DIR / 'var' / 'survey_spool'))
+
+
+def _fsync_dir(directory):
+    """Make a new file's directory entry durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ===== WRITING =====
+class SegmentWriter:
+    """Appends fsync'd lines to this process's current segment"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fd = None
+        self.pid = None
+        self.directory = None
+        self.created = 0
+        self.size = 0
+
+    def _needs_new_segment(self, directory, length):
+        return (
+            self.fd is None
+            or self.pid != os.getpid()  # forked: the segment belongs to the parent
+            or self.directory != directory
+            or time.time() - self.created >= SEGMENT_MAX_AGE
+            or (self.size and self.size + length > SEGMENT_MAX_BYTES)
+        )
+
+    def _close(self):
+        if self.fd is not None and self.pid == os.getpid():
+            os.close(self.fd)
+        self.fd = None
+
+    def _open(self, directory):
+        self._close()
+        directory.mkdir(parents=True, exist_ok=True)
+        created_ns = time.time_ns()
+        path = directory / f'{created_ns:020d}-{os.getpid()}{SEGMENT_SUFFIX}'
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o600)
+        self.pid = os.getpid()
+        self.directory = directory
+        self.created = created_ns / 1e9
+        self.size = 0
+        _fsync_dir(directory)
+
+    def append(self, line):
+        directory = spool_dir()
+        with self.lock:
+            if self._needs_new_segment(directory, len(line)):
+                self._open(directory)
+            try:
+                os.write(self.fd, line)
+                os.fsync(self.fd)
+            except OSError:
+                # The segment may end in a torn line now - never append after it
+                self._close()
+                raise
+            self.size += len(line)
+
+
+_writer = SegmentWriter()
+
+
+def submit(name, email, survey_type, answers, ingest_id=None):
+    """
+    Spool one survey submission. Returns its ingest_id. `ingest_id` comes
+    from the form; anything that isn't a UUID gets a fresh one.
+    """
+    try:
+        ingest_id = uuid.UUID(str(ingest_id))
+    except ValueError:
+        ingest_id = uuid.uuid4()
+    record = {
+        'ingest_id': str(ingest_id),
+        'name': name,
+        'email': email,
+        'survey_type': survey_type,
+        'answers': answers,
+        'submitted_at': timezone.now(),
+    }
+    line = json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+    try:
+        _writer.append(line.encode())
+    except OSError:
+        # Disk full or unwritable - fall back to the slow path rather than lose it
+        logger.exception('Could not spool survey submission %s, saving it directly', ingest_id)
+        _ingest([json.loads(line)])
+        return ingest_id
+    start_drainer()
+    return ingest_id
+
+
+# ===== DRAINING =====
+def _ingest(records):
+    """
+    Insert the records that aren't in the table yet, unprocessed, and count
+    them in the rollups in one transaction. Returns the number inserted.
+    """
+    records = {record['ingest_id']: record for record in records}
+    with transaction.atomic():
+        existing = {
+            str(ingest_id) for ingest_id in
+            SurveySubmission.objects.filter(ingest_id__in=records).values_list('ingest_id', flat=True)
+        }
+        new = [record for ingest_id, record in records.items() if ingest_id not in existing]
+        if not new:
+            return 0
+        first_number = Sequence.allocate(SurveySubmission.NUMBER_SEQUENCE, len(new))
+        SurveySubmission.objects.bulk_create([
+            SurveySubmission(
+                ingest_id=record['ingest_id'],
+                name=record['name'],
+                email=record['email'],
+                survey_type=record['survey_type'],
+                answers=record['answers'],
+                submitted_at=parse_datetime(record['submitted_at']),
+                number=number,
+            )
+            for number, record in zip(count(first_number), new)
+        ], ignore_conflicts=True)
+        rollups.record(SurveySubmission.objects.filter(
+            ingest_id__in=[record['ingest_id'] for record in new]
+        ).only('submitted_at', 'survey_type', 'answers'))
+    return len(new)
+
+
+def _is_sealed(path):
+    created = int(path.name.split('-', 1)[0]) / 1e9
+    return time.time() > created + SEGMENT_MAX_AGE + SEAL_GRACE
+
+
+def _read_offset(offset_path):
+    try:
+        return int(offset_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _save_offset(offset_path, offset):
+    # Not fsync'd: losing it only means replaying records, which is harmless
+    temp = offset_path.with_name(offset_path.name + '.tmp')
+    temp.write_text(str(offset))
+    os.replace(temp, offset_path)
+
+
+def _drain_segment(path, batch_size):
+    """Ingest the complete lines past the segment's offset. Returns rows inserted."""
+    offset_path = path.with_suffix(OFFSET_SUFFIX)
+    start = offset = _read_offset(offset_path)
+    sealed = _is_sealed(path)  # checked first: a sealed segment can't grow afterwards
+    inserted = 0
+    batch = []
+    with open(path, 'rb') as segment:
+        segment.seek(offset)
+        for line in segment:
+            if not line.endswith(b'\n'):
+                break  # an append still in progress, or one cut short
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                logger.error('Skipping unreadable line at byte %s of %s', offset, path.name)
+            offset += len(line)
+            if len(batch) >= batch_size:
+                inserted += _ingest(batch)
+                batch = []
+                _save_offset(offset_path, offset)
+        size = segment.seek(0, os.SEEK_END)
+    if batch:
+        inserted += _ingest(batch)
+    if offset != start:
+        _save_offset(offset_path, offset)
+
+    if sealed:
+        if offset < size:
+            logger.warning('Dropping a torn line at the end of %s', path.name)
+        path.unlink()
+        offset_path.unlink(missing_ok=True)
+    return inserted
+
+
+def drain(batch_size=BATCH_SIZE):
+    """
+    Insert every complete spooled record, oldest segment first, then score
+    the pending submissions. Returns the number of new submissions; 0
+    straight away if another drainer is busy.
+    """
+    directory = spool_dir()
+    if not directory.is_dir():
+        return 0
+    with open(directory / LOCK_NAME, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        inserted = sum(
+            _drain_segment(path, batch_size)
+            for path in sorted(directory.glob(f'*{SEGMENT_SUFFIX}'))
+        )
+        # Also picks up what an earlier pass inserted but didn't get to score
+        recommend_pending(batch_size)
+        return inserted
+
+
+def pending():
+    """Bytes spooled but not drained yet"""
+    total = 0
+    for path in spool_dir().glob(f'*{SEGMENT_SUFFIX}'):
+        total += path.stat().st_size - _read_offset(path.with_suffix(OFFSET_SUFFIX))
+    return total
+
+
+# ===== BACKGROUND DRAINER =====
+_drainer = None
+_drainer_lock = threading.Lock()
+
+
+def _drain_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            drain()
+        except Exception:
+            # Database down or slow: the records stay spooled for the next pass
+            logger.exception('Draining the survey spool failed')
+        finally:
+            close_old_connections()
+
+
+def start_drainer():
+    """Start this process's drainer thread unless it's running (or disabled)"""
+    global _drainer
+    interval = getattr(settings, 'SURVEY_SPOOL_DRAIN_INTERVAL', 2)
+    if not interval or (_drainer is not None and _drainer.is_alive()):
+        return
+    with _drainer_lock:
+        if _drainer is None or not _drainer.is_alive():
+            _drainer = threading.Thread(
+                target=_drain_forever, args=(interval,), name='survey-spool-drainer', daemon=True,
+            )
+            _drainer.start()
+
+
+@atexit.register
+def _drain_on_shutdown():
+    """Drain once more when a process that ran the drainer exits"""
+    if _drainer is None:
+        return
+    try:
+        drain()
+    except Exception:
+        logger.exception('Could not drain the survey spool on shutdown')
@@ -1,3 +1,807 @@
-from django.test import TestCase
+import csv
+import email
+import gzip
+import json
+import socketserver
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from unittest import mock
+
+import numpy as np
+
+from . import admin as research_admin, archive, export, fast_path, newsletter, outbox, ratelimit, recommend, rollups, spool
+from .management.commands.benchmark_export import add_submissions
+from .models import (
+    BroadcastFailure, BroadcastRun, NewsletterIssue, OutboxMessage, Subscriber, SurveyAnswerRollup,
+    Sequence, SurveyArchive, SurveySubmission,
+)
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; refuses recipients in server.refuse"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ESMTP')
+        recipients = []
+        while line := self.rfile.readline().decode().strip():
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip(' <>')
+                if address in self.server.refuse:
+                    self.reply('450 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (chunk := self.rfile.readline().decode()) not in ('.\r\n', ''):
+                    data.append(chunk)
+                self.server.received.append((recipients, ''.join(data)))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.connections = 0
+        self.received = []
+        self.refuse = set()
+
+
+class FakeSMTPMixin:
+    """Point the SMTP backend at a FakeSMTPServer on a free local port"""
+
+    def setUp(self):
+        self.server = FakeSMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.server.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_TIMEOUT=5,
+        )
+        smtp.enable()
+        self.addCleanup(smtp.disable)
+
+
+class SpoolMixin:
+    """A fresh survey spool directory per test, drained only when the test says so"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # rate limit buckets and dedupe keys
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool_dir = Path(directory.name)
+        settings = override_settings(SURVEY_SPOOL_DIR=self.spool_dir, SURVEY_SPOOL_DRAIN_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        writer = mock.patch.object(spool, '_writer', spool.SegmentWriter())
+        writer.start()
+        self.addCleanup(writer.stop)
+
+
+class OutboxTests(SpoolMixin, FakeSMTPMixin, TestCase):
+
+    def test_views_only_enqueue(self):
+        response = self.client.post('/tools/dating-recommendations/', {
+            'email': 'user@example.com', 'name': 'Sam', 'skip_survey': '1',
+        })
+        self.assertRedirects(response, '/tools/thank-you/', fetch_redirect_response=False)
+        self.client.post('/', {'newsletter_email': 'reader@example.com'})
+        spool.drain()
+        self.assertEqual(self.server.connections, 0)
+        self.assertEqual(
+            sorted(OutboxMessage.objects.values_list('kind', flat=True)),
+            ['newsletter_welcome', 'survey_admin_notification', 'survey_recommendations'],
+        )
+
+    def test_batch_reuses_one_connection(self):
+        for i in range(5):
+            outbox.enqueue(f'Hello {i}', 'Body', [f'user{i}@example.com'])
+        self.assertEqual(outbox.send_due(), (5, 0))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.received), 5)
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.SENT).exists())
+        self.assertEqual(outbox.send_due(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        self.server.refuse.add('bounce@example.com')
+        outbox.enqueue('Hello', 'Body', ['bounce@example.com'])
+        outbox.enqueue('Hello', 'Body', ['ok@example.com'])
+        with self.assertLogs('research.outbox', 'WARNING'):
+            self.assertEqual(outbox.send_due(), (1, 1))
+
+        message = OutboxMessage.objects.get(to=['bounce@example.com'])
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 1))
+        self.assertIn('SMTPRecipientsRefused', message.last_error)
+        self.assertAlmostEqual(
+            (message.next_attempt_at - timezone.now()).total_seconds(), outbox.RETRY_BASE_DELAY, delta=5,
+        )
+        self.assertEqual(outbox.send_due(), (0, 0))  # not due yet
+
+        with self.assertLogs('research.outbox', 'WARNING') as logs:
+            for attempt in range(2, outbox.MAX_ATTEMPTS + 1):
+                OutboxMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+                outbox.send_due()
+        self.assertIn('giving up', logs.output[-1])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.FAILED, outbox.MAX_ATTEMPTS))
+        self.assertEqual(outbox.retry_delay(3), outbox.RETRY_BASE_DELAY * 4)
+
+    def test_unreachable_relay_retries_whole_batch(self):
+        outbox.enqueue('Hello', 'Body', ['user@example.com'])
+        with override_settings(EMAIL_PORT=1), self.assertLogs('research.outbox', 'WARNING'):
+            self.assertEqual(outbox.send_due(), (0, 1))
+        self.assertEqual(OutboxMessage.objects.get().attempts, 1)
+
+    def test_claimed_messages_are_skipped(self):
+        message = outbox.enqueue('Hello', 'Body', ['user@example.com'])
+        self.assertEqual(outbox._claim(10), [message])
+        self.assertEqual(outbox._claim(10), [])
+        self.assertGreater(OutboxMessage.objects.get().next_attempt_at, timezone.now() + timedelta(minutes=5))
+
+    def test_send_outbox_command(self):
+        outbox.enqueue('Hello', 'Body', ['user@example.com'])
+        out = StringIO()
+        call_command('send_outbox', stdout=out)
+        self.assertIn('Sent 1 emails, 0 failed.', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)  # went over SMTP, not the test backend
+
+
+class NewsletterTests(FakeSMTPMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Subscriber.objects.bulk_create(Subscriber(email=f'reader{i}@example.com') for i in range(60))
+        Subscriber.objects.create(email='gone@example.com', is_active=False)
+        self.issue = NewsletterIssue.objects.create(message_type='welcome')
+
+    def recipients(self):
+        return [rcpt for rcpts, _ in self.server.received for rcpt in rcpts]
+
+    def test_signup_stores_subscriber(self):
+        self.client.post('/', {'newsletter_email': 'New@Example.com'})
+        self.client.post('/', {'newsletter_email': 'gone@example.com'})
+        self.assertTrue(Subscriber.objects.filter(email='new@example.com', is_active=True).exists())
+        self.assertTrue(Subscriber.objects.get(email='gone@example.com').is_active)
+        self.assertEqual(
+            OutboxMessage.objects.filter(kind='newsletter_welcome').first().subject,
+            newsletter.MESSAGE_TYPES['welcome'][0],
+        )
+
+    def test_broadcast_uses_bounded_connections(self):
+        run = newsletter.broadcast(self.issue, connections=3, rate_limit=0, chunk_size=7)
+        self.assertEqual(sorted(self.recipients()), sorted(f'reader{i}@example.com' for i in range(60)))
+        self.assertLessEqual(self.server.connections, 3)
+        self.assertIn("Subject: Welcome to Dating Hub's 2026 Dating Predictions!", self.server.received[0][1])
+        self.assertEqual((run.status, run.total, run.sent, run.failed), (BroadcastRun.COMPLETED, 60, 60, 0))
+        self.assertEqual(run.checkpoint, Subscriber.objects.filter(is_active=True).latest('id').id)
+        self.assertGreater(run.throughput, 0)
+
+    def test_rate_limit(self):
+        Subscriber.objects.filter(id__gt=Subscriber.objects.order_by('id')[19].id).delete()
+        started = time.monotonic()
+        newsletter.broadcast(self.issue, connections=4, rate_limit=100, chunk_size=5)
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertEqual(len(self.server.received), 20)
+
+    def test_failures_are_recorded(self):
+        self.server.refuse.add('reader3@example.com')
+        run = newsletter.broadcast(self.issue, connections=2, rate_limit=0, chunk_size=10)
+        self.assertEqual((run.sent, run.failed), (59, 1))
+        failure = BroadcastFailure.objects.get(run=run)
+        self.assertEqual(failure.email, 'reader3@example.com')
+
+    def test_crashed_run_resumes_from_checkpoint(self):
+        send_chunk = newsletter._send_chunk
+        calls = []
+
+        def crash_on_fourth_chunk(recipients, *args):
+            calls.append(recipients)
+            if len(calls) == 4:
+                raise ConnectionError('worker died')
+            return send_chunk(recipients, *args)
+
+        with mock.patch.object(newsletter, '_send_chunk', crash_on_fourth_chunk), \
+                self.assertRaises(ConnectionError):
+            newsletter.broadcast(self.issue, connections=1, rate_limit=0, chunk_size=10)
+        run = BroadcastRun.objects.get()
+        self.assertEqual((run.status, run.sent), (BroadcastRun.RUNNING, 30))
+        self.assertEqual(run.checkpoint, calls[2][-1][0])
+
+        out = StringIO()
+        call_command('send_newsletter', self.issue.pk, stdout=out)
+        self.assertIn(f'Resuming run #{run.pk}', out.getvalue())
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.sent), (BroadcastRun.COMPLETED, 60))
+        self.assertEqual(sorted(self.recipients()), sorted(f'reader{i}@example.com' for i in range(60)))
+
+
+    def test_every_message_can_unsubscribe(self):
+        newsletter.broadcast(self.issue, connections=1, rate_limit=0, chunk_size=100)
+        _, data = next(m for m in self.server.received if m[0] == ['reader7@example.com'])
+        message = email.message_from_string(data)
+        url = newsletter.unsubscribe_url('reader7@example.com')
+        self.assertEqual(' '.join(message['List-Unsubscribe'].split()), f'<{url}>')
+        self.assertEqual(message['List-Unsubscribe-Post'], 'List-Unsubscribe=One-Click')
+        self.assertIn(f'Unsubscribe: {url}', message.get_payload())
+
+        # The welcome mail goes through the outbox with the same headers
+        self.client.post('/', {'newsletter_email': 'new@example.com'})
+        url = newsletter.unsubscribe_url('new@example.com')
+        self.assertIn(url, OutboxMessage.objects.get(kind='newsletter_welcome').body)
+        outbox.send_due()
+        _, data = next(m for m in self.server.received if m[0] == ['new@example.com'])
+        message = email.message_from_string(data)
+        self.assertEqual(' '.join(message['List-Unsubscribe'].split()), f'<{url}>')
+        self.assertEqual(message['List-Unsubscribe-Post'], 'List-Unsubscribe=One-Click')
+
+    def test_unsubscribe_link(self):
+        path = newsletter.unsubscribe_url('Reader7@example.com').removeprefix(settings.SITE_URL)
+        response = self.client.get(path)
+        self.assertContains(response, 'reader7@example.com')
+        self.assertTrue(Subscriber.objects.get(email='reader7@example.com').is_active)  # GET only asks
+
+        # The one-click POST a mail client sends, without a CSRF token
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(path, {'List-Unsubscribe': 'One-Click'})
+        self.assertContains(response, "You're unsubscribed")
+        self.assertFalse(Subscriber.objects.get(email='reader7@example.com').is_active)
+        newsletter.broadcast(self.issue, connections=1, rate_limit=0, chunk_size=100)
+        self.assertNotIn('reader7@example.com', self.recipients())
+
+        self.assertEqual(self.client.get(path[:-3] + 'xx/').status_code, 404)
+        forged = signing.Signer().sign_object('reader8@example.com')  # not the unsubscribe salt
+        self.assertEqual(self.client.post(f'/newsletter/unsubscribe/{forged}/').status_code, 404)
+        self.assertTrue(Subscriber.objects.get(email='reader8@example.com').is_active)
+
+
+class SurveySpoolTests(SpoolMixin, TestCase):
+    TOKEN = '0b8f6a8e-3f0c-4a43-9d55-5d6c2a1f7e01'
+
+    def post(self, **data):
+        return self.client.post('/tools/dating-recommendations/', {
+            'email': 'user@example.com', 'name': 'Sam', 'gender': 'woman', 'q1': 'a',
+            'submission_token': self.TOKEN, **data,
+        })
+
+    def segments(self):
+        return sorted(self.spool_dir.glob('*.jsonl'))
+
+    def test_form_carries_a_token(self):
+        response = self.client.get('/tools/dating-recommendations/')
+        self.assertContains(response, 'name="submission_token"')
+
+    def test_post_only_touches_the_spool(self):
+        with self.assertNumQueries(0):
+            response = self.post()
+        self.assertRedirects(response, '/tools/thank-you/', fetch_redirect_response=False)
+        self.assertFalse(SurveySubmission.objects.exists())
+        [segment] = self.segments()
+        self.assertEqual(len(segment.read_bytes().splitlines()), 1)
+
+        self.assertEqual(spool.drain(), 1)
+        submission = SurveySubmission.objects.get()
+        self.assertEqual((str(submission.ingest_id), submission.answers['gender']), (self.TOKEN, 'woman'))
+        admin_mail = OutboxMessage.objects.get(kind='survey_admin_notification')
+        self.assertIn(f'/surveysubmission/{submission.pk}/change/', admin_mail.body)
+        self.assertEqual(spool.pending(), 0)
+
+    def test_drains_on_shutdown(self):
+        self.post()
+        spool._drain_on_shutdown()  # no drainer ran in this process
+        self.assertEqual(spool.pending(), len(self.segments()[0].read_bytes()))
+        with mock.patch.object(spool, '_drainer', object()):
+            spool._drain_on_shutdown()
+        self.assertEqual(SurveySubmission.objects.count(), 1)
+        self.assertEqual(spool.pending(), 0)
+
+    def test_drained_rows_are_scored_as_pending(self):
+        self.post()
+        with mock.patch.object(spool, 'recommend_pending') as recommend_pending:
+            spool.drain()
+        self.assertFalse(SurveySubmission.objects.get().processed)
+        self.assertEqual(recommend_pending.call_count, 1)
+        spool.drain()  # the next pass scores it
+        submission = SurveySubmission.objects.get()
+        self.assertTrue(submission.processed)
+        self.assertEqual(submission.recommendations, recommend.recommend(submission.answers))
+        self.assertEqual(OutboxMessage.objects.filter(kind='survey_recommendations').count(), 1)
+
+    def test_replays_are_ignored(self):
+        self.post()
+        self.post()  # form submitted twice
+        self.post(submission_token='not-a-uuid', email='other@example.com')
+        self.assertEqual(spool.drain(), 2)
+
+        # Forget how far the segment was drained, as after a crash
+        for offset_file in self.spool_dir.glob('*.offset'):
+            offset_file.unlink()
+        self.assertEqual(spool.drain(), 0)
+        self.assertEqual(SurveySubmission.objects.count(), 2)
+        self.assertEqual(OutboxMessage.objects.filter(kind='survey_recommendations').count(), 2)
+
+    def test_spool_survives_restart(self):
+        self.post()
+        with mock.patch.object(spool, '_writer', spool.SegmentWriter()):  # a new process
+            self.post(submission_token='', email='second@example.com')
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual(spool.drain(), 2)
+
+    def test_database_outage_keeps_records_spooled(self):
+        self.post()
+        with mock.patch.object(spool, '_ingest', side_effect=OperationalError('server closed the connection')), \
+                self.assertRaises(OperationalError):
+            spool.drain()
+        self.assertGreater(spool.pending(), 0)
+        self.assertEqual(spool.drain(), 1)
+
+    def test_unwritable_spool_saves_directly(self):
+        with mock.patch('os.fsync', side_effect=OSError('No space left on device')), \
+                self.assertLogs('research.spool', 'ERROR'):
+            self.post()
+        self.assertTrue(SurveySubmission.objects.filter(ingest_id=self.TOKEN).exists())
+
+    @mock.patch.object(spool, 'SEAL_GRACE', 0)
+    @mock.patch.object(spool, 'SEGMENT_MAX_AGE', 0)
+    def test_sealed_segments_are_removed(self):
+        self.post()
+        self.post(submission_token='', email='second@example.com')
+        with open(self.segments()[-1], 'ab') as segment:
+            segment.write(b'{"ingest_id": "torn')  # the process died mid-append
+        with self.assertLogs('research.spool', 'WARNING'):
+            self.assertEqual(spool.drain(), 2)
+        self.assertEqual(list(self.spool_dir.iterdir()), [self.spool_dir / spool.LOCK_NAME])
+
+    def test_drain_command(self):
+        self.post()
+        out = StringIO()
+        call_command('drain_survey_spool', stdout=out)
+        self.assertIn('Saved 1 submissions.', out.getvalue())
+        self.assertIn('0 bytes still spooled.', out.getvalue())
+
+
+class RecommendTests(TestCase):
+    ANSWERS = {'gender': 'woman', 'q1': 'serious', 'q2': '50+', 'q3': 'safety',
+               'q4': 'low', 'q5': 'text', 'q6': 'beginner'}
+
+    def names(self, answers):
+        return [platform['name'] for platform in recommend.recommend(answers)]
+
+    def test_rankings_follow_the_answers(self):
+        self.assertIn('SilverSingles', self.names(self.ANSWERS))
+        self.assertEqual(self.names({**self.ANSWERS, 'q1': 'casual', 'q2': '18-25', 'q3': 'userbase'})[0], 'Tinder')
+        self.assertIn('HER', self.names({'gender': 'nonbinary', 'q1': 'friendship', 'q2': '18-25'}))
+        self.assertEqual(len(recommend.recommend(None)), recommend.TOP_N)  # skipped survey
+
+    def test_batch_matches_single_scoring(self):
+        unknown = {**self.ANSWERS, 'q3': 'no-such-option'}
+        self.assertEqual(recommend.answer_key(unknown)[3], -1)
+        keys = [recommend.answer_key(a) for a in (self.ANSWERS, unknown, {})]
+        batch = recommend.score_keys(keys)
+        for key, row in zip(keys, batch):
+            self.assertTrue(np.allclose(recommend.score_keys([key])[0], row))
+
+    def test_distinct_answers_are_scored_once(self):
+        recommend._results.clear()
+        with mock.patch.object(recommend, 'score_keys', wraps=recommend.score_keys) as score_keys:
+            results = recommend.recommend_many([self.ANSWERS, dict(self.ANSWERS), None, self.ANSWERS])
+            recommend.recommend(self.ANSWERS)
+        self.assertEqual(score_keys.call_count, 1)
+        self.assertEqual(len(score_keys.call_args.args[0]), 2)
+        self.assertEqual(results[0], results[3])
+
+    def test_recommend_pending(self):
+        SurveySubmission.objects.create(email='a@example.com', answers=self.ANSWERS)
+        SurveySubmission.objects.create(email='b@example.com', survey_type='skipped')
+        SurveySubmission.objects.create(email='c@example.com', processed=True)
+        out = StringIO()
+        call_command('recommend_submissions', batch_size=1, stdout=out)
+        self.assertIn('Sent recommendations for 2 submissions.', out.getvalue())
+        submission = SurveySubmission.objects.get(email='a@example.com')
+        self.assertTrue(submission.processed)
+        self.assertEqual(submission.recommendations, recommend.recommend(self.ANSWERS))
+        message = OutboxMessage.objects.get(to=['a@example.com'])
+        self.assertIn('1. ' + submission.recommendations[0]['name'], message.body)
+        self.assertFalse(SurveySubmission.objects.get(email='c@example.com').recommendations)
+        self.assertEqual(recommend.recommend_pending(), 0)
+
+
+class RollupTests(SpoolMixin, TestCase):
+    ANSWERS = RecommendTests.ANSWERS
+
+    def counts(self, question):
+        return dict(
+            SurveyAnswerRollup.objects.filter(question=question).order_by()
+            .values_list('answer').annotate(total=Sum('count'))
+        )
+
+    def add(self, days_ago, **answers):
+        return SurveySubmission.objects.create(
+            email='user@example.com',
+            answers={**self.ANSWERS, **answers},
+            submitted_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def test_ingest_updates_rollups(self):
+        data = {'email': 'user@example.com', **self.ANSWERS}
+        self.client.post('/tools/dating-recommendations/', data)
+        self.client.post('/tools/dating-recommendations/', {**data, 'email': 'b@example.com', 'gender': 'man', 'q3': 'free'})
+        self.client.post('/tools/dating-recommendations/', {**data, 'email': 'c@example.com', 'q3': '<script>'})
+        self.client.post('/tools/dating-recommendations/', {'email': 'd@example.com', 'skip_survey': '1'})
+        spool.drain()
+        self.assertEqual(self.counts('q3'), {'safety': 1, 'free': 1, 'other': 1})
+        self.assertEqual(self.counts('survey_type'), {'completed': 3, 'skipped': 1})
+        self.assertEqual(
+            SurveyAnswerRollup.objects.get(question='q3', answer='free').gender, 'man',
+        )
+
+    def test_backfill_recounts_from_submissions(self):
+        for days_ago in (0, 0, 3, 40):
+            self.add(days_ago)
+        self.add(1, q1='casual')
+        out = StringIO()
+        call_command('backfill_survey_rollups', chunk_size=2, stdout=out)
+        self.assertIn('Counted 5 submissions.', out.getvalue())
+        rows = list(SurveyAnswerRollup.objects.values_list('day', 'question', 'answer', 'gender', 'count'))
+        self.assertEqual(SurveyAnswerRollup.objects.get(question='q1', answer='serious', day=timezone.localdate()).count, 2)
+
+        # Running it again, in full or from a day on, changes nothing
+        rollups.backfill()
+        rollups.backfill(since=timezone.localdate() - timedelta(days=2))
+        self.assertCountEqual(
+            SurveyAnswerRollup.objects.values_list('day', 'question', 'answer', 'gender', 'count'), rows,
+        )
+
+    def test_backfill_counts_archived_months(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        old = [self.add(400), self.add(400, q1='casual'), self.add(3)]
+        SurveySubmission.objects.update(processed=True)
+        rollups.backfill()
+        rows = list(SurveyAnswerRollup.objects.values_list('day', 'question', 'answer', 'gender', 'count'))
+        with override_settings(SURVEY_ARCHIVE_DIR=Path(directory.name)):
+            self.assertEqual(archive.archive(), 2)
+            self.assertEqual(rollups.backfill(chunk_size=1), 3)
+            self.assertCountEqual(
+                SurveyAnswerRollup.objects.values_list('day', 'question', 'answer', 'gender', 'count'), rows,
+            )
+            rollups.backfill(since=timezone.localdate(old[0].submitted_at))
+            self.assertEqual(self.counts('q1'), {'serious': 2, 'casual': 1})
+            rollups.backfill(since=timezone.localdate() - timedelta(days=10))
+            self.assertEqual(self.counts('q1'), {'serious': 2, 'casual': 1})
+
+    def test_distribution(self):
+        for days_ago in (0, 1, 1, 45):
+            self.add(days_ago)
+        self.add(0, q1='casual', gender='man')
+        rollups.backfill()
+        stats = rollups.distribution('q1', days=30)
+        self.assertEqual(stats['total'], 4)
+        self.assertEqual(stats['genders'], ['man', 'woman'])
+        self.assertEqual(stats['answers'][0], {'answer': 'serious', 'count': 3, 'percent': 75.0, 'by_gender': [0, 3]})
+        self.assertEqual(len(stats['trend']), 30)
+        self.assertEqual(stats['trend'][-1][1:], (2, [1, 1]))
+        self.assertEqual(rollups.distribution('q1', days=30, gender='man')['total'], 1)
+
+    def test_dashboard_reads_only_rollups(self):
+        self.add(0)
+        rollups.backfill()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/research/surveysubmission/dashboard/', {'question': 'q3'})
+        self.assertContains(response, 'Platform priority')
+        self.assertContains(response, 'safety')
+        self.assertFalse([q for q in queries if 'research_surveysubmission' in q['sql']])
+        self.assertContains(self.client.get('/admin/research/surveysubmission/'), 'dashboard/')
+
+
+class ExportTests(TestCase):
+    ANSWERS = RecommendTests.ANSWERS
+
+    def setUp(self):
+        SurveySubmission.objects.create(
+            name='=HYPERLINK("x")', email='a@example.com', answers=self.ANSWERS,
+            recommendations=recommend.recommend(self.ANSWERS),
+        )
+        SurveySubmission.objects.create(name='\t=1+2', email='b@example.com', survey_type='skipped')
+
+    def read(self, chunks):
+        return b''.join(chunks).decode()
+
+    def test_csv_flattens_answers(self):
+        header, first, second = csv.reader(StringIO(self.read(export.export(SurveySubmission.objects.all()))))
+        self.assertEqual(header[6:], ['gender', 'q1', 'q2', 'q3', 'q4', 'q5', 'q6', 'recommended'])
+        row = dict(zip(header, first))
+        self.assertEqual(row['name'], "'=HYPERLINK(\"x\")")
+        self.assertEqual((row['gender'], row['q3']), ('woman', 'safety'))
+        self.assertEqual(row['recommended'].split('; ')[0], recommend.recommend(self.ANSWERS)[0]['name'])
+        self.assertEqual(dict(zip(header, second))['q1'], '')
+        self.assertEqual(dict(zip(header, second))['name'], "'\t=1+2")
+
+    def test_gzipped_jsonl(self):
+        data = gzip.decompress(b''.join(export.export(SurveySubmission.objects.all(), 'jsonl', compress=True)))
+        rows = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([row['email'] for row in rows], ['a@example.com', 'b@example.com'])
+        self.assertEqual(rows[0]['q1'], 'serious')
+
+    def test_admin_action_streams(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post('/admin/research/surveysubmission/', {
+            'action': 'export_csv_gzip', 'select_across': '1', 'index': '0',
+            '_selected_action': SurveySubmission.objects.values_list('pk', flat=True),
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz"', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().count('@example.com'), 2)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'out.jsonl'
+            out = StringIO()
+            call_command('export_survey_submissions', format='jsonl', output=str(output), stdout=out)
+            self.assertEqual(len(output.read_text().splitlines()), 2)
+        self.assertIn(f'to {output}', out.getvalue())
+
+    def test_memory_stays_flat(self):
+        def peak(total):
+            add_submissions(total)
+            tracemalloc.start()
+            for _ in export.export(SurveySubmission.objects.all(), chunk_size=500):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        small = peak(2000)
+        self.assertLess(peak(20000), small * 1.5)
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = Path(directory.name)
+        settings = override_settings(SURVEY_ARCHIVE_DIR=self.archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        now = timezone.now()
+        self.old = [
+            SurveySubmission.objects.create(
+                email=f'user{i}@example.com', name='Zoë' if i == 0 else '', processed=True,
+                answers={'q1': 'serious'}, submitted_at=now - timedelta(days=400 + 40 * (i % 2)),
+            )
+            for i in range(7)
+        ]
+        self.kept = [
+            SurveySubmission.objects.create(email='unprocessed@example.com', submitted_at=now - timedelta(days=400)),
+            SurveySubmission.objects.create(email='recent@example.com', processed=True, submitted_at=now),
+        ]
+
+    def test_archives_old_processed_months(self):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_survey_submissions', days=180, batch_size=2, stdout=out)
+        self.assertIn('Archived 7 submissions', out.getvalue())
+        self.assertCountEqual(SurveySubmission.objects.all(), self.kept)
+
+        # Batches of 2 were compacted into one file per month
+        archives = list(SurveyArchive.objects.all())
+        self.assertEqual(len(archives), 2)
+        self.assertTrue(all(a.compacted for a in archives))
+        self.assertEqual(len(list(self.archive_dir.rglob('*.jsonl.gz'))), 2)
+        rows = [row for a in archives for row in archive.read(a)]
+        self.assertCountEqual([row['id'] for row in rows], [s.pk for s in self.old])
+        self.assertEqual(rows[0]['answers'], {'q1': 'serious'})
+        self.assertEqual(archive.archive(), 0)
+
+    def test_failed_batch_keeps_rows(self):
+        with mock.patch.object(SurveyArchive.objects, 'create', side_effect=OperationalError('database is locked')), \
+                self.assertRaises(OperationalError):
+            archive.archive(batch_size=3)
+        self.assertEqual(SurveySubmission.objects.count(), 9)
+        self.assertEqual(archive.archive(batch_size=3), 7)
+        self.assertEqual(sum(SurveyArchive.objects.values_list('rows', flat=True)), 7)
+
+    def test_search(self):
+        archive.archive()
+        self.assertEqual([row['email'] for _, row in archive.search('USER3@')], ['user3@example.com'])
+        self.assertEqual(len(archive.search('zoë')), 1)
+        self.assertEqual(len(archive.search('example.com', limit=4)), 4)
+        newest = SurveyArchive.objects.latest('month').month
+        self.assertEqual(len(archive.search('example.com', first_month=newest)), 4)
+        self.assertEqual(archive.search('recent@'), [])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/research/surveyarchive/search/', {'q': 'user4', 'from': 'junk'})
+        self.assertContains(response, 'user4@example.com')
+        self.assertContains(response, '1 match')
+
+
+class SubmissionNumberTests(SpoolMixin, TestCase):
+
+    def test_drained_submissions_are_numbered_without_counting(self):
+        SurveySubmission.objects.create(email='first@example.com')
+        for i in range(3):
+            self.client.post('/tools/dating-recommendations/', {'email': f'user{i}@example.com', 'skip_survey': '1'})
+        with CaptureQueriesContext(connection) as queries:
+            spool.drain()
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(
+            list(SurveySubmission.objects.order_by('number').values_list('email', 'number')),
+            [('first@example.com', 1), ('user0@example.com', 2), ('user1@example.com', 3), ('user2@example.com', 4)],
+        )
+        subjects = OutboxMessage.objects.filter(kind='survey_admin_notification').values_list('subject', flat=True)
+        # The unprocessed row from the admin is scored in the same batch
+        self.assertCountEqual(
+            [subject.split(':')[0] for subject in subjects],
+            ['📋 Survey #1', '📋 Survey #2', '📋 Survey #3', '📋 Survey #4'],
+        )
+
+    def test_rolled_back_numbers_are_reused(self):
+        self.assertEqual(Sequence.allocate('test', 5), 1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            self.assertEqual(Sequence.allocate('test'), 6)
+            raise OperationalError('insert failed')
+        self.assertEqual(Sequence.allocate('test'), 6)
+
+    def test_changelist_paginator_estimates_large_counts(self):
+        SurveySubmission.objects.create(email='a@example.com')
+        queryset = SurveySubmission.objects.all()
+        paginator = research_admin.ApproximateCountPaginator
+        self.assertEqual(paginator(queryset, 25).count, 1)
+        with mock.patch.object(research_admin, 'connection', mock.Mock(vendor='postgresql')), \
+                mock.patch.object(research_admin, 'approximate_count', side_effect=[250000, 3]):
+            self.assertEqual(paginator(queryset, 25).count, 250000)
+            self.assertEqual(paginator(queryset, 25).count, 1)  # small estimate - counted exactly
+
+
+class RateLimitTests(SpoolMixin, TestCase):
+    def survey(self, email='user@example.com', **extra):
+        return self.client.post('/tools/dating-recommendations/', {'email': email, 'skip_survey': '1'}, **extra)
+
+    def signup(self, email='reader@example.com'):
+        return self.client.post('/', {'newsletter_email': email})
+
+    def test_repeat_signup_is_answered_without_work(self):
+        self.signup()
+        with self.assertNumQueries(0):
+            response = self.signup('Reader@Example.com')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertEqual(OutboxMessage.objects.filter(kind='newsletter_welcome').count(), 1)
+        self.assertEqual(ratelimit.metrics()['newsletter'], {
+            'allowed': 1, 'limited_ip': 0, 'limited_email': 0, 'duplicate': 1,
+        })
+
+    def test_repeat_survey_is_not_spooled(self):
+        self.survey()
+        self.assertRedirects(self.survey(), '/tools/thank-you/', fetch_redirect_response=False)
+        self.assertEqual(spool.drain(), 1)
+
+    def test_ip_bucket_empties_and_refills(self):
+        with mock.patch.dict(ratelimit.RATE_LIMITS, {'survey:ip': (3, 60)}), \
+                mock.patch.object(ratelimit.time, 'time', return_value=1000.0) as now:
+            for i in range(3):
+                self.assertEqual(self.survey(f'user{i}@example.com').status_code, 302)
+            with self.assertLogs('research.ratelimit', 'INFO'):
+                response = self.survey('user3@example.com')
+            self.assertContains(response, 'Too many submissions', status_code=429)
+            # Another client isn't affected
+            self.assertEqual(self.survey('user4@example.com', REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+            now.return_value = 1061.0  # one token back
+            self.assertEqual(self.survey('user5@example.com').status_code, 302)
+            self.assertEqual(self.survey('user6@example.com').status_code, 429)
+        self.assertEqual(spool.drain(), 5)
+        self.assertEqual(ratelimit.metrics()['survey']['limited_ip'], 2)
+
+    def test_email_bucket(self):
+        with mock.patch.dict(ratelimit.RATE_LIMITS, {'newsletter:email': (1, 3600)}):
+            self.signup()
+            # Past the dedupe window
+            ratelimit.release('newsletter', 'reader@example.com')
+            self.assertEqual(self.signup().status_code, 429)
+        self.assertEqual(ratelimit.metrics()['newsletter']['limited_email'], 1)
+
+    def test_retry_after_limit_or_error_is_not_a_duplicate(self):
+        with mock.patch.dict(ratelimit.RATE_LIMITS, {'survey:email': (1, 60)}), \
+                mock.patch.object(ratelimit.time, 'time', return_value=1000.0) as now:
+            ratelimit.take('survey:email', 'user@example.com')  # the bucket is empty
+            self.assertEqual(self.survey().status_code, 429)
+            now.return_value = 1061.0
+            self.assertRedirects(self.survey(), '/tools/thank-you/', fetch_redirect_response=False)
+        self.assertEqual(spool.drain(), 1)
+        self.assertEqual(ratelimit.metrics()['survey']['duplicate'], 0)
+
+        with mock.patch.object(spool, 'submit', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            self.survey('retry@example.com')
+        self.survey('retry@example.com')
+        self.assertEqual(spool.drain(), 1)
+
+    def test_client_ip_behind_proxy(self):
+        request = RequestFactory().post('/', HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+        with mock.patch.object(ratelimit, 'PROXY_COUNT', 1):
+            self.assertEqual(ratelimit.client_ip(request), '1.2.3.4')
+        with mock.patch.object(ratelimit, 'PROXY_COUNT', 3):
+            self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')  # header too short to trust
+
+    def test_dashboard_shows_rejected_posts(self):
+        self.survey()
+        self.survey()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/research/surveysubmission/dashboard/')
+        self.assertEqual(response.context['rate_limits']['survey']['duplicate'], 1)
+
+
+@override_settings(RESEARCH_FAST_PATH=True)
+class FastPathTests(TestCase):
+    def setUp(self):
+        fast_path.clear()
+        self.addCleanup(fast_path.clear)
+
+    def test_second_request_skips_the_stack(self):
+        first = self.client.get('/research/methodology/')
+        self.assertTemplateUsed(first, 'research/methodology.html')
+        with mock.patch('django.contrib.sessions.middleware.SessionMiddleware.process_request') as sessions:
+            second = self.client.get('/research/methodology/')
+        sessions.assert_not_called()
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        self.assertEqual(second['X-Frame-Options'], 'DENY')
+
+    def test_keyed_on_host(self):
+        self.client.get('/about/')
+        with override_settings(ALLOWED_HOSTS=['testserver', 'dating-hub.com.au']):
+            self.client.get('/about/', HTTP_HOST='dating-hub.com.au')
+        self.assertCountEqual(fast_path._pages, [
+            ('http', 'testserver', '/about/'), ('http', 'dating-hub.com.au', '/about/'),
+        ])
+
+    def test_other_requests_take_the_normal_path(self):
+        self.client.get('/research/?utm_source=x')
+        self.client.get('/tools/dating-recommendations/')
+        with override_settings(RESEARCH_FAST_PATH=False):
+            self.client.get('/research/')
+        self.assertEqual(fast_path._pages, {})
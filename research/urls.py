@@ -30,4 +30,7 @@ urlpatterns = [
     # AI Dating Survey
     path('tools/dating-recommendations/', views.dating_recommendations_survey, name='dating_recommendations'),
     path('tools/thank-you/', views.thank_you_page, name='thank_you_page'),
+    
+    # Newsletter
+    path('newsletter/unsubscribe/<str:token>/', views.newsletter_unsubscribe, name='unsubscribe'),
 ]
@@ -1,9 +1,12 @@
+import uuid
+
+from django.http import Http404
 from django.shortcuts import render, redirect
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib import messages
-from django.utils import timezone
-from .models import SurveySubmission
+from django.views.decorators.csrf import csrf_exempt
+from . import ratelimit, spool
+from .emails import send_newsletter_welcome_email
+from .newsletter import subscribe, unsubscribe, unsubscribe_email
 
 # ===== HOME PAGES =====
 def home(request):
@@ -13,10 +16,20 @@ def home(request):
         email = request.POST.get('newsletter_email', '').strip()
         
         if email and '@' in email:
-            # Send NEWSLETTER welcome email
-            send_newsletter_welcome_email(email)
+            outcome = ratelimit.check(request, 'newsletter', email)
+            if outcome in (ratelimit.LIMITED_IP, ratelimit.LIMITED_EMAIL):
+                messages.error(request, 'Too many signups - please try again later.')
+                return render(request, 'home/index.html', status=429)
+            if outcome == ratelimit.ALLOWED:
+                # Store the subscriber for broadcasts, then send the NEWSLETTER welcome email
+                try:
+                    subscribe(email)
+                    send_newsletter_welcome_email(email)
+                except Exception:
+                    ratelimit.release('newsletter', email)
+                    raise
             
-            # Add success message
+            # Add success message - a repeat signup gets it too, without the email
             messages.success(request, 'Thanks for subscribing! Check your email for confirmation.')
             
             # Use namespace
@@ -57,7 +70,7 @@ def terms(request):
 
 # ===== AI DATING RECOMMENDATIONS SURVEY =====
 def dating_recommendations_survey(request):
-    """AI Dating Site Matchmaker Survey - WITH database save"""
+    """AI Dating Site Matchmaker Survey - spooled, then saved by the drainer"""
     if request.method == 'POST':
         email = request.POST.get('email', '').strip()
         name = request.POST.get('name', '').strip()
@@ -66,7 +79,15 @@ def dating_recommendations_survey(request):
         # Validate email
         if not email or '@' not in email:
             messages.error(request, 'Please provide a valid email address.')
-            return render(request, 'tools/dating_recommendations.html')
+            return survey_form(request, request.POST.get('submission_token'))
+        
+        outcome = ratelimit.check(request, 'survey', email)
+        if outcome in (ratelimit.LIMITED_IP, ratelimit.LIMITED_EMAIL):
+            messages.error(request, 'Too many submissions - please try again later.')
+            return survey_form(request, request.POST.get('submission_token'), status=429)
+        if outcome == ratelimit.DUPLICATE:
+            # Already taken in within the dedupe window
+            return redirect('research:thank_you_page')
         
         # Prepare data
         if skip_survey:
@@ -84,136 +105,39 @@ def dating_recommendations_survey(request):
                 'q6': request.POST.get('q6', '')
             }
         
-        # ⚠️ TEMPORARY: Database COMPLETELY disabled (no try/except)
-        submission_id = None
-        
-        send_confirmation_email(email, name, survey_type, answers, submission_id)
+        # Durable on local disk before we answer; the database insert and
+        # the confirmation emails happen in the spool drainer
+        try:
+            spool.submit(name, email, survey_type, answers, ingest_id=request.POST.get('submission_token'))
+        except Exception:
+            ratelimit.release('survey', email)
+            raise
         
         return redirect('research:thank_you_page')
     
-    return render(request, 'tools/dating_recommendations.html')
+    return survey_form(request)
+
+def survey_form(request, submission_token=None, status=None):
+    """The survey page; its token makes a resubmitted form a replay of the same submission"""
+    return render(request, 'tools/dating_recommendations.html', {
+        'submission_token': submission_token or uuid.uuid4(),
+    }, status=status)
 
 # ===== THANK YOU PAGE =====
 def thank_you_page(request):
     """Display thank you page after survey submission"""
     return render(request, 'tools/thank_you.html')
 
-# ===== EMAIL FUNCTIONS =====
-def send_confirmation_email(email, name, survey_type, answers, submission_id=None):
-    """
-    Send confirmation email for SURVEY submissions
-    - To user: Simple confirmation
-    - To admin: Detailed notification with database reference
-    """
-    
-    # Map survey_type to display text
-    survey_type_display = {
-        'completed': 'Completed Survey - Personalized Recommendations',
-        'skipped': 'Skipped Survey - Basic Recommendations'
-    }.get(survey_type, survey_type)
-    
-    # 1. EMAIL TO USER
-    user_subject = "Your Dating Site Recommendations Are Being Prepared"
-    
-    user_message = f"""Hi {name if name else 'there'},
-
-Thank you for using our AI Dating Site Matchmaker!
-
-We've received your request for dating site recommendations.
-
-{survey_type_display}
-
-Our team is currently analyzing your preferences and will send personalized recommendations within 72 hours.
-
-In the meantime, you can browse our research:
-https://dating-hub.com.au/research/
-
-Best regards,
-Dating Hub Research Team
-"""
-    
-    send_mail(
-        user_subject,
-        user_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-        fail_silently=False,
-    )
-    
-    # 2. SEPARATE EMAIL TO ADMIN
-    # Get total submissions count for reference
-    total_submissions = SurveySubmission.objects.count()
-    
-    admin_subject = f"📋 Survey #{total_submissions}: {name if name else 'Anonymous'}"
-    
-    # Format answers for admin
-    if answers:
-        answers_text = "\n".join([f"  • {key}: {value}" for key, value in answers.items()])
-    else:
-        answers_text = "  • User skipped detailed survey"
-    
-    # Database reference link
-    db_link = ""
-    if submission_id:
-        db_link = f"\nDATABASE LINK: https://dating-hub.com.au/admin/research/surveysubmission/{submission_id}/change/"
-    
-    admin_message = f"""NEW SURVEY SUBMISSION #{total_submissions}
-
-USER INFORMATION:
-• Name: {name if name else 'Not provided'}
-• Email: {email}
-• Survey Type: {survey_type_display}
-• Submission ID: {submission_id or 'N/A'}
-
-SURVEY ANSWERS:
-{answers_text}
-
-TIMESTAMP: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}
-{db_link}
-
----
-This submission has been automatically saved to the database.
-Admin panel: https://dating-hub.com.au/admin/
-"""
-    
-    send_mail(
-        admin_subject,
-        admin_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [settings.DEFAULT_FROM_EMAIL],
-        fail_silently=False,
-    )
-
-def send_newsletter_welcome_email(email):
-    """Send welcome email for NEWSLETTER signups (from homepage)"""
-    subject = "Welcome to Dating Hub's 2026 Dating Predictions!"
-    
-    message = f"""Welcome to Dating Hub's exclusive newsletter!
-
-Thank you for subscribing to "Don't Just Date. Strategize."
-
-You'll now receive:
-• 2026 dating trend predictions
-• Behavioral research insights
-• Platform algorithm updates
-• Success stories and case studies
-
-Our first newsletter will arrive in your inbox soon.
-
-In the meantime, explore our latest research:
-https://dating-hub.com.au/research/
-
-You can also try our AI Dating Site Matchmaker to get personalized platform recommendations:
-https://dating-hub.com.au/tools/dating-recommendations/
-
-Best regards,
-Dating Hub Research Team
-"""
-    
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-        fail_silently=False,
-    )
+# ===== NEWSLETTER UNSUBSCRIBE =====
+@csrf_exempt  # the signed token is the credential; one-click POSTs from mail clients carry no CSRF token
+def newsletter_unsubscribe(request, token):
+    """GET asks to confirm (link scanners only GET); POST unsubscribes"""
+    email = unsubscribe_email(token)
+    if email is None:
+        raise Http404('Invalid unsubscribe link')
+    if request.method == 'POST':
+        unsubscribe(email)
+    return render(request, 'tools/unsubscribe.html', {
+        'email': email,
+        'unsubscribed': request.method == 'POST',
+    })
@@ -1,44 +1,267 @@
-import http.server
-import socketserver
+# simple_server.py - Local preview server
+#
+#     python simple_server.py [port] [--no-build]
+#
+# Serves the site the way production does. Pages prebuilt by
+# `manage.py build_static_site` (blog/static_site.py) and files under
+# STATIC_URL and MEDIA_URL come straight from disk. Every other URL goes
+# to the Django application, so the URL map is whatever the URLconf routes.
+#
+# File contents, and their gzip for text types, are kept in memory until the
+# file's mtime or size changes. Large files that go out uncompressed use
+# sendfile(). Responses carry an ETag and Last-Modified, and a matching
+# If-None-Match (or, without one, an If-Modified-Since no older than the
+# file) gets a 304. The prebuilt pages' manifest is parsed once per build,
+# not per request. A page whose templates were edited after it was
+# built is rebuilt on its next request, so template work shows up on reload.
+import argparse
+import gzip
+import mimetypes
 import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'datinghub_project.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.servers.basehttp import ServerHandler, ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.template.autoreload import reset_loaders
+from django.utils._os import safe_join
+from blog import static_site
 
 PORT = 8000
+# Smaller files are served from memory; larger uncompressed ones with sendfile()
+SENDFILE_MIN_SIZE = 64 * 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+
+# ===== FILES =====
+class FileCache:
+    """Contents of served files and their gzip, refreshed when mtime or size change"""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, path):
+        """The entry for `path`; raises OSError if it can't be read"""
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry['version'] == version:
+            return entry
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        entry = {
+            'version': version,
+            'size': stat.st_size,
+            'content_type': content_type,
+            'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            'mtime': int(stat.st_mtime),
+            'last_modified': formatdate(stat.st_mtime, usegmt=True),
+            'content': None,
+            'gzip': None,
+        }
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+        if compressible or stat.st_size < SENDFILE_MIN_SIZE:
+            with open(path, 'rb') as f:
+                content = f.read()
+            if stat.st_size < SENDFILE_MIN_SIZE:
+                entry['content'] = content
+            if compressible:
+                entry['gzip'] = gzip.compress(content, 6, mtime=0)
+        # Threads may race to fill the same entry; either result is correct
+        self._entries[path] = entry
+        return entry
+
+
+def _not_modified(entry, headers):
+    """True if the request's validators match the file, If-None-Match first"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return entry['etag'] in if_none_match
+    try:
+        return parsedate_to_datetime(headers.get('If-Modified-Since')).timestamp() >= entry['mtime']
+    except (TypeError, ValueError):  # missing or malformed
+        return False
+
+
+def _accepts_gzip(header):
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        if coding.strip().lower() in ('gzip', '*') and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            return True
+    return False
+
+
+# ===== PAGES =====
+_build_lock = threading.Lock()
+# The manifest as last parsed, and the file version it was parsed from
+_manifest = {'version': None, 'pages': {}}
+
+
+def manifest():
+    """The prebuilt pages' manifest, parsed again only when a build replaces it"""
+    path = static_site.site_root() / static_site.MANIFEST_NAME
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {}
+    version = (str(path), stat.st_mtime_ns, stat.st_size)
+    if version != _manifest['version']:
+        _manifest.update(version=version, pages=static_site.read_manifest())
+    return _manifest['pages']
+
+
+def _page_is_stale(page, html):
+    """True if the page's file is gone or older than one of its templates"""
+    try:
+        built = os.stat(html).st_mtime_ns
+        return any(os.stat(template).st_mtime_ns > built for template in page['templates'])
+    except OSError:
+        return True
+
+
+def page_file(path):
+    """The prebuilt file for a URL path, rebuilding stale pages; None to leave it to Django"""
+    page = manifest().get(path)
+    if page is None:
+        return None
+    html = static_site.site_root() / path.strip('/') / 'index.html'
+    if _page_is_stale(page, html):
+        with _build_lock:
+            if _page_is_stale(page, html):
+                reset_loaders()  # drop compiled templates cached by this process
+                static_site.build()
+    return html if html.exists() else None
+
+
+def asset_file(path):
+    """The file behind a STATIC_URL or MEDIA_URL path, or None"""
+    try:
+        if path.startswith(settings.STATIC_URL):
+            relative = path[len(settings.STATIC_URL):]
+            found = finders.find(relative)
+            if found:
+                return found
+            candidate = safe_join(settings.STATIC_ROOT, relative)
+        elif settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
+            candidate = safe_join(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):])
+        else:
+            return None
+    except SuspiciousFileOperation:  # outside the root
+        return None
+    return candidate if os.path.isfile(candidate) else None
+
+
+# ===== SERVER =====
+class PreviewRequestHandler(WSGIRequestHandler):
+    files = FileCache()
+
+    def handle_one_request(self):
+        """WSGIRequestHandler.handle_one_request, answering files before Django"""
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        if self.command in ('GET', 'HEAD') and self.serve_file():
+            return
+
+        handler = ServerHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ())
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def serve_file(self):
+        """Answer from disk if the path is a prebuilt page or an asset; False otherwise"""
+        path, _, query = self.path.partition('?')
+        # Like PrebuiltPageMiddleware: query strings and sessions go to Django
+        is_page = not query and f'{settings.SESSION_COOKIE_NAME}=' not in self.headers.get('Cookie', '')
+        filename = (page_file(path) if is_page else None) or asset_file(path)
+        if filename is None:
+            return False
+        try:
+            entry = self.files.get(filename)
+        except OSError:
+            return False
+
+        if _not_modified(entry, self.headers):
+            self.send_response(304)
+            self.send_header('ETag', entry['etag'])
+            self.send_header('Last-Modified', entry['last_modified'])
+            self.end_headers()
+            return True
+
+        use_gzip = entry['gzip'] is not None and _accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        body = entry['gzip'] if use_gzip else entry['content']
+        self.send_response(200)
+        self.send_header('Content-Type', entry['content_type'])
+        self.send_header('Content-Length', str(len(body) if body is not None else entry['size']))
+        self.send_header('ETag', entry['etag'])
+        self.send_header('Last-Modified', entry['last_modified'])
+        self.send_header('Cache-Control', 'no-cache')  # always revalidate - it's a preview
+        if entry['gzip'] is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        if entry['content_type'].startswith('text/html'):
+            self.send_header('X-Frame-Options', getattr(settings, 'X_FRAME_OPTIONS', 'DENY'))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return True
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            with open(filename, 'rb') as f:
+                offset = 0
+                while offset < entry['size']:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, entry['size'] - offset)
+                    if not sent:
+                        break
+                    offset += sent
+        return True
+
+
+def make_server(port=PORT, address=''):
+    server = ThreadedWSGIServer((address, port), PreviewRequestHandler)
+    server.set_app(get_wsgi_application())
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preview the site locally')
+    parser.add_argument('port', type=int, nargs='?', default=PORT)
+    parser.add_argument('--no-build', action='store_true', help="Don't prebuild changed pages on start")
+    args = parser.parse_args()
+
+    if not args.no_build:
+        rendered, total = static_site.build()
+        print(f'Prebuilt {rendered} of {total} pages.')
+    server = make_server(args.port)
+    print(f'Serving Dating Hub at http://localhost:{args.port}')
+    print('Prebuilt pages (everything else goes to Django):')
+    for path in sorted(manifest()):
+        print(f'  {path}')
+    print('\nPress Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 
-# Simple URL routing
-URL_MAP = {
-    '/': 'templates/home/index.html',
-    '/about/': 'templates/about/index.html',
-    '/blog/': 'templates/blog/index.html',
-    '/blog/micromance/': 'templates/blog/micromance.html',
-    '/blog/ai-matchmaking/': 'templates/blog/ai_matchmaking.html',
-    '/blog/digital-boundaries/': 'templates/blog/digital_boundaries.html',
-    '/tools/data-library/': 'templates/tools/data_library.html',
-    '/tools/privacy/': 'templates/tools/privacy.html',
-    '/tools/terms/': 'templates/tools/terms.html',
-    '/directory/': 'templates/directory/index.html',
-}
-
-class DatingHubHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        # Map URL to file
-        if self.path in URL_MAP:
-            file_path = URL_MAP[self.path]
-            if os.path.exists(file_path):
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(file_path, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-        
-        # Default to file serving
-        return super().do_GET()
-
-os.chdir('.')
-with socketserver.TCPServer(("", PORT), DatingHubHandler) as httpd:
-    print(f"Serving Dating Hub at http://localhost:{PORT}")
-    print("Available pages:")
-    for url in URL_MAP.keys():
-        print(f"  {url}")
-    print("\nPress Ctrl+C to stop")
-    httpd.serve_forever()
+if __name__ == '__main__':
+    main()